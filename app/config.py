@@ -5,7 +5,25 @@ class Config:
     PROJECT_ROOT = Path(__file__).parent.parent
     MODELS_DIR = PROJECT_ROOT / "models" / "trained"
     DATA_DIR = PROJECT_ROOT / "data"
+    DATASET_DIR = PROJECT_ROOT / "dataset"
+    SHARDS_DIR = DATA_DIR / "shards"
+    EMBEDDING_CACHE_DIR = DATA_DIR / "embeddings"
+    MODEL_REGISTRY_FILE = DATA_DIR / "model_registry.json"
+    PERCEPTUAL_INDEX_DIR = DATA_DIR / "perceptual"
+    RUNS_DB_FILE = DATA_DIR / "runs.sqlite3"
+    HISTORY_DB_FILE = DATA_DIR / "history.sqlite3"
+    READINESS_FILE = DATA_DIR / "readiness.json"
+    AUTOTUNE_FILE = DATA_DIR / "autotune.json"
+    WATCH_CHECKPOINT_FILE = DATA_DIR / "watch.sqlite3"
+    SALIENCY_CACHE_FILE = DATA_DIR / "saliency.sqlite3"
+    WATCH_READINESS_FILE = DATA_DIR / "watch_readiness.json"
     REPORTS_DIR = PROJECT_ROOT / "reports" / "generated"
+    METRICS_DIR = PROJECT_ROOT / "reports" / "metrics"
+    PROFILES_DIR = PROJECT_ROOT / "reports" / "profiles"
+    LOAD_TEST_DIR = PROJECT_ROOT / "reports" / "load_tests"
+    WATCH_REPORT_DIR = PROJECT_ROOT / "reports" / "watch"
+    SHARDED_RUNS_DIR = PROJECT_ROOT / "reports" / "sharded"
+    REPORT_CACHE_DIR = PROJECT_ROOT / "reports" / "cache"
     
     DEFAULT_MODEL_PATH = MODELS_DIR / "model_complete.h5"
     INPUT_SIZE = (256, 256, 3)
@@ -17,6 +35,85 @@ class Config:
     }
     
     SUPPORTED_FORMATS = ["jpg", "jpeg", "png"]
+    SHARD_SIZE = 512
+    
+    # Cache de características del backbone congelado (DenseNet121)
+    ENABLE_EMBEDDING_CACHE = os.environ.get("BCC_EMBEDDING_CACHE", "0") == "1"
+    EMBEDDING_CACHE_DTYPE = os.environ.get("BCC_EMBEDDING_CACHE_DTYPE", "float32")
+    EMBEDDING_CACHE_SEGMENT_SIZE = 256
+    
+    # Comparación de varios modelos sobre las mismas imágenes preprocesadas
+    COMPARISON_BATCH_SIZE = int(os.environ.get("BCC_COMPARISON_BATCH_SIZE", "16"))
+    
+    # Cascada: modelo ligero para todas las imágenes, modelo principal solo si la confianza es baja
+    CASCADE_MODEL_PATH = Path(os.environ.get("BCC_CASCADE_MODEL", str(MODELS_DIR / "cascade_fast.h5")))
+    CASCADE_THRESHOLD = float(os.environ.get("BCC_CASCADE_THRESHOLD", "0.9"))
+    CASCADE_INPUT_SIZE = (128, 128, 3)
+    
+    # Ejecuciones persistidas por lotes (reanudables tras un reinicio)
+    RUN_STORE_BATCH_SIZE = int(os.environ.get("BCC_RUN_BATCH_SIZE", "16"))
+    RUN_STORE_STALE_SECONDS = float(os.environ.get("BCC_RUN_STALE", "300"))
+    
+    # Reutilizar la predicción de imágenes casi idénticas (dHash + distancia de Hamming)
+    ENABLE_PERCEPTUAL_DEDUP = os.environ.get("BCC_DEDUP", "0") == "1"
+    PERCEPTUAL_HASH_SIZE = 16
+    PERCEPTUAL_MAX_DISTANCE = int(os.environ.get("BCC_DEDUP_DISTANCE", "8"))
+    
+    # Precarga del modelo por defecto en segundo plano y calentamiento con lotes de ceros
+    PRELOAD_DEFAULT_MODEL = os.environ.get("BCC_PRELOAD", "1") == "1"
+    PRELOAD_WARMUP_BATCHES = (1, RUN_STORE_BATCH_SIZE)
+    
+    # Autoajuste de lote e hilos por host y modelo (se mide en el primer arranque)
+    AUTOTUNE_ON_START = os.environ.get("BCC_AUTOTUNE", "1") == "1"
+    AUTOTUNE_BATCH_SIZES = (1, 4, 8, 16, 32)
+    AUTOTUNE_LATENCY_CEILING_MS = float(os.environ.get("BCC_AUTOTUNE_LATENCY_MS", "5000"))
+    
+    # Planificación de la inferencia entre sesiones concurrentes
+    SCHEDULER_MAX_IN_FLIGHT = int(os.environ.get("BCC_SCHEDULER_IN_FLIGHT", "2"))
+    SCHEDULER_SMALL_JOB_IMAGES = int(os.environ.get("BCC_SCHEDULER_SMALL_JOB", "32"))
+    
+    # Explicaciones Grad-CAM bajo demanda (por defecto las filas FP/FN, hasta SALIENCY_DEFAULT_ROWS)
+    SALIENCY_DEFAULT_ROWS = int(os.environ.get("BCC_SALIENCY_ROWS", "12"))
+    SALIENCY_OVERLAY_SIZE = 224
+    SALIENCY_OVERLAY_ALPHA = 0.4
+    
+    # Carpetas vigiladas: sondeo, espera hasta que el archivo deja de cambiar y exportación Excel periódica
+    WATCH_POLL_SECONDS = float(os.environ.get("BCC_WATCH_POLL", "2"))
+    WATCH_SETTLE_SECONDS = float(os.environ.get("BCC_WATCH_SETTLE", "2"))
+    WATCH_EXCEL_INTERVAL_SECONDS = float(os.environ.get("BCC_WATCH_EXCEL_INTERVAL", "60"))
+    WATCH_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+    
+    # Reclasificación del archivo completo repartida en fragmentos (procesos locales o nodos)
+    SHARDED_RUN_COUNT = int(os.environ.get("BCC_RUN_SHARDS", "8"))
+    
+    # Reportes descargables: se generan al pedirlos y se guardan en disco hasta REPORT_CACHE_TTL_SECONDS sin uso
+    REPORT_CACHE_TTL_SECONDS = float(os.environ.get("BCC_REPORT_CACHE_TTL", "86400"))
+    REPORT_CACHE_WORKERS = int(os.environ.get("BCC_REPORT_CACHE_WORKERS", "2"))
+    REPORT_CSV_CHUNK_ROWS = 50000
+    
+    # Objetivo de latencia por ciclo de análisis para el informe de capacidad
+    LOAD_TEST_TARGET_P95_SECONDS = float(os.environ.get("BCC_LOAD_TEST_P95", "30"))
+    
+    # Presupuesto de memoria residente (0 = fracción del límite del contenedor o de la RAM)
+    MEMORY_BUDGET_MB = float(os.environ.get("BCC_MEMORY_BUDGET_MB", "0"))
+    MEMORY_AUTO_BUDGET_FRACTION = 0.8
+    MEMORY_SOFT_LIMIT = 0.8
+    MEMORY_HARD_LIMIT = 0.95
+    MEMORY_MAX_PAUSE_SECONDS = float(os.environ.get("BCC_MEMORY_MAX_PAUSE", "10"))
+    
+    # Carga de pesos HDF5 con memory-map (pico de memoria cercano al tamaño del modelo)
+    LAZY_WEIGHT_LOADING = os.environ.get("BCC_LAZY_WEIGHTS", "0") == "1"
+    
+    # Instrumentación de rendimiento (desactivada por defecto)
+    ENABLE_PERFORMANCE_METRICS = os.environ.get("BCC_PERFORMANCE_METRICS", "0") == "1"
+    PERFORMANCE_LATENCY_COLUMNS = os.environ.get("BCC_LATENCY_COLUMNS", "0") == "1"
+    PROMETHEUS_FILE = METRICS_DIR / "breast_cancer_classifier.prom"
+    # Las etapas posteriores al cierre de una ejecución se exportan como mucho una vez por intervalo
+    PROMETHEUS_EXPORT_INTERVAL_SECONDS = float(os.environ.get("BCC_PROMETHEUS_INTERVAL", "10"))
+    
+    # Perfilado bajo demanda de una ejecución
+    ENABLE_PROFILING = os.environ.get("BCC_PROFILE", "0") == "1"
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get("BCC_PROFILE_INTERVAL", "0.005"))
     
     EXCEL_COLORS = {
         'VP': {'fill': "D4EDDA", 'font': "155724"},
@@ -0,0 +1,27 @@
+"""
+Utilidades de archivos sin dependencias del resto de la app.
+
+Se importan tanto desde app.utils como desde app.training; por eso no deben
+importar ninguno de los dos paquetes (app.utils carga Streamlit y TensorFlow
+al importarse).
+"""
+
+import hashlib
+import re
+from pathlib import Path
+
+MASK_PATTERN = re.compile(r"^(?P<base>.+)_mask(_\d+)?$")
+
+
+def is_mask_file(path):
+    """Indicar si el archivo es una máscara de segmentación (*_mask.png, *_mask_1.png)"""
+    return MASK_PATTERN.match(Path(path).stem) is not None
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash SHA-256 del contenido completo de un archivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
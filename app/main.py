@@ -1,30 +1,57 @@
 import streamlit as st
+import os
 import sys
+import uuid
+from datetime import date, timedelta
 from pathlib import Path
 import pandas as pd
+import numpy as np
 
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 from app.utils.model_utils import ModelManager
-from app.utils.image_processing import ImageProcessor
+from app.utils.image_processing import ImageProcessor, error_row
 from app.utils.metrics_calculator import MetricsCalculator
 from app.utils.report_generator import ReportGenerator
 from app.utils.visualization import MetricsVisualizer
+from app.utils.performance import PerformanceTracker
+from app.utils.profiling import RunProfiler
+from app.utils.fingerprint import bytes_sha256, file_fingerprint
+from app.utils.model_registry import ModelRegistry
+from app.utils.model_comparison import ModelComparison
+from app.utils.cascade import CascadeClassifier
+from app.utils.perceptual_hash import PerceptualIndex
+from app.utils.run_store import RunStore
+from app.utils.history_store import HistoryStore
+from app.utils.results_table import ResultsTable
+from app.utils.model_preloader import ModelPreloader, shared_preloader
+from app.utils.autotune import InferenceAutotuner
+from app.utils.memory_governor import shared_governor
+from app.utils.inference_scheduler import shared_scheduler
+from app.utils.saliency import GradCamExplainer
+from app.utils.report_cache import ReportCache, shared_report_cache
 from app.config import Config
 
+PAGE_ANALYSIS = "🔬 Análisis"
+PAGE_HISTORY = "📈 Historial"
+
 def initialize_components():
     """Inicializar componentes del sistema"""
+    if 'performance_tracker' not in st.session_state:
+        st.session_state.performance_tracker = PerformanceTracker()
+    tracker = st.session_state.performance_tracker
+    
     if 'model_manager' not in st.session_state:
         st.session_state.model_manager = ModelManager()
     if 'image_processor' not in st.session_state:
-        st.session_state.image_processor = ImageProcessor()
+        st.session_state.image_processor = ImageProcessor(tracker=tracker)
     if 'metrics_calc' not in st.session_state:
         st.session_state.metrics_calc = MetricsCalculator()
     if 'report_gen' not in st.session_state:
-        st.session_state.report_gen = ReportGenerator()
+        st.session_state.report_gen = ReportGenerator(tracker=tracker)
     if 'visualizer' not in st.session_state:
-        st.session_state.visualizer = MetricsVisualizer()
+        st.session_state.visualizer = MetricsVisualizer(tracker=tracker)
     
     if 'analysis_completed' not in st.session_state:
         st.session_state.analysis_completed = False
@@ -38,6 +65,38 @@ def initialize_components():
         st.session_state.analysis_metrics = None
     if 'successful_predictions' not in st.session_state:
         st.session_state.successful_predictions = None
+    if 'results_table' not in st.session_state:
+        st.session_state.results_table = None
+    if 'profile_next_run' not in st.session_state:
+        st.session_state.profile_next_run = Config.ENABLE_PROFILING
+    if 'profile_artifacts' not in st.session_state:
+        st.session_state.profile_artifacts = None
+    if 'model_registry' not in st.session_state:
+        st.session_state.model_registry = ModelRegistry()
+    if 'comparison_models' not in st.session_state:
+        st.session_state.comparison_models = []
+    if 'comparison_results' not in st.session_state:
+        st.session_state.comparison_results = None
+    if 'cascade_enabled' not in st.session_state:
+        st.session_state.cascade_enabled = False
+    if 'cascade_threshold' not in st.session_state:
+        st.session_state.cascade_threshold = Config.CASCADE_THRESHOLD
+    if 'dedup_enabled' not in st.session_state:
+        st.session_state.dedup_enabled = Config.ENABLE_PERCEPTUAL_DEDUP
+    if 'duplicate_index' not in st.session_state:
+        st.session_state.duplicate_index = None
+    if 'run_store' not in st.session_state:
+        st.session_state.run_store = RunStore()
+    if 'run_id' not in st.session_state:
+        st.session_state.run_id = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:8]
+    if 'history_store' not in st.session_state:
+        st.session_state.history_store = HistoryStore()
+    if 'explain_sources' not in st.session_state:
+        st.session_state.explain_sources = None
+    if 'explainer' not in st.session_state:
+        st.session_state.explainer = None
 
 def clear_analysis_results():
     """Limpiar resultados de análisis previos"""
@@ -47,6 +106,14 @@ def clear_analysis_results():
     st.session_state.df_results = None
     st.session_state.analysis_metrics = None
     st.session_state.successful_predictions = None
+    st.session_state.results_table = None
+    st.session_state.profile_artifacts = None
+    st.session_state.comparison_results = None
+    st.session_state.run_id = None
+    st.session_state.explain_sources = None
+    # Filtros y selecciones del análisis anterior (los reportes viven en disco, por ejecución)
+    for key in ('results_filter_resultado', 'results_filter_prediccion', 'results_page', 'explain_enabled', 'explain_files'):
+        st.session_state.pop(key, None)
     if 'current_results_df' in st.session_state:
         del st.session_state.current_results_df
 
@@ -69,19 +136,50 @@ def main():
     report_gen = st.session_state.report_gen
     visualizer = st.session_state.visualizer
     
+    preloader = shared_preloader() if Config.PRELOAD_DEFAULT_MODEL else None
+    if preloader is not None:
+        model_manager.use_preloaded(preloader)
+    else:
+        # Sin precarga, los hilos ajustados solo se aplican si TensorFlow aún no se ha iniciado
+        InferenceAutotuner().apply_threads(Config.DEFAULT_MODEL_PATH)
+    
     with st.sidebar:
+        page = st.radio("Vista", [PAGE_ANALYSIS, PAGE_HISTORY], key="page", horizontal=True)
+        
         st.header("📊 Configuración del Modelo")
         
+        if preloader is not None:
+            show_preload_status(preloader)
+        
         model = model_manager.load_model_interface()
         
         if model is not None:
             st.success("✅ Modelo operativo")
             
-            if st.session_state.analysis_completed:
+            if st.session_state.analysis_completed or st.session_state.comparison_results is not None:
                 if st.button("🗑️ Nuevo Análisis", help="Limpiar resultados previos"):
                     clear_analysis_results()
                     st.rerun()
             
+            # Solo se perfila una ejecución: la casilla se desmarca antes de crearla en el siguiente rerun
+            if st.session_state.pop('profile_reset', False):
+                st.session_state.profile_next_run = False
+            st.checkbox(
+                "🔬 Perfilar la próxima ejecución",
+                key="profile_next_run",
+                help="Genera un archivo .prof y pilas colapsadas para flamegraphs"
+            )
+            
+            st.checkbox(
+                "🧬 Reutilizar predicciones de imágenes casi idénticas",
+                key="dedup_enabled",
+                help="Compara un hash perceptual (dHash) con las imágenes ya analizadas por este modelo"
+            )
+            
+            show_cascade_sidebar()
+            
+            show_comparison_sidebar()
+            
             with st.expander("ℹ️ Info del Sistema"):
                 st.markdown(f"""
                 **Clases de Clasificación:**
@@ -107,9 +205,13 @@ def main():
             3. Verifica la ruta por defecto
             """)
     
-    if model is not None:
+    if page == PAGE_HISTORY:
+        show_history_page()
+    elif model is not None:
         if st.session_state.analysis_completed and st.session_state.df_results is not None:
-            show_persistent_results()
+            show_persistent_results(model)
+        elif st.session_state.comparison_results is not None:
+            show_comparison_results()
         else:
             uploaded_files = st.file_uploader(
                 "Selecciona las imágenes de ultrasonido de mama", 
@@ -144,63 +246,408 @@ def process_images(uploaded_files, model, image_processor, metrics_calc, report_
             st.write(f"... y {len(uploaded_files) - 6} imágenes más")
     
     if st.button("🚀 Procesar todas las imágenes", type="primary"):
-        results = []
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        if st.session_state.profile_next_run:
+            profiler = RunProfiler()
+            try:
+                with profiler:
+                    completed = analyze_files(uploaded_files, model, image_processor, metrics_calc, report_gen)
+            finally:
+                # También si el análisis falla: solo se perfila una ejecución
+                st.session_state.profile_artifacts = profiler.artifacts()
+                st.session_state.profile_reset = True
+        else:
+            completed = analyze_files(uploaded_files, model, image_processor, metrics_calc, report_gen)
         
-        for i, uploaded_file in enumerate(uploaded_files):
-            status_text.text(f'Procesando {uploaded_file.name} ({i+1}/{len(uploaded_files)})...')
+        if completed:
+            st.rerun()
+    
+    if st.session_state.comparison_models:
+        if st.button(f"🆚 Comparar con {len(st.session_state.comparison_models)} modelo(s) registrado(s)"):
+            if compare_files(uploaded_files, model, image_processor, metrics_calc):
+                st.rerun()
+
+def analyze_files(uploaded_files, model, image_processor, metrics_calc, report_gen):
+    """Clasificar los archivos por lotes persistidos en el RunStore y guardar los resultados en session_state"""
+    tracker = st.session_state.performance_tracker
+    tracker.start_run()
+    run_store = st.session_state.run_store
+    
+    # Una ejecución interrumpida con los mismos archivos y modelo se reanuda donde quedó
+    content_hashes = [bytes_sha256(uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+    model_path = st.session_state.get('model_path')
+    session_id = st.session_state.session_id
+    run_id = run_store.find_resumable(zip([f.name for f in uploaded_files], content_hashes), model_path, owner=session_id)
+    if run_id is None:
+        run_id = run_store.create_run(len(uploaded_files), model_path, owner=session_id)
+        scored = set()
+    else:
+        scored = run_store.scored_keys(run_id)
+        st.info(f"♻️ Reanudando la ejecución {run_id}: {len(scored)} imágenes ya analizadas")
+    
+    pending = [
+        (position, uploaded_file, content_hash)
+        for position, (uploaded_file, content_hash) in enumerate(zip(uploaded_files, content_hashes))
+        if (uploaded_file.name, content_hash) not in scored
+    ]
+    done = len(uploaded_files) - len(pending)
+    progress_bar = st.progress(done / len(uploaded_files))
+    status_text = st.empty()
+    
+    batch_size = InferenceAutotuner().batch_size_for(model_path)
+    cascade = load_cascade(model, image_processor, batch_size)
+    duplicates = load_duplicate_index(model) if cascade is None and st.session_state.dedup_enabled else None
+    # Sin índice perceptual ni cache de características las imágenes se predicen por lotes
+    batched = cascade is None and duplicates is None and not Config.ENABLE_EMBEDDING_CACHE
+    chunk_size = max(Config.RUN_STORE_BATCH_SIZE, batch_size) if batched else Config.RUN_STORE_BATCH_SIZE
+    governor = shared_governor()
+    scheduler = shared_scheduler()
+    
+    # Cada lote espera turno en el planificador compartido con las demás sesiones
+    with scheduler.job(st.session_state.session_id, len(pending)) as job:
+        start = 0
+        while start < len(pending):
+            # Con la memoria cerca del presupuesto se liberan caches y se decodifican lotes más pequeños
+            batch = pending[start:start + governor.admit(chunk_size, memory_evictors(), stage='análisis')]
+            start += len(batch)
+            if scheduler.busy():
+                status_text.text(f'⏳ En cola: otras sesiones están usando el modelo ({done}/{len(uploaded_files)})...')
+            with scheduler.slot(job, len(batch)):
+                if cascade is not None:
+                    status_text.text(f'Procesando en modo cascada ({done}/{len(uploaded_files)})...')
+                    rows = cascade.run([uploaded_file for _, uploaded_file, _ in batch])
+                    rows = [{**row, **tracker.latency_columns(row['Nombre_Archivo'])} for row in rows]
+                elif batched:
+                    status_text.text(f'Procesando lote de {len(batch)} imágenes ({done}/{len(uploaded_files)})...')
+                    rows = classify_batch([uploaded_file for _, uploaded_file, _ in batch], model, image_processor, batch_size)
+                else:
+                    rows = []
+                    for _, uploaded_file, content_hash in batch:
+                        status_text.text(f'Procesando {uploaded_file.name} ({done + len(rows) + 1}/{len(uploaded_files)})...')
+                        rows.append(classify_file(uploaded_file, content_hash, model, image_processor, duplicates))
+                        progress_bar.progress((done + len(rows)) / len(uploaded_files))
             
-            try:
+            run_store.append(run_id, [
+                (position, uploaded_file.name, content_hash, row)
+                for (position, uploaded_file, content_hash), row in zip(batch, rows)
+            ])
+            done += len(batch)
+            progress_bar.progress(done / len(uploaded_files))
+    
+    if duplicates is not None:
+        duplicates.flush()
+    run_store.complete(run_id)
+    
+    image_processor.flush_caches()
+    progress_bar.empty()
+    status_text.empty()
+    
+    # Los resultados finales siempre se reconstruyen desde el almacenamiento persistente
+    results = run_store.results(run_id)
+    if results:
+        enhanced_results = report_gen.create_enhanced_results(results)
+        df_results = report_gen.create_dataframe(enhanced_results)
+        
+        st.session_state.history_store.record(
+            run_id, current_model_hash(), enhanced_results, model_path=st.session_state.get('model_path')
+        )
+        
+        successful_predictions = df_results[df_results['Prediccion'] != 'ERROR']
+        metrics = None
+        if not successful_predictions.empty and 'Resultado' in successful_predictions.columns:
+            metrics = metrics_calc.calculate_real_time_metrics(successful_predictions)
+        
+        st.session_state.analysis_results = results
+        st.session_state.enhanced_results = enhanced_results
+        st.session_state.df_results = df_results
+        st.session_state.successful_predictions = successful_predictions
+        st.session_state.results_table = ResultsTable(df_results)
+        st.session_state.analysis_metrics = metrics
+        st.session_state.analysis_completed = True
+        st.session_state.current_results_df = successful_predictions
+        st.session_state.run_id = run_id
+        # Solo referencias a los archivos subidos: las explicaciones se calculan si alguien las abre
+        st.session_state.explain_sources = {
+            uploaded_file.name: (content_hash, uploaded_file)
+            for uploaded_file, content_hash in zip(uploaded_files, content_hashes)
+        }
+        
+        st.success(f"✅ Procesamiento completado. {len(results)} imágenes analizadas.")
+        return True
+
+    return False
+
+def current_model_hash():
+    """Huella rápida del archivo del modelo activo para agrupar el historial por modelo"""
+    model_path = st.session_state.get('model_path')
+    if model_path and os.path.exists(model_path):
+        return file_fingerprint(model_path)[:16]
+    return "desconocido"
+
+def classify_file(uploaded_file, image_hash, model, image_processor, duplicates=None):
+    """Fila de resultado de un archivo (o fila de ERROR si falla)"""
+    tracker = st.session_state.performance_tracker
+    try:
+        with tracker.image(uploaded_file.name):
+            image = image_processor.load_image(uploaded_file)
+            if duplicates is None:
+                prediction_result = image_processor.predict_image(image, model, image_hash=image_hash)
+            else:
+                prediction_result = image_processor.predict_image_deduplicated(
+                    image, model, duplicates, uploaded_file.name, image_hash=image_hash
+                )
+        
+        return {
+            'Nombre_Archivo': uploaded_file.name,
+            **prediction_result,
+            **tracker.latency_columns(uploaded_file.name)
+        }
+    
+    except Exception as e:
+        st.error(f"Error procesando {uploaded_file.name}: {str(e)}")
+        return error_row(uploaded_file.name, e)
+
+def classify_batch(uploaded_files, model, image_processor, batch_size=None):
+    """Filas de resultado de varios archivos con una sola llamada al modelo (ERROR por archivo si falla)"""
+    tracker = st.session_state.performance_tracker
+    rows = [None] * len(uploaded_files)
+    pending = []
+    for i, uploaded_file in enumerate(uploaded_files):
+        try:
+            with tracker.image(uploaded_file.name):
                 image = image_processor.load_image(uploaded_file)
-                prediction_result = image_processor.predict_image(image, model)
-                
-                result = {
-                    'Nombre_Archivo': uploaded_file.name,
-                    **prediction_result
+                pending.append((i, image_processor.preprocess_image(image)[0]))
+        except Exception as e:
+            st.error(f"Error procesando {uploaded_file.name}: {str(e)}")
+            rows[i] = error_row(uploaded_file.name, e)
+    
+    if pending:
+        try:
+            probabilities = image_processor.predict_batch(np.stack([array for _, array in pending]), model, batch_size)
+        except Exception as e:
+            st.error(f"Error en predicción por lotes: {str(e)}")
+            for i, _ in pending:
+                rows[i] = error_row(uploaded_files[i].name, e)
+        else:
+            for (i, _), row_probabilities in zip(pending, probabilities):
+                name = uploaded_files[i].name
+                rows[i] = {
+                    'Nombre_Archivo': name,
+                    **image_processor.format_prediction(row_probabilities),
+                    **tracker.latency_columns(name)
                 }
-                results.append(result)
-                
-            except Exception as e:
-                st.error(f"Error procesando {uploaded_file.name}: {str(e)}")
-                results.append({
-                    'Nombre_Archivo': uploaded_file.name,
-                    'Prediccion': 'ERROR',
-                    'Confianza': 'N/A',
-                    'Prob_Benign': 'N/A',
-                    'Prob_Malignant': 'N/A',
-                    'Prob_Normal': 'N/A',
-                    'Error': str(e)
-                })
-            
-            progress_bar.progress((i + 1) / len(uploaded_files))
+    return rows
+
+def memory_evictors():
+    """Caches que el gobernador de memoria puede liberar, de la más barata de reconstruir a la más cara"""
+    def explain_sources():
+        # Sin las imágenes subidas la sección de explicaciones queda deshabilitada
+        if not st.session_state.get('explain_sources'):
+            return False
+        st.session_state.explain_sources = None
+        return True
+    
+    def duplicate_index():
+        index = st.session_state.duplicate_index
+        if index is None:
+            return False
+        index[1].flush()
+        st.session_state.duplicate_index = None
+        return True
+    
+    def idle_models():
+        # Solo los que ninguna sesión ni el precargador referencian
+        return ModelManager.release_idle_models() > 0
+    
+    return [
+        ("imágenes para explicaciones", explain_sources),
+        ("índice perceptual", duplicate_index),
+        ("modelos inactivos en cache", idle_models)
+    ]
+
+def load_duplicate_index(model):
+    """Índice perceptual persistente del modelo activo (se reabre al cambiar de modelo)"""
+    index = st.session_state.duplicate_index
+    if index is None or index[0] != id(model):
+        with st.spinner("Abriendo índice de imágenes analizadas..."):
+            index = (id(model), PerceptualIndex.for_model(st.session_state.get('model_path')))
+        st.session_state.duplicate_index = index
+    return index[1]
+
+def show_preload_status(preloader):
+    """Estado de la precarga del modelo por defecto"""
+    state = preloader.state()
+    if state['status'] in ModelPreloader.PENDING:
+        wait_for_preload(preloader)
+    elif state['status'] == ModelPreloader.STATUS_READY:
+        warmup = sum(state['warmup_seconds'].values())
+        st.caption(f"⚡ Modelo por defecto precargado: carga {state['load_seconds']:.1f} s, calentamiento {warmup:.1f} s")
+    elif state['status'] == ModelPreloader.STATUS_ERROR:
+        st.caption(f"⚠️ Precarga no disponible: {state['error']}")
+
+@st.fragment(run_every=2)
+def wait_for_preload(preloader):
+    """Consultar la precarga cada 2 s y recargar la aplicación cuando el modelo esté caliente"""
+    state = preloader.state()
+    if state['status'] not in ModelPreloader.PENDING:
+        st.rerun()
+    label = {
+        ModelPreloader.STATUS_TUNING: "Ajustando lote e hilos para",
+        ModelPreloader.STATUS_LOADING: "Cargando",
+        ModelPreloader.STATUS_WARMING: "Calentando"
+    }[state['status']]
+    st.info(f"⏳ {label} el modelo por defecto... ({state.get('elapsed_seconds', 0):.0f} s)")
+
+def show_cascade_sidebar():
+    """Activar la cascada de dos etapas y ajustar su umbral de confianza"""
+    with st.expander("⚡ Modo cascada"):
+        fast_model_available = Config.CASCADE_MODEL_PATH.exists()
+        st.checkbox(
+            "Usar modelo ligero como primera etapa",
+            key="cascade_enabled",
+            disabled=not fast_model_available,
+            help="Solo las imágenes con confianza baja pasan al modelo principal"
+        )
+        st.slider(
+            "Umbral de confianza",
+            min_value=0.5, max_value=0.99, step=0.01,
+            key="cascade_threshold",
+            disabled=not fast_model_available
+        )
+        if fast_model_available:
+            st.caption(f"Modelo ligero: {Config.CASCADE_MODEL_PATH.name}")
+        else:
+            st.caption(f"No se encontró {Config.CASCADE_MODEL_PATH}. Entrénalo con `python -m app.training cascade train`.")
+
+def load_cascade(model, image_processor, batch_size=None):
+    """Cascada configurada en la barra lateral, o None si está desactivada o no hay modelo ligero"""
+    if not st.session_state.cascade_enabled or not Config.CASCADE_MODEL_PATH.exists():
+        return None
+    fast_model = st.session_state.model_manager._load_model_from_path(str(Config.CASCADE_MODEL_PATH))
+    if fast_model is None:
+        st.warning("⚠️ No se pudo cargar el modelo ligero; se usa solo el modelo principal")
+        return None
+    return CascadeClassifier(
+        fast_model, model, image_processor, threshold=st.session_state.cascade_threshold, batch_size=batch_size
+    )
+
+def show_comparison_sidebar():
+    """Registro de modelos y selección de los que se comparan con el modelo activo"""
+    registry = st.session_state.model_registry
+    
+    with st.expander("🆚 Comparación de Modelos"):
+        st.session_state.comparison_models = [
+            name for name in st.session_state.comparison_models if name in registry.names()
+        ]
+        st.multiselect(
+            "Modelos a comparar con el activo",
+            options=registry.names(),
+            key="comparison_models",
+            help="Cada imagen se decodifica y preprocesa una sola vez para todos los modelos"
+        )
         
-        progress_bar.empty()
-        status_text.empty()
+        for entry in registry.entries():
+            st.caption(f"**{entry['name']}** ({entry['role']}) · {entry['size_mb']:.1f} MB · {entry['path']}")
         
-        if results:
-            enhanced_results = report_gen.create_enhanced_results(results)
-            df_results = report_gen.create_dataframe(enhanced_results)
-            
-            successful_predictions = df_results[df_results['Prediccion'] != 'ERROR']
-            metrics = None
-            if not successful_predictions.empty and 'Resultado' in successful_predictions.columns:
-                metrics = metrics_calc.calculate_real_time_metrics(successful_predictions)
-            
-            st.session_state.analysis_results = results
-            st.session_state.enhanced_results = enhanced_results
-            st.session_state.df_results = df_results
-            st.session_state.successful_predictions = successful_predictions
-            st.session_state.analysis_metrics = metrics
-            st.session_state.analysis_completed = True
-            st.session_state.current_results_df = successful_predictions
-            
-            st.success(f"✅ Procesamiento completado. {len(results)} imágenes analizadas.")
-            st.rerun()
+        name = st.text_input("Nombre", key="registry_name")
+        path = st.text_input("Ruta del modelo", key="registry_path")
+        role = st.selectbox("Rol", ["candidato", "producción"], key="registry_role")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("➕ Registrar", key="btn_register_model"):
+                try:
+                    registry.register(name, path, role)
+                    st.success(f"✅ Modelo '{name}' registrado")
+                except Exception as e:
+                    st.error(f"❌ {str(e)}")
+        with col2:
+            if st.button("➖ Quitar", key="btn_remove_model", disabled=name not in registry.names()):
+                registry.remove(name)
+                st.rerun()
 
-def show_persistent_results():
+def compare_files(uploaded_files, model, image_processor, metrics_calc):
+    """Puntuar los archivos con el modelo activo y los registrados seleccionados en una sola pasada"""
+    registry = st.session_state.model_registry
+    model_manager = st.session_state.model_manager
+    
+    models = {ModelComparison.ACTIVE_MODEL_NAME: model}
+    for name in st.session_state.comparison_models:
+        entry = registry.get(name)
+        if entry is None:
+            continue
+        with st.spinner(f"Cargando modelo '{name}'..."):
+            registered_model = model_manager._load_model_from_path(entry['path'], st.session_state.lazy_weights)
+        if registered_model is None:
+            st.error(f"❌ No se pudo cargar el modelo '{name}'")
+            return False
+        models[name] = registered_model
+    
+    tracker = st.session_state.performance_tracker
+    tracker.start_run()
+    progress_bar = st.progress(0)
+    
+    batch_size = InferenceAutotuner().batch_size_for(st.session_state.get('model_path'))
+    comparison = ModelComparison(
+        image_processor, metrics_calc,
+        batch_size=shared_governor().admit(batch_size, memory_evictors(), stage='comparación')
+    )
+    scheduler = shared_scheduler()
+    with scheduler.job(st.session_state.session_id, len(uploaded_files) * len(models)) as job:
+        results = comparison.run(
+            uploaded_files, models,
+            slot=lambda images: scheduler.slot(job, images * len(models)),
+            progress_callback=lambda done, total: progress_bar.progress(done / total)
+        )
+    
+    progress_bar.empty()
+    tracker.end_run()
+    st.session_state.comparison_results = results
+    return True
+
+def show_comparison_results():
+    """Mostrar resultados de la comparación de modelos"""
+    results = st.session_state.comparison_results
+    st.subheader("🆚 Comparación de Modelos")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Imágenes", f"{results['scored']} / {results['images']}")
+    with col2:
+        st.metric("Acuerdo entre modelos", f"{results['agreement_rate']:.1%}")
+    with col3:
+        st.metric("Discrepancias", len(results['disagreements']))
+    
+    st.markdown("**📈 Métricas por modelo**")
+    if not results['metrics_table'].empty:
+        st.dataframe(results['metrics_table'], use_container_width=True)
+    
+    if len(results['models']) > 2:
+        st.markdown("**🤝 Acuerdo por pares**")
+        st.dataframe(results['pairwise_agreement'].style.format("{:.1%}"), use_container_width=True)
+    
+    if not results['disagreements'].empty:
+        with st.expander(f"⚠️ Imágenes con discrepancias ({len(results['disagreements'])})"):
+            columns = ['Nombre_Archivo', 'Diagnostico'] + [
+                column for column in results['disagreements'].columns if column.startswith('Prediccion_')
+            ]
+            st.dataframe(results['disagreements'][columns], use_container_width=True)
+    
+    st.markdown("**📋 Resultados por imagen**")
+    st.dataframe(results['df'], use_container_width=True)
+    
+    st.download_button(
+        label="📄 Descargar comparación (CSV)",
+        data=results['df'].to_csv(index=False, encoding='utf-8'),
+        file_name="comparacion_modelos.csv",
+        mime="text/csv"
+    )
+    
+    show_performance_panel()
+
+def show_persistent_results(model):
     """Mostrar resultados persistentes del análisis"""
     st.subheader("📊 Resultados del Análisis")
+    if st.session_state.run_id:
+        st.caption(f"💾 Ejecución {st.session_state.run_id} guardada en {st.session_state.run_store.db_path.name}")
     
     df_results = st.session_state.df_results
     enhanced_results = st.session_state.enhanced_results
@@ -209,74 +656,345 @@ def show_persistent_results():
     report_gen = st.session_state.report_gen
     visualizer = st.session_state.visualizer
     
-    def color_resultado(val):
-        colors_map = {
-            'VP': 'background-color: #d4edda; color: #155724',
-            'VN': 'background-color: #d1ecf1; color: #0c5460',
-            'FP': 'background-color: #fff3cd; color: #856404',
-            'FN': 'background-color: #f8d7da; color: #721c24',
-            'ERROR': 'background-color: #f5f5f5; color: #6c757d'
-        }
-        return colors_map.get(val, '')
+    if st.session_state.results_table is None:
+        st.session_state.results_table = ResultsTable(df_results)
+    results_table = st.session_state.results_table
     
-    if 'Resultado' in df_results.columns:
-        styled_df = df_results.style.applymap(color_resultado, subset=['Resultado'])
-        st.dataframe(styled_df, use_container_width=True)
-    else:
-        st.dataframe(df_results, use_container_width=True)
+    show_results_table(results_table)
+    
+    show_explanations(model, df_results)
     
     if metrics and not successful_predictions.empty:
         visualizer.display_metrics_dashboard(metrics, successful_predictions)
     
-    show_summary_stats(df_results, successful_predictions)
+    show_summary_stats(results_table.summary)
+    
+    if 'Duplicado_De' in df_results.columns:
+        reused = df_results['Duplicado_De'].notna().sum()
+        if reused:
+            st.info(f"🧬 {reused} imagen(es) casi idénticas a otras ya analizadas reutilizaron su predicción (columna Duplicado_De)")
+    
+    if 'Etapa_Decision' in df_results.columns:
+        decided = df_results['Etapa_Decision'].isin([CascadeClassifier.STAGE_FAST, CascadeClassifier.STAGE_MAIN])
+        if decided.any():
+            escalated = (df_results.loc[decided, 'Etapa_Decision'] == CascadeClassifier.STAGE_MAIN).mean()
+            st.info(f"⚡ Cascada: {escalated:.1%} de las imágenes pasaron al modelo principal")
     
-    show_download_section_persistent(enhanced_results, df_results, report_gen)
+    # La ejecución se cierra tras mostrar sus resultados por primera vez (incluye los gráficos)
+    st.session_state.performance_tracker.end_run()
+    show_performance_panel()
+    
+    show_profile_downloads()
+    
+    show_download_section_persistent(enhanced_results, df_results, metrics, report_gen)
 
-def show_download_section_persistent(enhanced_results, df_results, report_gen):
-    """Mostrar sección de descarga usando datos del session_state"""
-    st.subheader("💾 Descargar Reporte")
+def load_explainer(model):
+    """Explicador Grad-CAM del modelo activo (uno por modelo y sesión), o None si la arquitectura no lo permite"""
+    cached = st.session_state.explainer
+    if cached is not None and cached[0] is model:
+        return cached[1]
+    try:
+        explainer = GradCamExplainer(
+            model, current_model_hash(), image_processor=st.session_state.image_processor,
+            batch_size=InferenceAutotuner().batch_size_for(st.session_state.get('model_path'))
+        )
+    except ValueError as e:
+        st.info(f"ℹ️ {str(e)}")
+        return None
+    st.session_state.explainer = (model, explainer)
+    return explainer
+
+def show_explanations(model, df_results):
+    """Mapas Grad-CAM bajo demanda: nada se calcula hasta activar la sección y solo para las imágenes elegidas"""
+    sources = st.session_state.explain_sources
+    if not sources:
+        return
+    if not st.toggle("🔍 Explicaciones (Grad-CAM)", key="explain_enabled",
+                     help="Muestra las zonas de la imagen que más pesaron en la predicción"):
+        return
     
-    if 'excel_report_data' not in st.session_state:
-        st.session_state.excel_report_data = report_gen.create_excel_report(enhanced_results)
-    if 'csv_report_data' not in st.session_state:
-        st.session_state.csv_report_data = df_results.to_csv(index=False, encoding='utf-8-sig')
+    valid = df_results[df_results['Prediccion'] != 'ERROR'].drop_duplicates('Nombre_Archivo').set_index('Nombre_Archivo')
+    names = [name for name in valid.index if name in sources]
+    if 'explain_files' not in st.session_state:
+        errors = valid.index[valid['Resultado'].isin(['FP', 'FN'])] if 'Resultado' in valid.columns else []
+        st.session_state.explain_files = [name for name in errors if name in sources][:Config.SALIENCY_DEFAULT_ROWS]
+    selected = st.multiselect("Imágenes a explicar (por defecto falsos positivos y negativos)", names, key="explain_files")
+    if not selected:
+        st.caption("Elige una o más imágenes para ver su mapa de atención")
+        return
     
-    col1, col2 = st.columns(2)
+    explainer = load_explainer(model)
+    if explainer is None:
+        return
+    scheduler = shared_scheduler()
+    with st.spinner(f"Calculando mapas de atención de {len(selected)} imágenes..."):
+        with scheduler.job(st.session_state.session_id, len(selected)) as job:
+            cams = explainer.explain([sources[name] for name in selected], slot=lambda images: scheduler.slot(job, images))
+    
+    cols = st.columns(4)
+    for i, name in enumerate(selected):
+        image_hash, uploaded_file = sources[name]
+        row = valid.loc[name]
+        with cols[i % 4]:
+            if image_hash not in cams:
+                st.caption(f"⚠️ {name}: no se pudo calcular el mapa")
+                continue
+            overlay = explainer.overlay(st.session_state.image_processor.load_image(uploaded_file), cams[image_hash])
+            st.image(overlay, caption=f"{name} · {row['Prediccion']} ({row.get('Resultado', '-')})")
+
+def show_history_page():
+    """Tendencias y filas del historial; los agregados se calculan en SQLite"""
+    st.subheader("📈 Historial de Predicciones")
+    history = st.session_state.history_store
+    visualizer = st.session_state.visualizer
+    
+    models_df = history.models()
+    if models_df.empty:
+        st.info("Aún no hay predicciones guardadas. Cada análisis completado se agrega al historial.")
+        return
+    
+    model_labels = {
+        f"{row.model_hash[:8]} · {Path(row.model_path).name if row.model_path else 'sin ruta'}": row.model_hash
+        for row in models_df.itertuples()
+    }
+    periods = {"Día": 'day', "Semana": 'week', "Mes": 'month'}
+    
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        model_label = st.selectbox("Modelo", ["Todos"] + list(model_labels), key="history_model")
+    with col2:
+        date_range = st.date_input(
+            "Rango de fechas", value=(date.today() - timedelta(days=30), date.today()), key="history_dates"
+        )
+    with col3:
+        period = st.selectbox("Agrupar por", list(periods), key="history_period")
+    
+    filters = {
+        'model_hash': model_labels.get(model_label),
+        'date_from': date_range[0] if date_range else None,
+        'date_to': date_range[-1] if date_range else None
+    }
+    
+    summary = history.summary(**filters)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Predicciones", f"{summary['predictions']:,}")
+    col2.metric("Marcadas malignas", f"{summary['malignant']:,}")
+    col3.metric("Tasa de malignos", f"{summary['malignant_rate']:.1%}")
+    col4.metric("Confianza media", f"{summary['avg_confidence']:.3f}")
+    
+    if summary['predictions'] == 0:
+        st.info("No hay predicciones para los filtros seleccionados.")
+        return
     
+    trend = history.trend(periods[period], **filters)
+    names = {model_hash: label for label, model_hash in model_labels.items()}
+    trend['Modelo'] = trend['model_hash'].map(names).fillna(trend['model_hash'])
+    col1, col2 = st.columns(2)
     with col1:
+        st.plotly_chart(
+            visualizer.create_history_trend_chart(trend, 'malignant_rate', "Tasa de predicciones malignas", percent=True),
+            use_container_width=True
+        )
+    with col2:
+        st.plotly_chart(
+            visualizer.create_history_trend_chart(trend, 'avg_confidence', "Confianza media"),
+            use_container_width=True
+        )
+    
+    with st.expander("📋 Distribución por clase y resultado"):
+        distribution = history.class_distribution(**filters)
+        st.dataframe(
+            distribution.pivot_table(index='prediction', columns='result', values='predictions', fill_value=0),
+            use_container_width=True
+        )
+    
+    with st.expander("🧠 Modelos"):
+        st.dataframe(models_df, use_container_width=True)
+    
+    with st.expander("🔎 Predicciones individuales"):
+        prediction = st.selectbox("Clase", ["Todas"] + list(Config.CLASS_MAPPING.values()), key="history_class")
+        page_number = st.number_input("Página", min_value=1, value=1, step=1, key="history_page")
+        page_size = 100
+        rows = history.predictions(
+            limit=page_size, offset=(page_number - 1) * page_size,
+            prediction=None if prediction == "Todas" else prediction, **filters
+        )
+        st.dataframe(rows, use_container_width=True)
+
+def show_performance_panel():
+    """Mostrar panel colapsable con los tiempos por etapa"""
+    tracker = st.session_state.performance_tracker
+    governor = shared_governor()
+    decisions = governor.decisions()
+    if not tracker.enabled and not decisions:
+        return
+    
+    with st.expander("⏱️ Performance"):
+        show_memory_status(governor, decisions)
+        if not tracker.enabled:
+            return
+        
+        run = tracker.run_summary()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Imágenes medidas", run['images'])
+        with col2:
+            st.metric("Tiempo total", f"{run['seconds']:.2f} s" if run['seconds'] else "N/A")
+        with col3:
+            st.metric("Imágenes/s", f"{run['images_per_second']:.2f}" if run['images_per_second'] else "N/A")
+        
+        stage_summary = tracker.stage_summary()
+        if stage_summary:
+            st.dataframe(pd.DataFrame(stage_summary), use_container_width=True)
+        
         st.download_button(
-            label="📊 Descargar Reporte Excel",
-            data=st.session_state.excel_report_data,
-            file_name=f"reporte_cancer_mama_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            help="Reporte profesional con formato y colores"
+            label="📈 Descargar métricas (Prometheus)",
+            data=tracker.to_prometheus(),
+            file_name="breast_cancer_classifier.prom",
+            mime="text/plain"
         )
 
-    st.info("💡 Los reportes se mantienen disponibles hasta que hagas un nuevo análisis")
+def show_memory_status(governor, decisions):
+    """Memoria residente frente al presupuesto y decisiones recientes del gobernador"""
+    status = governor.status()
+    level_icons = {governor.LEVEL_NORMAL: "🟢", governor.LEVEL_HIGH: "🟠", governor.LEVEL_CRITICAL: "🔴"}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Memoria residente", f"{status['rss_mb']:.0f} MB")
+    with col2:
+        st.metric("Presupuesto", f"{status['budget_mb']:.0f} MB")
+    with col3:
+        st.metric("Presión", f"{level_icons[status['level']]} {100 * status['pressure']:.0f}%")
+    if decisions:
+        st.caption("Decisiones del gobernador de memoria")
+        st.dataframe(pd.DataFrame(decisions[::-1]), use_container_width=True, hide_index=True)
+
+def show_profile_downloads():
+    """Mostrar descargas del perfilado de la última ejecución"""
+    artifacts = st.session_state.profile_artifacts
+    if not artifacts:
+        return
+    
+    with st.expander("🔬 Perfilado de la Ejecución"):
+        st.write(f"Muestras de pila: {artifacts['samples']} (intervalo {artifacts['interval'] * 1000:.0f} ms)")
+        if artifacts['top_functions']:
+            st.dataframe(pd.DataFrame(artifacts['top_functions']), use_container_width=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if artifacts['prof_path'] and Path(artifacts['prof_path']).exists():
+                st.download_button(
+                    label="📥 Descargar .prof",
+                    data=Path(artifacts['prof_path']).read_bytes(),
+                    file_name=Path(artifacts['prof_path']).name,
+                    mime="application/octet-stream",
+                    help="Abrir con snakeviz o pstats"
+                )
+        with col2:
+            if artifacts['collapsed_path'] and Path(artifacts['collapsed_path']).exists():
+                st.download_button(
+                    label="🔥 Descargar pilas colapsadas",
+                    data=Path(artifacts['collapsed_path']).read_bytes(),
+                    file_name=Path(artifacts['collapsed_path']).name,
+                    mime="text/plain",
+                    help="Compatible con flamegraph.pl y speedscope"
+                )
+
+def show_download_section_persistent(enhanced_results, df_results, metrics, report_gen):
+    """Reportes bajo demanda: se generan en segundo plano al pedirlos y se guardan en disco por ejecución"""
+    st.subheader("💾 Descargar Reporte")
+    cache = shared_report_cache()
+    run_id = st.session_state.run_id
+    formats = ReportCache.available_formats(len(df_results))
+    
+    for column, fmt in zip(st.columns(len(formats)), formats):
+        info = ReportCache.FORMATS[fmt]
+        with column:
+            state = cache.state(run_id, fmt)
+            if state['status'] in (ReportCache.STATUS_MISSING, ReportCache.STATUS_ERROR):
+                if state['status'] == ReportCache.STATUS_ERROR:
+                    st.error(f"❌ {info['label']}: {state['error']}")
+                if st.button(f"{info['icon']} Preparar {info['label']}", key=f"report_request_{fmt}"):
+                    state = cache.request(run_id, fmt, enhanced_results, df_results, metrics, report_gen)
+            if state['status'] == ReportCache.STATUS_BUILDING:
+                wait_for_report(cache, run_id, fmt)
+            elif state['status'] == ReportCache.STATUS_READY:
+                st.download_button(
+                    label=f"{info['icon']} Descargar {info['label']}",
+                    # Los bytes se leen del disco al pulsar, no se guardan en la sesión
+                    data=report_reader(cache, run_id, fmt, enhanced_results, df_results, metrics, report_gen),
+                    file_name=f"reporte_cancer_mama_{run_id}.{fmt}",
+                    mime=info['mime'],
+                    key=f"report_download_{fmt}",
+                    help=f"{state['bytes'] / 1024:,.0f} KB"
+                )
+    
+    if len(df_results) >= Config.REPORT_CSV_CHUNK_ROWS:
+        st.caption("🗜️ Para ejecuciones grandes, CSV comprimido y Parquet se generan mucho más rápido que Excel")
+    st.info(f"💡 Los reportes se guardan en disco y siguen disponibles {Config.REPORT_CACHE_TTL_SECONDS / 3600:.0f} h desde su último uso")
+
+def report_reader(cache, run_id, fmt, enhanced_results, df_results, metrics, report_gen):
+    """Lectura diferida del reporte; si caducó entre el render y el clic se regenera"""
+    def read():
+        path = cache.get(run_id, fmt) or cache.build(run_id, fmt, enhanced_results, df_results, metrics, report_gen)
+        return path.read_bytes()
+    return read
+
+@st.fragment(run_every=1)
+def wait_for_report(cache, run_id, fmt):
+    """Progreso de la generación de un reporte; recarga la aplicación cuando termina"""
+    state = cache.state(run_id, fmt)
+    if state['status'] != ReportCache.STATUS_BUILDING:
+        st.rerun()
+    st.progress(state['progress'], text=f"⏳ Generando {ReportCache.FORMATS[fmt]['label']}... {state['progress']:.0%}")
+
+def show_results_table(results_table):
+    """Tabla de resultados paginada: filtros y orden en el servidor, solo se estiliza la página visible"""
+    col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
+    with col1:
+        resultados = st.multiselect("Resultado", results_table.options('Resultado'), key="results_filter_resultado")
+    with col2:
+        predicciones = st.multiselect("Predicción", results_table.options('Prediccion'), key="results_filter_prediccion")
+    with col3:
+        sort = st.selectbox("Ordenar", list(ResultsTable.SORT_OPTIONS), key="results_sort")
+    with col4:
+        page_size = st.selectbox("Filas", [25, 50, 100, 250], index=1, key="results_page_size")
+    
+    index = results_table.query(resultados, predicciones, sort)
+    pages = results_table.page_count(len(index), page_size)
+    if st.session_state.get("results_page", 1) > pages:
+        st.session_state.results_page = 1
+    
+    page_number = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, step=1, key="results_page")
+    st.dataframe(results_table.page(index, page_number, page_size), use_container_width=True)
+    st.caption(f"{len(index)} de {results_table.summary['total']} filas")
 
-def show_summary_stats(df_results, successful_predictions):
-    """Mostrar resumen estadístico"""
+def show_summary_stats(summary):
+    """Mostrar resumen estadístico (calculado una vez por ejecución)"""
     st.subheader("📈 Resumen Estadístico")
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Total Imágenes", len(df_results))
+        st.metric("Total Imágenes", summary['total'])
     with col2:
-        st.metric("Procesadas Exitosamente", len(successful_predictions))
+        st.metric("Procesadas Exitosamente", summary['successful'])
     with col3:
-        st.metric("Errores", len(df_results) - len(successful_predictions))
+        st.metric("Errores", summary['errors'])
     
-    if len(successful_predictions) > 0:
+    if summary['successful'] > 0:
         st.subheader("🔍 Distribución de Predicciones")
-        prediction_counts = successful_predictions['Prediccion'].value_counts()
+        prediction_counts = summary['predictions']
         
         col1, col2 = st.columns(2)
         with col1:
             st.bar_chart(prediction_counts)
         with col2:
             for pred, count in prediction_counts.items():
-                percentage = (count / len(successful_predictions)) * 100
+                percentage = (count / summary['successful']) * 100
                 st.write(f"**{pred}**: {count} imágenes ({percentage:.1f}%)")
+            if summary['mean_confidence'] is not None:
+                st.write(f"**Confianza media**: {summary['mean_confidence']:.3f} "
+                         f"({summary['low_confidence']} imágenes por debajo de 0.6)")
 
 def show_instructions():
     """Mostrar instrucciones de uso"""
@@ -0,0 +1,18 @@
+"""
+Utilidades de entrenamiento y evaluación del clasificador
+"""
+
+from .dataset_shards import DatasetShardBuilder, ShardedDataset
+from .pipeline import TrainingDataPipeline
+from .embeddings import EmbeddingTrainer
+from .cascade import CascadeEvaluator
+from .distillation import DistillationTrainer
+
+__all__ = [
+    'DatasetShardBuilder',
+    'ShardedDataset',
+    'TrainingDataPipeline',
+    'EmbeddingTrainer',
+    'CascadeEvaluator',
+    'DistillationTrainer'
+]
@@ -0,0 +1,32 @@
+"""
+Línea de comandos de entrenamiento y evaluación.
+
+Uso:
+    python -m app.training <comando> [opciones]
+"""
+
+import argparse
+
+from app.training import cascade, dataset_shards, distillation, embeddings, pipeline
+
+COMMANDS = {
+    'shards': (dataset_shards, "Construir shards memory-mapped del dataset"),
+    'benchmark': (pipeline, "Comparar imágenes/s del generador anterior contra tf.data"),
+    'embeddings': (embeddings, "Entrenar cabezas sobre características cacheadas del backbone"),
+    'distill': (distillation, "Destilar el modelo completo a un estudiante MobileNetV2 y compararlos"),
+    'cascade': (cascade, "Entrenar el modelo ligero de la cascada y evaluarla sobre test_images"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.training")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (module, help_text) in COMMANDS.items():
+        module.add_arguments(subparsers.add_parser(name, help=help_text, description=help_text))
+
+    args = parser.parse_args()
+    COMMANDS[args.command][0].run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Modelo ligero de primera etapa para la cascada y su evaluación.
+
+El modelo ligero trabaja a Config.CASCADE_INPUT_SIZE (128x128) y se entrena
+sobre los shards con la misma partición 80/10/10 de los notebooks. La
+evaluación preprocesa test_images/ una sola vez y compara el modelo
+principal solo contra la cascada para varios umbrales.
+
+Uso:
+    python -m app.training cascade train --epochs 30
+    python -m app.training cascade eval --model models/trained/model_complete.h5 --thresholds 0.8 0.9 0.95
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from app.config import Config
+from app.training.dataset_shards import ShardedDataset
+from app.training.pipeline import TrainingDataPipeline
+from app.utils.cascade import CascadeClassifier
+from app.utils.image_processing import ImageProcessor
+from app.utils.metrics_calculator import MetricsCalculator
+
+
+def build_fast_model(input_size=None):
+    """CNN pequeña (~100k parámetros) con la misma entrada normalizada [0, 1] que el modelo principal"""
+    config = Config()
+    input_size = tuple(input_size or config.CASCADE_INPUT_SIZE)
+    layers = [tf.keras.Input(input_size)]
+    for filters in (16, 32, 64, 128):
+        layers += [
+            tf.keras.layers.Conv2D(filters, 3, strides=2, padding='same', use_bias=False),
+            tf.keras.layers.BatchNormalization(momentum=0.9),
+            tf.keras.layers.ReLU()
+        ]
+    layers += [
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dropout(0.3),
+        tf.keras.layers.Dense(len(config.CLASS_MAPPING), activation='softmax')
+    ]
+    model = tf.keras.Sequential(layers, name="cascade_fast")
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def train_fast_model(sharded_dataset, epochs=30, batch_size=32, output_path=None):
+    """Entrenar el modelo ligero sobre los shards y guardarlo sin estado del optimizador"""
+    config = Config()
+    size = config.CASCADE_INPUT_SIZE[:2]
+    pipeline = TrainingDataPipeline(batch_size=batch_size)
+    (train_ds, valid_ds, test_ds), _ = pipeline.build_from_shards(sharded_dataset)
+
+    def downscale(images, labels):
+        return tf.image.resize(images, size), labels
+
+    def augment(images, labels):
+        return tf.image.random_flip_left_right(images), labels
+
+    train_ds = train_ds.map(downscale).map(augment)
+    valid_ds, test_ds = valid_ds.map(downscale), test_ds.map(downscale)
+
+    model = build_fast_model()
+    start = time.perf_counter()
+    model.fit(
+        train_ds, validation_data=valid_ds, epochs=epochs, verbose=2,
+        callbacks=[tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=8, restore_best_weights=True)]
+    )
+    train_seconds = time.perf_counter() - start
+    _, test_accuracy = model.evaluate(test_ds, verbose=0)
+
+    output_path = Path(output_path or config.CASCADE_MODEL_PATH)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    model.save(str(output_path), include_optimizer=False)
+    return model, {'train_seconds': train_seconds, 'test_accuracy': test_accuracy, 'path': str(output_path)}
+
+
+class CascadeEvaluator:
+    """Comparar el modelo principal solo contra la cascada sobre un directorio de prueba"""
+
+    def __init__(self, main_model, fast_model, batch_size=16):
+        self.config = Config()
+        self.main_model = main_model
+        self.fast_model = fast_model
+        self.batch_size = batch_size
+        self.image_processor = ImageProcessor()
+        self.metrics_calc = MetricsCalculator()
+
+    def _batches(self, images):
+        for start in range(0, len(images), self.batch_size):
+            yield images[start:start + self.batch_size]
+
+    def _main_only(self, images):
+        probabilities = [self.image_processor.predict_batch(batch, self.main_model) for batch in self._batches(images)]
+        return np.concatenate(probabilities), None
+
+    def _cascade(self, images, threshold):
+        cascade = CascadeClassifier(self.fast_model, self.main_model, self.image_processor, threshold=threshold)
+        probabilities, stages = [], []
+        for batch in self._batches(images):
+            batch_probabilities, batch_stages, _ = cascade.classify_batch(batch)
+            probabilities.append(batch_probabilities)
+            stages.append(batch_stages)
+        return np.concatenate(probabilities), np.concatenate(stages)
+
+    def _timed(self, function, *args):
+        start = time.perf_counter()
+        probabilities, stages = function(*args)
+        return probabilities, stages, time.perf_counter() - start
+
+    def _row(self, mode, threshold, probabilities, stages, seconds, filenames, reference):
+        predictions = [self.config.CLASS_MAPPING[int(i)] for i in probabilities.argmax(axis=1)]
+        results = [
+            self.metrics_calc.calculate_classification_result(
+                prediction, self.metrics_calc.extract_diagnosis_from_filename(filename)
+            )
+            for prediction, filename in zip(predictions, filenames)
+        ]
+        counts = pd.Series(results).value_counts()
+        metrics = self.metrics_calc.calculate_real_time_metrics(pd.DataFrame({'Resultado': results}))
+        escalated = float(np.mean(stages == CascadeClassifier.STAGE_MAIN)) if stages is not None else 1.0
+        return {
+            'Modo': mode,
+            'Umbral': threshold,
+            'Escaladas_%': round(100 * escalated, 1),
+            'Segundos': round(seconds, 2),
+            'Imagenes_por_s': round(len(filenames) / seconds, 1),
+            'Exactitud': round(metrics['accuracy'], 4),
+            'Sensibilidad': round(metrics['sensitivity'], 4),
+            'VP': int(counts.get('VP', 0)),
+            'VN': int(counts.get('VN', 0)),
+            'FP': int(counts.get('FP', 0)),
+            'FN': int(counts.get('FN', 0)),
+            'Cambios_vs_principal': int(sum(a != b for a, b in zip(predictions, reference))) if reference else 0
+        }, predictions
+
+    def evaluate(self, test_dir, thresholds):
+        images, df = TrainingDataPipeline().load_preprocessed(test_dir)
+        filenames = [Path(path).name for path in df['Path']]
+
+        # Calentamiento para no medir el trazado de las funciones de predicción
+        self.image_processor.predict_batch(images[:self.batch_size], self.main_model)
+        self.image_processor.predict_batch(
+            tf.image.resize(images[:self.batch_size], self.fast_model.input_shape[1:3]).numpy(), self.fast_model
+        )
+
+        probabilities, stages, seconds = self._timed(self._main_only, images)
+        main_row, reference = self._row('Principal', None, probabilities, stages, seconds, filenames, None)
+        rows = [main_row]
+        for threshold in thresholds:
+            probabilities, stages, seconds = self._timed(self._cascade, images, threshold)
+            row, _ = self._row('Cascada', threshold, probabilities, stages, seconds, filenames, reference)
+            rows.append(row)
+
+        df = pd.DataFrame(rows)
+        df['Aceleracion'] = (df['Imagenes_por_s'] / main_row['Imagenes_por_s']).round(2)
+        df['Delta_FN'] = df['FN'] - main_row['FN']
+        return df
+
+
+def add_arguments(parser):
+    config = Config()
+    parser.add_argument("action", choices=['train', 'eval'])
+    parser.add_argument("--shards", default=None, help="Directorio de shards para 'train' (por defecto Config.SHARDS_DIR)")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--model", default=str(config.DEFAULT_MODEL_PATH), help="Modelo principal para 'eval'")
+    parser.add_argument("--fast-model", default=str(config.CASCADE_MODEL_PATH), help="Modelo ligero de primera etapa")
+    parser.add_argument("--test-dir", default=str(config.PROJECT_ROOT / "test_images"))
+    parser.add_argument("--thresholds", type=float, nargs='+', default=[0.8, config.CASCADE_THRESHOLD, 0.95])
+    parser.add_argument("--batch-size", type=int, default=16)
+
+
+def run(args):
+    if args.action == 'train':
+        _, summary = train_fast_model(ShardedDataset(args.shards), args.epochs, args.batch_size, args.fast_model)
+        print(f"Modelo ligero guardado en {summary['path']} | entrenamiento {summary['train_seconds']:.1f} s | "
+              f"exactitud test (shards) {summary['test_accuracy']:.4f}")
+        return
+
+    main_model = tf.keras.models.load_model(args.model, compile=False)
+    fast_model = tf.keras.models.load_model(args.fast_model, compile=False)
+    evaluator = CascadeEvaluator(main_model, fast_model, batch_size=args.batch_size)
+    print(evaluator.evaluate(args.test_dir, args.thresholds).to_string(index=False))
@@ -0,0 +1,279 @@
+"""
+Shards .npy memory-mapped del dataset preprocesado.
+
+Cada imagen del dataset se decodifica y redimensiona una sola vez a
+256x256 uint8; los entrenamientos y evaluaciones posteriores leen los
+shards con np.load(mmap_mode='r') sin volver a decodificar los PNG.
+
+Uso:
+    python -m app.training shards --dataset dataset --output data/shards
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.config import Config
+from app.files import MASK_PATTERN, file_sha256, is_mask_file  # noqa: F401  (pipeline importa is_mask_file de aquí)
+
+INTERPOLATIONS = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC
+}
+
+
+class DatasetShardBuilder:
+    """Construir e incrementar shards memory-mapped a partir de dataset/<clase>/*.png"""
+
+    MANIFEST_NAME = "manifest.json"
+    MANIFEST_VERSION = 1
+
+    def __init__(self, dataset_dir=None, output_dir=None, shard_size=None, interpolation='nearest'):
+        self.config = Config()
+        self.dataset_dir = Path(dataset_dir or self.config.DATASET_DIR)
+        self.output_dir = Path(output_dir or self.config.SHARDS_DIR)
+        self.shard_size = shard_size or self.config.SHARD_SIZE
+        self.image_size = tuple(self.config.INPUT_SIZE)
+        # ImageDataGenerator.flow_from_dataframe usa interpolación 'nearest' por defecto
+        self.interpolation = interpolation
+        self.classes = [name.lower() for _, name in sorted(self.config.CLASS_MAPPING.items())]
+
+    @property
+    def manifest_path(self):
+        return self.output_dir / self.MANIFEST_NAME
+
+    def scan(self):
+        """Listar imágenes del dataset (sin máscaras) con sus máscaras asociadas"""
+        items = []
+        for label, class_name in enumerate(self.classes):
+            class_dir = self.dataset_dir / class_name
+            if not class_dir.is_dir():
+                continue
+
+            images = {}
+            masks = {}
+            for path in sorted(class_dir.iterdir()):
+                if path.suffix.lower().lstrip('.') not in self.config.SUPPORTED_FORMATS:
+                    continue
+                match = MASK_PATTERN.match(path.stem)
+                if match:
+                    masks.setdefault(match.group('base'), []).append(path)
+                else:
+                    images[path.stem] = path
+
+            for stem, path in images.items():
+                items.append({
+                    'path': path,
+                    'class': class_name,
+                    'label': label,
+                    'masks': [self._relative(mask) for mask in masks.get(stem, [])]
+                })
+        return items
+
+    def load_manifest(self):
+        """Cargar el manifiesto existente (o uno vacío)"""
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if (manifest.get('version') == self.MANIFEST_VERSION
+                    and tuple(manifest.get('image_size', ())) == self.image_size
+                    and manifest.get('interpolation') == self.interpolation):
+                return manifest
+
+        return {
+            'version': self.MANIFEST_VERSION,
+            'image_size': list(self.image_size),
+            'interpolation': self.interpolation,
+            'classes': self.classes,
+            'shards': [],
+            'entries': []
+        }
+
+    def build(self, rebuild=False, progress_callback=None):
+        """
+        Construir los shards; solo se procesan archivos nuevos o modificados.
+        Las filas de archivos modificados o eliminados quedan huérfanas en
+        sus shards hasta una reconstrucción con rebuild=True.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        manifest = self.load_manifest()
+        if rebuild:
+            self._remove_shards(manifest)
+            manifest['shards'] = []
+            manifest['entries'] = []
+
+        known = {entry['path']: entry for entry in manifest['entries']}
+        entries = []
+        pending = []
+
+        for item in self.scan():
+            rel_path = self._relative(item['path'])
+            stat = item['path'].stat()
+            entry = known.get(rel_path)
+
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                entry['masks'] = item['masks']
+                entries.append(entry)
+                continue
+
+            sha256 = file_sha256(item['path'])
+            if entry and entry['sha256'] == sha256:
+                entry.update({'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'masks': item['masks']})
+                entries.append(entry)
+                continue
+
+            pending.append((item['path'], {
+                'path': rel_path,
+                'class': item['class'],
+                'label': item['label'],
+                'sha256': sha256,
+                'masks': item['masks'],
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns
+            }))
+
+        for start in range(0, len(pending), self.shard_size):
+            chunk = pending[start:start + self.shard_size]
+            shard = self._write_shard(manifest, chunk, progress_callback, start, len(pending))
+            manifest['shards'].append(shard)
+            entries.extend(entry for _, entry in chunk)
+
+        manifest['entries'] = entries
+        manifest['classes'] = self.classes
+        manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        self._write_manifest(manifest)
+
+        return {
+            'total': len(entries),
+            'added': len(pending),
+            'reused': len(entries) - len(pending),
+            'shards': len(manifest['shards'])
+        }
+
+    def _write_shard(self, manifest, chunk, progress_callback, offset, total):
+        index = max([int(shard['name'].split('_')[-1]) for shard in manifest['shards']] + [-1]) + 1
+        name = f"shard_{index:05d}"
+        images_path = self.output_dir / f"{name}_images.npy"
+        labels_path = self.output_dir / f"{name}_labels.npy"
+
+        images = np.lib.format.open_memmap(
+            images_path, mode='w+', dtype=np.uint8, shape=(len(chunk),) + self.image_size
+        )
+        labels = np.empty(len(chunk), dtype=np.int64)
+
+        for i, (source_path, entry) in enumerate(chunk):
+            images[i] = self._load_array(source_path)
+            labels[i] = entry['label']
+            entry['shard'] = name
+            entry['index'] = i
+            if progress_callback:
+                progress_callback(offset + i + 1, total)
+
+        images.flush()
+        del images
+        np.save(labels_path, labels)
+
+        return {
+            'name': name,
+            'images': images_path.name,
+            'labels': labels_path.name,
+            'count': len(chunk)
+        }
+
+    def _load_array(self, path):
+        with Image.open(path) as image:
+            image = image.convert('RGB')
+            if image.size != self.image_size[1::-1]:
+                image = image.resize(self.image_size[1::-1], INTERPOLATIONS[self.interpolation])
+            return np.asarray(image, dtype=np.uint8)
+
+    def _relative(self, path):
+        """Ruta relativa al directorio padre del dataset (p.ej. 'dataset/benign/x.png')"""
+        path = Path(path)
+        try:
+            return path.resolve().relative_to(self.dataset_dir.resolve().parent).as_posix()
+        except ValueError:
+            return path.resolve().as_posix()
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _remove_shards(self, manifest):
+        for shard in manifest['shards']:
+            for key in ('images', 'labels'):
+                try:
+                    (self.output_dir / shard[key]).unlink()
+                except FileNotFoundError:
+                    pass
+
+
+class ShardedDataset:
+    """Lectura zero-copy de los shards construidos por DatasetShardBuilder"""
+
+    def __init__(self, shards_dir=None):
+        self.config = Config()
+        self.shards_dir = Path(shards_dir or self.config.SHARDS_DIR)
+        manifest_path = self.shards_dir / DatasetShardBuilder.MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(
+                f"No existe {manifest_path}. Ejecuta: python -m app.training shards"
+            )
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        self.classes = self.manifest['classes']
+        self.entries = self.manifest['entries']
+        self._images = {}
+        for shard in self.manifest['shards']:
+            self._images[shard['name']] = np.load(self.shards_dir / shard['images'], mmap_mode='r')
+
+        self.labels = np.array([entry['label'] for entry in self.entries], dtype=np.int64)
+        self.paths = [entry['path'] for entry in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def image(self, i):
+        """Imagen uint8 (vista sobre el memmap, sin copia)"""
+        entry = self.entries[i]
+        return self._images[entry['shard']][entry['index']]
+
+    def batch(self, indices, normalize=True):
+        """Apilar un lote de imágenes; normalize=True devuelve float32 en [0, 1]"""
+        batch = np.stack([self.image(i) for i in indices])
+        if normalize:
+            return batch.astype(np.float32) / 255.0
+        return batch
+
+    def iter_batches(self, indices=None, batch_size=16, normalize=True):
+        """Iterar lotes (imágenes, etiquetas) sobre los índices indicados"""
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        for start in range(0, len(indices), batch_size):
+            batch_indices = indices[start:start + batch_size]
+            yield self.batch(batch_indices, normalize=normalize), self.labels[batch_indices]
+
+
+def add_arguments(parser):
+    config = Config()
+    parser.add_argument("--dataset", default=str(config.DATASET_DIR), help="Directorio con subcarpetas por clase")
+    parser.add_argument("--output", default=str(config.SHARDS_DIR), help="Directorio de salida de los shards")
+    parser.add_argument("--shard-size", type=int, default=config.SHARD_SIZE)
+    parser.add_argument("--interpolation", default='nearest', choices=sorted(INTERPOLATIONS))
+    parser.add_argument("--rebuild", action="store_true", help="Descartar shards existentes y reconstruir")
+
+
+def run(args):
+    builder = DatasetShardBuilder(args.dataset, args.output, args.shard_size, args.interpolation)
+    summary = builder.build(rebuild=args.rebuild)
+    print(f"Imágenes: {summary['total']} | nuevas: {summary['added']} | "
+          f"reutilizadas: {summary['reused']} | shards: {summary['shards']}")
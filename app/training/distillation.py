@@ -0,0 +1,245 @@
+"""
+Destilación del modelo completo (DenseNet121) a un estudiante ligero para CPU.
+
+El profesor se ejecuta una sola vez por imagen de los shards y sus
+probabilidades se guardan como objetivos blandos. El estudiante
+(MobileNetV2) se entrena con la combinación de etiquetas reales y
+objetivos suavizados con temperatura, y se exporta con ModelExporter: el
+mismo .h5 sin optimizador que carga ModelManager, con las mismas
+CLASS_MAPPING.
+
+Uso:
+    python -m app.training distill train --teacher models/trained/model_complete.h5
+    python -m app.training distill eval --teacher models/trained/model_complete.h5 --student models/trained/model_student.h5
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from sklearn.metrics import recall_score
+
+from app.config import Config
+from app.training.dataset_shards import ShardedDataset
+from app.training.pipeline import TrainingDataPipeline
+from app.utils.image_processing import ImageProcessor
+from app.utils.metrics_calculator import MetricsCalculator
+from app.utils.model_export import ModelExporter
+
+
+def soften(probabilities, temperature):
+    """Suavizar probabilidades softmax con temperatura (equivale a dividir los logits)"""
+    logits = tf.math.log(tf.clip_by_value(probabilities, 1e-7, 1.0)) / temperature
+    return tf.nn.softmax(logits, axis=-1)
+
+
+class DistillationLoss(tf.keras.losses.Loss):
+    """
+    alpha * CE(etiquetas) + (1 - alpha) * T² * KL(profesor_T || estudiante_T).
+    y_true concatena el one-hot de la etiqueta y las probabilidades del profesor.
+    """
+
+    def __init__(self, num_classes, temperature=4.0, alpha=0.3, name="distillation"):
+        super().__init__(name=name)
+        self.num_classes = num_classes
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def call(self, y_true, y_pred):
+        labels, teacher = y_true[:, :self.num_classes], y_true[:, self.num_classes:]
+        hard = tf.keras.losses.categorical_crossentropy(labels, y_pred)
+        soft = tf.keras.losses.KLD(soften(teacher, self.temperature), soften(y_pred, self.temperature))
+        return self.alpha * hard + (1 - self.alpha) * soft * self.temperature ** 2
+
+
+def build_student(weights='imagenet', width=0.5):
+    """MobileNetV2 con la misma entrada [0, 1] y la misma salida softmax que el modelo completo"""
+    config = Config()
+    backbone = tf.keras.applications.MobileNetV2(
+        input_shape=config.INPUT_SIZE, alpha=width, include_top=False, weights=weights, pooling='avg'
+    )
+    return tf.keras.Sequential([
+        tf.keras.Input(config.INPUT_SIZE),
+        # MobileNetV2 espera [-1, 1]
+        tf.keras.layers.Rescaling(2.0, offset=-1.0),
+        backbone,
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(len(config.CLASS_MAPPING), activation='softmax')
+    ], name="student_mobilenetv2")
+
+
+class DistillationTrainer:
+    """Entrenar un estudiante con los objetivos blandos de un profesor congelado"""
+
+    def __init__(self, teacher, sharded_dataset=None, temperature=4.0, alpha=0.3, batch_size=32, seed=123):
+        self.config = Config()
+        self.teacher = teacher
+        self.dataset = sharded_dataset or ShardedDataset()
+        self.temperature = temperature
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.pipeline = TrainingDataPipeline(batch_size=batch_size, seed=seed)
+
+    def teacher_probabilities(self):
+        """Probabilidades del profesor para todas las imágenes (una sola pasada)"""
+        return np.concatenate([
+            self.teacher.predict(images, verbose=0)
+            for images, _ in self.dataset.iter_batches(batch_size=self.batch_size)
+        ])
+
+    def split_indices(self):
+        """Índices train/val/test con la partición 80/10/10 de los notebooks"""
+        df = pd.DataFrame({
+            'Path': self.dataset.paths,
+            'Label': [self.dataset.classes[label] for label in self.dataset.labels],
+            'Index': np.arange(len(self.dataset))
+        })
+        return [split['Index'].values for split in self.pipeline.split(df)]
+
+    def _accuracy(self, model, indices, reference=None):
+        probabilities = model.predict(self.pipeline.from_shards(self.dataset, indices), verbose=0)
+        predictions = probabilities.argmax(axis=1)
+        expected = self.dataset.labels[indices] if reference is None else reference[indices].argmax(axis=1)
+        return float(np.mean(predictions == expected))
+
+    def train(self, student=None, epochs=30, learning_rate=1e-3):
+        """Entrenar el estudiante y devolver (estudiante, resumen con tiempos y exactitudes)"""
+        num_classes = len(self.config.CLASS_MAPPING)
+
+        start = time.perf_counter()
+        teacher_probabilities = self.teacher_probabilities()
+        teacher_seconds = time.perf_counter() - start
+
+        targets = np.concatenate([np.eye(num_classes)[self.dataset.labels], teacher_probabilities], axis=1)
+        train_idx, val_idx, test_idx = self.split_indices()
+
+        student = student or build_student()
+        student.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate),
+            loss=DistillationLoss(num_classes, self.temperature, self.alpha)
+        )
+
+        start = time.perf_counter()
+        student.fit(
+            self.pipeline.from_shards(self.dataset, train_idx, training=True, targets=targets),
+            validation_data=self.pipeline.from_shards(self.dataset, val_idx, targets=targets),
+            epochs=epochs, verbose=2,
+            callbacks=[tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)]
+        )
+        train_seconds = time.perf_counter() - start
+
+        # Pérdida estándar para que el .h5 exportado no dependa de objetos personalizados
+        student.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+
+        return student, {
+            'images': len(targets),
+            'teacher_seconds': teacher_seconds,
+            'train_seconds': train_seconds,
+            'val_accuracy': self._accuracy(student, val_idx),
+            'test_accuracy': self._accuracy(student, test_idx),
+            'teacher_test_accuracy': float(np.mean(teacher_probabilities[test_idx].argmax(axis=1) == self.dataset.labels[test_idx])),
+            'test_agreement': self._accuracy(student, test_idx, reference=teacher_probabilities)
+        }
+
+
+def evaluate_models(models, test_dir=None, batch_size=16, latency_samples=20):
+    """
+    Latencia, tamaño y recall por clase de cada modelo ({nombre: ruta}) sobre
+    las imágenes de prueba, preprocesadas una sola vez como en la aplicación.
+    """
+    config = Config()
+    image_processor = ImageProcessor()
+    metrics_calc = MetricsCalculator()
+    pipeline = TrainingDataPipeline(batch_size=batch_size)
+
+    images, df = pipeline.load_preprocessed(test_dir or config.PROJECT_ROOT / "test_images")
+    labels = pipeline._label_index(df['Label'])
+    class_indices = sorted(config.CLASS_MAPPING)
+
+    rows, reference = [], None
+    for name, path in models.items():
+        model = tf.keras.models.load_model(str(path), compile=False)
+
+        # Latencia por imagen como en el análisis normal (una imagen por predicción)
+        image_processor.predict_batch(images[:1], model)
+        latencies = []
+        for image in images[:latency_samples]:
+            start = time.perf_counter()
+            image_processor.predict_batch(image[np.newaxis], model)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        probabilities = np.concatenate([
+            image_processor.predict_batch(images[i:i + batch_size], model)
+            for i in range(0, len(images), batch_size)
+        ])
+        batch_seconds = time.perf_counter() - start
+
+        predictions = probabilities.argmax(axis=1)
+        recalls = recall_score(labels, predictions, labels=class_indices, average=None, zero_division=0)
+        results = [
+            metrics_calc.calculate_classification_result(config.CLASS_MAPPING[int(p)], config.CLASS_MAPPING[int(t)])
+            for p, t in zip(predictions, labels)
+        ]
+
+        row = {
+            'Modelo': name,
+            'Tamaño_MB': round(os.path.getsize(path) / (1024 * 1024), 1),
+            'Parametros': int(model.count_params()),
+            'Latencia_ms': round(1000 * float(np.median(latencies)), 1),
+            'Imagenes_por_s': round(len(images) / batch_seconds, 1),
+            'Exactitud': round(float(np.mean(predictions == labels)), 4)
+        }
+        row.update({
+            f"Recall_{config.CLASS_MAPPING[index]}": round(float(recall), 4)
+            for index, recall in zip(class_indices, recalls)
+        })
+        row['FN'] = results.count('FN')
+        row['Acuerdo'] = round(float(np.mean(predictions == reference)), 4) if reference is not None else 1.0
+        rows.append(row)
+
+        if reference is None:
+            reference = predictions
+        del model
+        tf.keras.backend.clear_session()
+
+    return pd.DataFrame(rows)
+
+
+def add_arguments(parser):
+    config = Config()
+    parser.add_argument("action", choices=['train', 'eval'])
+    parser.add_argument("--teacher", default=str(config.DEFAULT_MODEL_PATH), help="Modelo profesor (completo)")
+    parser.add_argument("--student", default=str(config.MODELS_DIR / "model_student.h5"), help="Ruta del estudiante exportado")
+    parser.add_argument("--weights", default='imagenet', help="Pesos iniciales de MobileNetV2 ('none' = aleatorios)")
+    parser.add_argument("--width", type=float, default=0.5, help="Multiplicador de ancho (alpha) de MobileNetV2")
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--alpha", type=float, default=0.3, help="Peso de las etiquetas reales frente al profesor")
+    parser.add_argument("--shards", default=None, help="Directorio de shards (por defecto Config.SHARDS_DIR)")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--test-dir", default=None, help="Imágenes de evaluación (por defecto test_images/)")
+
+
+def run(args):
+    if args.action == 'train':
+        teacher = tf.keras.models.load_model(args.teacher, compile=False)
+        trainer = DistillationTrainer(
+            teacher, ShardedDataset(args.shards),
+            temperature=args.temperature, alpha=args.alpha, batch_size=args.batch_size
+        )
+        weights = None if args.weights.lower() == 'none' else args.weights
+        student, summary = trainer.train(build_student(weights, args.width), epochs=args.epochs)
+        ModelExporter().export(student, args.student)
+
+        print(f"Imágenes: {summary['images']} | profesor: {summary['teacher_seconds']:.1f} s | "
+              f"entrenamiento estudiante: {summary['train_seconds']:.1f} s")
+        print(f"Exactitud estudiante validación: {summary['val_accuracy']:.4f} | test: {summary['test_accuracy']:.4f} "
+              f"(profesor test: {summary['teacher_test_accuracy']:.4f}, acuerdo {summary['test_agreement']:.4f})")
+        print(f"Estudiante exportado en {args.student}")
+        return
+
+    df = evaluate_models({'Profesor': args.teacher, 'Estudiante': args.student}, args.test_dir)
+    print(df.to_string(index=False))
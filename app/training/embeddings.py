@@ -0,0 +1,157 @@
+"""
+Reentrenamiento y evaluación rápida de cabezas sobre características cacheadas.
+
+El backbone DenseNet121 congelado se ejecuta una sola vez por imagen de los
+shards; las cabezas se entrenan y evalúan después sobre las características
+guardadas en EmbeddingCache (memory-mapped).
+
+Uso:
+    python -m app.training embeddings --model models/trained/model_complete.h5
+    python -m app.training embeddings --weights models/densenet121_weights_tf_dim_ordering_tf_kernels_notop.h5
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from app.config import Config
+from app.training.dataset_shards import ShardedDataset
+from app.training.pipeline import TrainingDataPipeline
+from app.utils.embedding_cache import EmbeddingCache, split_backbone_head
+
+
+def load_backbone(model_path=None, weights='imagenet'):
+    """Backbone desde un modelo completo (.h5/.keras) o DenseNet121 con los pesos indicados"""
+    config = Config()
+    if model_path:
+        model = tf.keras.models.load_model(model_path, compile=False)
+        backbone, _ = split_backbone_head(model)
+        if backbone is None:
+            raise ValueError("El modelo no tiene la forma Sequential([backbone, cabeza...])")
+        return backbone
+
+    return tf.keras.applications.DenseNet121(
+        weights=weights, include_top=False, input_shape=config.INPUT_SIZE
+    )
+
+
+class EmbeddingTrainer:
+    """Entrenar y evaluar cabezas de clasificación sobre características cacheadas"""
+
+    def __init__(self, backbone, sharded_dataset=None, pooling='avg', batch_size=32, seed=123):
+        self.config = Config()
+        self.backbone = backbone
+        self.dataset = sharded_dataset or ShardedDataset()
+        self.pooling = pooling
+        self.batch_size = batch_size
+        self.seed = seed
+        variant = f"shards_{self.dataset.manifest.get('interpolation', 'nearest')}"
+        self.cache = EmbeddingCache.for_backbone(backbone, pooling=pooling, variant=variant)
+
+    def features(self, indices=None):
+        """Características (float32) y etiquetas; el backbone solo corre sobre imágenes no cacheadas"""
+        indices = np.arange(len(self.dataset)) if indices is None else np.asarray(indices)
+        features = []
+        for start in range(0, len(indices), self.batch_size):
+            batch_indices = indices[start:start + self.batch_size]
+            hashes = [self.dataset.entries[i]['sha256'] for i in batch_indices]
+            images = self.dataset.batch(batch_indices)
+            features.append(self.cache.compute(self.backbone, images, hashes, batch_size=self.batch_size))
+        self.cache.flush()
+        return np.concatenate(features), self.dataset.labels[indices]
+
+    def build_head(self, feature_shape):
+        """Cabeza por defecto: la de los notebooks sobre el mapa completo o una compacta sobre avg-pooling"""
+        num_classes = len(self.config.CLASS_MAPPING)
+        if self.pooling == 'avg':
+            layers = [
+                tf.keras.layers.Dense(256, activation='relu'),
+                tf.keras.layers.Dropout(0.3),
+                tf.keras.layers.Dense(num_classes, activation='softmax')
+            ]
+        else:
+            layers = [
+                tf.keras.layers.Flatten(),
+                tf.keras.layers.Dense(1024, activation='relu'),
+                tf.keras.layers.Dropout(0.5),
+                tf.keras.layers.Dense(1024, activation='relu'),
+                tf.keras.layers.Dropout(0.3),
+                tf.keras.layers.Dense(512, activation='relu'),
+                tf.keras.layers.Dense(128, activation='relu'),
+                tf.keras.layers.Dense(num_classes, activation='softmax')
+            ]
+
+        head = tf.keras.Sequential([tf.keras.Input(feature_shape)] + layers)
+        head.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+        return head
+
+    def split_indices(self):
+        """Índices train/val/test con la partición 80/10/10 de los notebooks"""
+        df = pd.DataFrame({
+            'Path': self.dataset.paths,
+            'Label': [self.dataset.classes[label] for label in self.dataset.labels],
+            'Index': np.arange(len(self.dataset))
+        })
+        return [split['Index'].values for split in TrainingDataPipeline(seed=self.seed).split(df)]
+
+    def train_head(self, head=None, epochs=20):
+        """Entrenar una cabeza y devolver (cabeza, resumen con tiempos y exactitudes)"""
+        start = time.perf_counter()
+        x, y = self.features()
+        features_seconds = time.perf_counter() - start
+
+        train_idx, val_idx, test_idx = self.split_indices()
+        head = head or self.build_head(x.shape[1:])
+
+        start = time.perf_counter()
+        head.fit(
+            x[train_idx], y[train_idx],
+            validation_data=(x[val_idx], y[val_idx]),
+            epochs=epochs, batch_size=self.batch_size, verbose=0
+        )
+        train_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, val_accuracy = head.evaluate(x[val_idx], y[val_idx], verbose=0)
+        _, test_accuracy = head.evaluate(x[test_idx], y[test_idx], verbose=0)
+        eval_seconds = time.perf_counter() - start
+
+        return head, {
+            'images': len(y),
+            'features_seconds': features_seconds,
+            'train_seconds': train_seconds,
+            'eval_seconds': eval_seconds,
+            'val_accuracy': val_accuracy,
+            'test_accuracy': test_accuracy
+        }
+
+
+def add_arguments(parser):
+    parser.add_argument("--model", default=None, help="Modelo completo del que se extrae el backbone")
+    parser.add_argument("--weights", default='imagenet', help="Pesos de DenseNet121 si no se indica --model ('none' = aleatorios)")
+    parser.add_argument("--shards", default=None, help="Directorio de shards (por defecto Config.SHARDS_DIR)")
+    parser.add_argument("--pooling", default='avg', choices=['avg', 'none'])
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", default=None, help="Ruta donde guardar la cabeza entrenada")
+
+
+def run(args):
+    weights = None if args.weights.lower() == 'none' else args.weights
+    backbone = load_backbone(args.model, weights)
+    pooling = None if args.pooling == 'none' else args.pooling
+    trainer = EmbeddingTrainer(backbone, ShardedDataset(args.shards), pooling=pooling, batch_size=args.batch_size)
+
+    cached_before = len(trainer.cache)
+    head, summary = trainer.train_head(epochs=args.epochs)
+
+    print(f"Imágenes: {summary['images']} (en cache antes: {cached_before})")
+    print(f"Características: {summary['features_seconds']:.1f} s | "
+          f"entrenamiento cabeza: {summary['train_seconds']:.1f} s | evaluación: {summary['eval_seconds']:.2f} s")
+    print(f"Exactitud validación: {summary['val_accuracy']:.4f} | test: {summary['test_accuracy']:.4f}")
+
+    if args.output:
+        head.save(args.output)
+        print(f"Cabeza guardada en {args.output}")
@@ -6,13 +6,55 @@ Utilidades para el clasificador de cáncer de mama
 from .model_utils import ModelManager
 from .image_processing import ImageProcessor
 from .metrics_calculator import MetricsCalculator
+from .metrics_engine import MetricsEngine
 from .report_generator import ReportGenerator
+from .report_cache import ReportCache
 from .visualization import MetricsVisualizer
+from .performance import PerformanceTracker
+from .profiling import RunProfiler
+from .embedding_cache import EmbeddingCache
+from .model_export import ModelExporter
+from .model_inspection import ModelInspector
+from .lazy_weights import LazyWeightLoader
+from .model_registry import ModelRegistry
+from .model_comparison import ModelComparison
+from .cascade import CascadeClassifier
+from .perceptual_hash import PerceptualIndex
+from .run_store import RunStore
+from .history_store import HistoryStore
+from .model_preloader import ModelPreloader
+from .autotune import InferenceAutotuner
+from .memory_governor import MemoryGovernor
+from .inference_scheduler import InferenceScheduler
+from .watch_folder import FolderWatcher
+from .sharded_run import ShardedRun
+from .saliency import GradCamExplainer
 
 __all__ = [
     'ModelManager',
     'ImageProcessor', 
     'MetricsCalculator',
+    'MetricsEngine',
     'ReportGenerator',
-    'MetricsVisualizer'
+    'ReportCache',
+    'MetricsVisualizer',
+    'PerformanceTracker',
+    'RunProfiler',
+    'EmbeddingCache',
+    'ModelExporter',
+    'ModelInspector',
+    'LazyWeightLoader',
+    'ModelRegistry',
+    'ModelComparison',
+    'CascadeClassifier',
+    'PerceptualIndex',
+    'RunStore',
+    'HistoryStore',
+    'ModelPreloader',
+    'InferenceAutotuner',
+    'MemoryGovernor',
+    'InferenceScheduler',
+    'FolderWatcher',
+    'ShardedRun',
+    'GradCamExplainer'
 ]
\ No newline at end of file
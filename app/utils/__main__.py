@@ -0,0 +1,40 @@
+"""
+Línea de comandos de utilidades de inferencia.
+
+Uso:
+    python -m app.utils <comando> [opciones]
+"""
+
+import argparse
+
+from app.utils import autotune, history_store, inference_scheduler, lazy_weights, load_test, metrics_engine, model_export, model_inspection, model_preloader, perceptual_hash, report_cache, sharded_run, watch_folder
+
+COMMANDS = {
+    'export': (model_export, "Exportar un modelo como artefacto slim de solo inferencia"),
+    'inspect': (model_inspection, "Inspeccionar un modelo .h5/.keras sin cargarlo"),
+    'weights': (lazy_weights, "Carga de pesos con memory-map: conversión y medición de memoria"),
+    'dedup': (perceptual_hash, "Medir el índice de hashes perceptuales frente a una búsqueda lineal"),
+    'metrics': (metrics_engine, "Medir el motor de métricas frente a scikit-learn"),
+    'history': (history_store, "Medir las consultas del historial de predicciones"),
+    'preload': (model_preloader, "Servidor con precarga del modelo y sonda de disponibilidad"),
+    'autotune': (autotune, "Ajustar tamaño de lote e hilos de inferencia para este host y modelo"),
+    'scheduler': (inference_scheduler, "Medir la latencia de trabajos pequeños con y sin el planificador"),
+    'loadtest': (load_test, "Prueba de carga con sesiones simuladas e informe de capacidad"),
+    'reports': (report_cache, "Generar, listar y purgar los reportes descargables en cache"),
+    'shard': (sharded_run, "Reclasificar un archivo de imágenes por fragmentos y combinar los resultados"),
+    'watch': (watch_folder, "Clasificar continuamente las imágenes que llegan a una o varias carpetas"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.utils")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (module, help_text) in COMMANDS.items():
+        module.add_arguments(subparsers.add_parser(name, help=help_text, description=help_text))
+
+    args = parser.parse_args()
+    COMMANDS[args.command][0].run(args)
+
+
+if __name__ == "__main__":
+    main()
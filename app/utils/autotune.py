@@ -0,0 +1,200 @@
+"""
+Autoajuste del tamaño de lote y de los hilos de TensorFlow para la inferencia en CPU.
+
+Los hilos intra/inter-op solo se pueden fijar antes de que TensorFlow se
+inicialice, así que cada combinación de hilos se mide en un proceso nuevo.
+El resultado se guarda por host y huella del modelo en Config.AUTOTUNE_FILE;
+el precargador lo calcula en el primer arranque y la inferencia lo aplica
+automáticamente.
+
+Uso:
+    python -m app.utils autotune run --model models/trained/model_complete.h5
+    python -m app.utils autotune show
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app.config import Config
+from app.utils.fingerprint import file_fingerprint
+from app.utils.model_export import ModelExporter
+
+# Hilos aplicados en este proceso (solo se pueden fijar una vez)
+_applied_threads = None
+
+
+def _measure(model_path, intra, inter, batch_sizes, repeats, latency_ceiling_ms):
+    """Imágenes/s y latencia por lote de cada tamaño de lote con entradas sintéticas (proceso hijo)"""
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra)
+    tf.config.threading.set_inter_op_parallelism_threads(inter)
+    model = tf.keras.models.load_model(model_path, compile=False)
+    rng = np.random.default_rng(0)
+
+    rows = []
+    for batch_size in batch_sizes:
+        batch = rng.random((batch_size, *model.input_shape[1:]), dtype=np.float32)
+        model.predict(batch, batch_size=batch_size, verbose=0)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict(batch, batch_size=batch_size, verbose=0)
+            timings.append(time.perf_counter() - start)
+        seconds = float(np.median(timings))
+        rows.append({
+            'intra_op_threads': intra,
+            'inter_op_threads': inter,
+            'batch_size': batch_size,
+            'latency_ms': round(1000 * seconds, 1),
+            'images_per_s': round(batch_size / seconds, 2)
+        })
+        # La latencia crece con el lote: los tamaños mayores ya no cumplirían el techo
+        if 1000 * seconds > latency_ceiling_ms:
+            break
+    return rows
+
+
+class InferenceAutotuner:
+    """
+    Mide una rejilla de tamaños de lote e hilos intra/inter-op con entradas
+    sintéticas y elige la combinación con más imágenes/s cuya latencia por
+    lote no supera el techo configurado.
+    """
+
+    def __init__(self, tune_file=None, batch_sizes=None, thread_grid=None, latency_ceiling_ms=None, repeats=3):
+        self.config = Config()
+        self.tune_file = Path(tune_file or self.config.AUTOTUNE_FILE)
+        self.batch_sizes = sorted(batch_sizes or self.config.AUTOTUNE_BATCH_SIZES)
+        self.thread_grid = thread_grid or self.default_thread_grid()
+        self.latency_ceiling_ms = latency_ceiling_ms or self.config.AUTOTUNE_LATENCY_CEILING_MS
+        self.repeats = repeats
+
+    @staticmethod
+    def default_thread_grid():
+        """(intra, inter): los valores por defecto de TensorFlow (0, 0) y divisiones de los núcleos"""
+        cpus = os.cpu_count() or 1
+        intra = sorted({1, max(1, cpus // 2), cpus})
+        return [(0, 0)] + [(threads, inter) for threads in intra for inter in (1, 2)]
+
+    @staticmethod
+    def host_key():
+        return f"{platform.node()}-{os.cpu_count()}cpu-{platform.machine()}"
+
+    def _resolve(self, model_path):
+        # Se mide el artefacto que realmente se carga (slim si existe)
+        slim_path = ModelExporter().find_slim(model_path)
+        return str(slim_path) if slim_path is not None else str(model_path)
+
+    def key(self, model_path):
+        return f"{self.host_key()}:{file_fingerprint(self._resolve(model_path))[:16]}"
+
+    def _load(self):
+        if not self.tune_file.exists():
+            return {}
+        with open(self.tune_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def lookup(self, model_path):
+        """Configuración guardada para este host y modelo, o None"""
+        if not model_path or not os.path.exists(model_path):
+            return None
+        return self._load().get(self.key(model_path))
+
+    def tune(self, model_path, progress_callback=None):
+        """Medir la rejilla, guardar y devolver la mejor configuración con todas las mediciones"""
+        path = self._resolve(model_path)
+        rows = []
+        context = multiprocessing.get_context('spawn')
+        for i, (intra, inter) in enumerate(self.thread_grid):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                rows.extend(executor.submit(
+                    _measure, path, intra, inter, self.batch_sizes, self.repeats, self.latency_ceiling_ms
+                ).result())
+            if progress_callback:
+                progress_callback(i + 1, len(self.thread_grid))
+
+        eligible = [row for row in rows if row['latency_ms'] <= self.latency_ceiling_ms]
+        best = max(eligible or rows, key=lambda row: row['images_per_s'])
+        baseline = next((row for row in rows if row['intra_op_threads'] == 0 and row['batch_size'] == 1), None)
+
+        entry = {
+            **best,
+            'model_path': path,
+            'latency_ceiling_ms': self.latency_ceiling_ms,
+            'baseline_images_per_s': baseline['images_per_s'] if baseline else None,
+            'tuned_at': datetime.now().isoformat(timespec='seconds'),
+            'measurements': rows
+        }
+        stored = self._load()
+        stored[self.key(model_path)] = entry
+        self.tune_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tune_file.with_name(self.tune_file.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.tune_file)
+        return entry
+
+    def batch_size_for(self, model_path):
+        """Tamaño de lote ajustado para el modelo, o el de Config si no se ha medido"""
+        entry = self.lookup(model_path)
+        return entry['batch_size'] if entry else self.config.COMPARISON_BATCH_SIZE
+
+    def apply_threads(self, model_path):
+        """
+        Fijar los hilos ajustados en este proceso. Solo surte efecto antes de que
+        TensorFlow ejecute su primera operación; devuelve los hilos aplicados o None.
+        """
+        global _applied_threads
+        if _applied_threads is not None:
+            return _applied_threads
+        entry = self.lookup(model_path)
+        if entry is None:
+            return None
+
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(entry['intra_op_threads'])
+            tf.config.threading.set_inter_op_parallelism_threads(entry['inter_op_threads'])
+        except RuntimeError:
+            return None
+        _applied_threads = (entry['intra_op_threads'], entry['inter_op_threads'])
+        return _applied_threads
+
+
+def add_arguments(parser):
+    config = Config()
+    parser.add_argument("action", choices=['run', 'show'])
+    parser.add_argument("--model", default=str(config.DEFAULT_MODEL_PATH))
+    parser.add_argument("--batch-sizes", type=int, nargs='+', default=None)
+    parser.add_argument("--latency-ms", type=float, default=None, help="Techo de latencia por lote")
+    parser.add_argument("--repeats", type=int, default=3)
+
+
+def run(args):
+    tuner = InferenceAutotuner(batch_sizes=args.batch_sizes, latency_ceiling_ms=args.latency_ms, repeats=args.repeats)
+
+    if args.action == 'run':
+        print(f"Host {tuner.host_key()} | hilos {tuner.thread_grid} | lotes {tuner.batch_sizes}")
+        entry = tuner.tune(args.model, progress_callback=lambda done, total: print(f"  combinación de hilos {done}/{total}"))
+        for row in entry['measurements']:
+            print(f"  intra {row['intra_op_threads']:>2} inter {row['inter_op_threads']:>2} lote {row['batch_size']:>3}  "
+                  f"{row['latency_ms']:>9.1f} ms  {row['images_per_s']:>7.2f} img/s")
+    else:
+        entry = tuner.lookup(args.model)
+        if entry is None:
+            print("Sin autoajuste para este host y modelo")
+            return
+
+    baseline = entry['baseline_images_per_s']
+    gain = f" ({entry['images_per_s'] / baseline:.2f}x frente a lote 1 con hilos por defecto)" if baseline else ""
+    print(f"Elegido: lote {entry['batch_size']}, intra {entry['intra_op_threads']}, inter {entry['inter_op_threads']} -> "
+          f"{entry['images_per_s']:.2f} img/s, {entry['latency_ms']:.0f} ms por lote{gain}")
@@ -0,0 +1,82 @@
+import numpy as np
+import tensorflow as tf
+
+from app.config import Config
+from app.utils.image_processing import error_row
+
+
+class CascadeClassifier:
+    """
+    Cascada de dos etapas: un modelo ligero puntúa todas las imágenes y solo
+    las que quedan por debajo del umbral de confianza pasan al modelo principal.
+    """
+
+    STAGE_FAST = 'Rápida'
+    STAGE_MAIN = 'Principal'
+
+    def __init__(self, fast_model, main_model, image_processor, threshold=None, batch_size=None):
+        self.config = Config()
+        self.fast_model = fast_model
+        self.main_model = main_model
+        self.image_processor = image_processor
+        self.threshold = self.config.CASCADE_THRESHOLD if threshold is None else threshold
+        self.batch_size = batch_size or self.config.COMPARISON_BATCH_SIZE
+        self.fast_size = tuple(fast_model.input_shape[1:3])
+
+    def _fast_input(self, batch):
+        # El modelo ligero puede trabajar a menor resolución que el principal
+        if tuple(batch.shape[1:3]) == self.fast_size:
+            return batch
+        return tf.image.resize(batch, self.fast_size).numpy()
+
+    def classify_batch(self, batch):
+        """Probabilidades finales, etapa que decidió y confianza de la primera etapa para un lote"""
+        fast_probabilities = self.image_processor.predict_batch(self._fast_input(batch), self.fast_model)
+        fast_confidence = fast_probabilities.max(axis=1)
+        escalate = fast_confidence < self.threshold
+
+        probabilities = np.array(fast_probabilities, copy=True)
+        if escalate.any():
+            probabilities[escalate] = self.image_processor.predict_batch(batch[escalate], self.main_model)
+
+        stages = np.where(escalate, self.STAGE_MAIN, self.STAGE_FAST)
+        return probabilities, stages, fast_confidence
+
+    def run(self, uploaded_files, progress_callback=None):
+        """Filas de resultado (mismo formato que el análisis normal) con la columna Etapa_Decision"""
+        tracker = self.image_processor.tracker
+        rows = [None] * len(uploaded_files)
+        pending = []
+
+        for i, uploaded_file in enumerate(uploaded_files):
+            try:
+                with tracker.image(uploaded_file.name):
+                    image = self.image_processor.load_image(uploaded_file)
+                    pending.append((i, uploaded_file.name, self.image_processor.preprocess_image(image)[0]))
+            except Exception as e:
+                rows[i] = {**error_row(uploaded_file.name, e), 'Etapa_Decision': 'N/A'}
+
+            if len(pending) >= self.batch_size or (i == len(uploaded_files) - 1 and pending):
+                self._score(pending, rows)
+                pending = []
+
+            if progress_callback:
+                progress_callback(i + 1, len(uploaded_files))
+
+        return rows
+
+    def _score(self, pending, rows):
+        probabilities, stages, fast_confidence = self.classify_batch(np.stack([array for _, _, array in pending]))
+        for position, (i, filename, _) in enumerate(pending):
+            rows[i] = {
+                'Nombre_Archivo': filename,
+                **self.image_processor.format_prediction(probabilities[position]),
+                'Etapa_Decision': stages[position],
+                'Confianza_Rapida': f"{fast_confidence[position]:.4f}"
+            }
+
+    def escalation_rate(self, rows):
+        decided = [row for row in rows if row.get('Etapa_Decision') in (self.STAGE_FAST, self.STAGE_MAIN)]
+        if not decided:
+            return 0.0
+        return sum(row['Etapa_Decision'] == self.STAGE_MAIN for row in decided) / len(decided)
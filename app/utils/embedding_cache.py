@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from app.config import Config
+from app.utils.file_lock import file_lock
+from app.utils.fingerprint import weights_fingerprint
+
+
+def split_backbone_head(model):
+    """
+    Separar un modelo de transfer learning en backbone congelado y cabeza.
+    Soporta la arquitectura de los notebooks: Sequential([DenseNet121, Flatten, Dense...]).
+    Devuelve (backbone, head) o (None, None) si el modelo no tiene esa forma.
+    """
+    layers = getattr(model, 'layers', None)
+    if not layers or len(layers) < 2 or not isinstance(layers[0], tf.keras.Model):
+        return None, None
+    if not isinstance(model, tf.keras.Sequential):
+        return None, None
+
+    backbone = layers[0]
+    head = tf.keras.Sequential(layers[1:], name=f"{model.name}_head")
+    head.build((None,) + tuple(backbone.output_shape[1:]))
+    return backbone, head
+
+
+class EmbeddingCache:
+    """
+    Cache en disco de las salidas del backbone congelado.
+    Clave: hash de la imagen; espacio de nombres: hash de los pesos del backbone,
+    pooling y variante de preprocesamiento. Las características se guardan en
+    segmentos .npy que se leen con mmap_mode='r'. Varios procesos pueden compartir
+    el espacio de nombres: cada segmento tiene nombre único y el índice se relee y
+    fusiona bajo un bloqueo de archivo antes de reemplazarlo.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, backbone_hash, pooling=None, variant='app', cache_dir=None, dtype=None):
+        self.config = Config()
+        self.backbone_hash = backbone_hash
+        self.pooling = pooling
+        self.variant = variant
+        self.dtype = np.dtype(dtype or self.config.EMBEDDING_CACHE_DTYPE)
+        namespace = f"{backbone_hash[:16]}_{pooling or 'map'}_{variant}_{self.dtype.name}"
+        self.directory = Path(cache_dir or self.config.EMBEDDING_CACHE_DIR) / namespace
+
+        self._lock = threading.Lock()
+        self._segments = {}
+        self._pending_hashes = []
+        self._pending_features = []
+        self._index = self._load_index()
+
+    @classmethod
+    def for_backbone(cls, backbone, pooling=None, variant='app', cache_dir=None, dtype=None):
+        """Crear la cache correspondiente a los pesos actuales de un backbone"""
+        return cls(weights_fingerprint(backbone), pooling, variant, cache_dir, dtype)
+
+    def _load_index(self):
+        index_path = self.directory / self.INDEX_NAME
+        if index_path.exists():
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'backbone_hash': self.backbone_hash, 'pooling': self.pooling, 'segments': [], 'entries': {}}
+
+    def __len__(self):
+        return len(self._index['entries']) + len(self._pending_hashes)
+
+    def __contains__(self, image_hash):
+        return image_hash in self._index['entries'] or image_hash in self._pending_hashes
+
+    def _segment(self, name):
+        if name not in self._segments:
+            self._segments[name] = np.load(self.directory / name, mmap_mode='r')
+        return self._segments[name]
+
+    def get(self, image_hash):
+        """Características de una imagen o None si no están en cache"""
+        with self._lock:
+            location = self._index['entries'].get(image_hash)
+            if location is not None:
+                segment, row = location
+                return self._segment(segment)[row]
+            if image_hash in self._pending_hashes:
+                return self._pending_features[self._pending_hashes.index(image_hash)]
+        return None
+
+    def get_many(self, image_hashes):
+        """Diccionario hash -> características para los hashes presentes en cache"""
+        found = {}
+        for image_hash in image_hashes:
+            features = self.get(image_hash)
+            if features is not None:
+                found[image_hash] = features
+        return found
+
+    def put(self, image_hash, features):
+        """Agregar características; se escriben a disco en bloques con flush()"""
+        with self._lock:
+            if image_hash in self._index['entries'] or image_hash in self._pending_hashes:
+                return
+            self._pending_hashes.append(image_hash)
+            self._pending_features.append(np.asarray(features, dtype=self.dtype))
+            should_flush = len(self._pending_hashes) >= self.config.EMBEDDING_CACHE_SEGMENT_SIZE
+
+        if should_flush:
+            self.flush()
+
+    def put_many(self, image_hashes, features):
+        for image_hash, feature in zip(image_hashes, features):
+            self.put(image_hash, feature)
+
+    def flush(self):
+        """Escribir las características pendientes como un nuevo segmento"""
+        with self._lock:
+            if not self._pending_hashes:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            name = f"features_{os.getpid()}_{uuid.uuid4().hex[:8]}.npy"
+            np.save(self.directory / name, np.stack(self._pending_features))
+
+            with file_lock(self.directory / (self.INDEX_NAME + ".lock")):
+                # Otros procesos pueden haber agregado segmentos desde la última lectura
+                index = self._load_index()
+                index['segments'].append(name)
+                for row, image_hash in enumerate(self._pending_hashes):
+                    index['entries'].setdefault(image_hash, [name, row])
+
+                tmp_path = self.directory / (self.INDEX_NAME + ".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self.directory / self.INDEX_NAME)
+            self._index = index
+
+            self._pending_hashes = []
+            self._pending_features = []
+
+    def compute(self, backbone, images, image_hashes, batch_size=32):
+        """
+        Características para un lote de imágenes: las cacheadas se leen del
+        memmap y solo las faltantes pasan por el backbone.
+        """
+        cached = self.get_many(image_hashes)
+        missing = [i for i, image_hash in enumerate(image_hashes) if image_hash not in cached]
+
+        computed = {}
+        if missing:
+            for start in range(0, len(missing), batch_size):
+                batch_indices = missing[start:start + batch_size]
+                batch = np.stack([images[i] for i in batch_indices])
+                features = backbone.predict(batch, verbose=0)
+                if self.pooling == 'avg':
+                    features = features.mean(axis=(1, 2))
+                for i, feature in zip(batch_indices, features):
+                    computed[image_hashes[i]] = feature
+                    self.put(image_hashes[i], feature)
+
+        return np.stack([
+            cached[image_hash] if image_hash in cached else computed[image_hash]
+            for image_hash in image_hashes
+        ]).astype(np.float32)
@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+import numpy as np
+
+from app.files import file_sha256  # noqa: F401  (se sigue importando desde aquí)
+
+
+def bytes_sha256(data):
+    """Hash SHA-256 de un bloque de bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_fingerprint(path, sample_size=1024 * 1024):
+    """
+    Huella rápida de un archivo grande: tamaño más el primer y el último MB.
+    Suficiente para detectar reemplazos de modelos de varios GB sin leerlos completos.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def weights_fingerprint(layer):
+    """Hash de los pesos de un modelo o capa (formas y valores, sin nombres autogenerados)"""
+    digest = hashlib.sha256()
+    for weight in layer.weights:
+        value = np.ascontiguousarray(weight.numpy())
+        digest.update(str(value.shape).encode())
+        digest.update(str(value.dtype).encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,292 @@
+"""
+Historial local de todas las predicciones (SQLite) con agregados por día.
+
+Uso:
+    python -m app.utils history benchmark --rows 2000000
+"""
+
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryStore:
+    """
+    Historial de predicciones entre ejecuciones.
+    La tabla predictions guarda cada fila (índices por modelo, clase y fecha) y
+    daily_stats mantiene, en la misma transacción, conteos y sumas por día,
+    modelo, clase y resultado: las tendencias se calculan sobre días, no sobre filas.
+    """
+
+    PERIODS = {
+        'day': "day",
+        'week': "strftime('%Y-W%W', day)",
+        'month': "substr(day, 1, 7)"
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            run_id TEXT,
+            model_hash TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            prediction TEXT NOT NULL,
+            diagnosis TEXT,
+            result TEXT,
+            confidence REAL,
+            prob_benign REAL,
+            prob_malignant REAL,
+            prob_normal REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_predictions_model_date ON predictions (model_hash, created_at);
+        CREATE INDEX IF NOT EXISTS idx_predictions_class_date ON predictions (prediction, created_at);
+        CREATE INDEX IF NOT EXISTS idx_predictions_date ON predictions (created_at);
+        CREATE INDEX IF NOT EXISTS idx_predictions_run ON predictions (run_id);
+
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT NOT NULL,
+            model_hash TEXT NOT NULL,
+            prediction TEXT NOT NULL,
+            result TEXT NOT NULL,
+            predictions INTEGER NOT NULL,
+            confidence_sum REAL NOT NULL,
+            prob_malignant_sum REAL NOT NULL,
+            PRIMARY KEY (day, model_hash, prediction, result)
+        );
+        CREATE INDEX IF NOT EXISTS idx_daily_model ON daily_stats (model_hash, day);
+
+        CREATE TABLE IF NOT EXISTS models (
+            model_hash TEXT PRIMARY KEY,
+            model_path TEXT,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path=None):
+        self.config = Config()
+        self.db_path = Path(db_path or self.config.HISTORY_DB_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def record(self, run_id, model_hash, rows, model_path=None, timestamp=None):
+        """Guardar las filas de resultado de una ejecución (las filas con ERROR se omiten)"""
+        created_at = (timestamp or datetime.now()).isoformat(timespec='seconds')
+        records = []
+        for row in rows:
+            if row.get('Prediccion') in (None, 'ERROR'):
+                continue
+            records.append((
+                created_at, run_id, model_hash, row.get('Nombre_Archivo', ''), row['Prediccion'],
+                row.get('Diagnostico'), row.get('Resultado'), _to_float(row.get('Confianza')),
+                _to_float(row.get('Prob_Benign')), _to_float(row.get('Prob_Malignant')), _to_float(row.get('Prob_Normal'))
+            ))
+        if not records:
+            return 0
+
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT INTO predictions (created_at, run_id, model_hash, file_name, prediction, diagnosis, result, "
+                "confidence, prob_benign, prob_malignant, prob_normal) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            self._update_daily(connection, records)
+            connection.execute(
+                "INSERT INTO models (model_hash, model_path, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(model_hash) DO UPDATE SET last_seen = excluded.last_seen, "
+                "model_path = COALESCE(excluded.model_path, models.model_path)",
+                (model_hash, model_path, created_at, created_at)
+            )
+        return len(records)
+
+    def _update_daily(self, connection, records):
+        totals = defaultdict(lambda: [0, 0.0, 0.0])
+        for created_at, _, model_hash, _, prediction, _, result, confidence, _, prob_malignant, _ in records:
+            entry = totals[(created_at[:10], model_hash, prediction, result or '')]
+            entry[0] += 1
+            entry[1] += confidence or 0.0
+            entry[2] += prob_malignant or 0.0
+        connection.executemany(
+            "INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(day, model_hash, prediction, result) DO UPDATE SET "
+            "predictions = predictions + excluded.predictions, "
+            "confidence_sum = confidence_sum + excluded.confidence_sum, "
+            "prob_malignant_sum = prob_malignant_sum + excluded.prob_malignant_sum",
+            [key + tuple(values) for key, values in totals.items()]
+        )
+
+    def _filters(self, date_column, model_hash=None, prediction=None, date_from=None, date_to=None):
+        clauses, params = [], []
+        if model_hash:
+            clauses.append("model_hash = ?")
+            params.append(model_hash)
+        if prediction:
+            clauses.append("prediction = ?")
+            params.append(prediction)
+        if date_from:
+            clauses.append(f"{date_column} >= ?")
+            params.append(str(date_from)[:10])
+        if date_to:
+            # Hasta el final del día indicado
+            clauses.append(f"{date_column} < ?")
+            params.append((pd.Timestamp(date_to) + timedelta(days=1)).strftime('%Y-%m-%d'))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _query(self, sql, params):
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def models(self):
+        """Modelos vistos con su ruta, primera/última fecha y número de predicciones"""
+        return self._query(
+            "SELECT models.model_hash, models.model_path, models.first_seen, models.last_seen, "
+            "COALESCE(SUM(daily_stats.predictions), 0) AS predictions FROM models "
+            "LEFT JOIN daily_stats ON daily_stats.model_hash = models.model_hash "
+            "GROUP BY models.model_hash ORDER BY models.last_seen DESC",
+            []
+        )
+
+    def summary(self, **filters):
+        """Totales agregados (predicciones, tasa de malignos y confianza media)"""
+        where, params = self._filters('day', **filters)
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT SUM(predictions) AS predictions, "
+                "SUM(CASE WHEN prediction = 'Malignant' THEN predictions ELSE 0 END) AS malignant, "
+                "SUM(confidence_sum) AS confidence_sum, SUM(prob_malignant_sum) AS prob_malignant_sum "
+                f"FROM daily_stats{where}",
+                params
+            ).fetchone()
+        total = row['predictions'] or 0
+        return {
+            'predictions': total,
+            'malignant': row['malignant'] or 0,
+            'malignant_rate': (row['malignant'] or 0) / total if total else 0.0,
+            'avg_confidence': (row['confidence_sum'] or 0.0) / total if total else 0.0,
+            'avg_prob_malignant': (row['prob_malignant_sum'] or 0.0) / total if total else 0.0
+        }
+
+    def trend(self, period='day', by_model=True, **filters):
+        """Predicciones, tasa de malignos y confianza media por periodo (y modelo)"""
+        where, params = self._filters('day', **filters)
+        group = self.PERIODS[period]
+        model_column = ", model_hash" if by_model else ""
+        return self._query(
+            f"SELECT {group} AS period{model_column}, SUM(predictions) AS predictions, "
+            "SUM(CASE WHEN prediction = 'Malignant' THEN predictions ELSE 0 END) * 1.0 / SUM(predictions) AS malignant_rate, "
+            "SUM(confidence_sum) / SUM(predictions) AS avg_confidence, "
+            "SUM(prob_malignant_sum) / SUM(predictions) AS avg_prob_malignant "
+            f"FROM daily_stats{where} GROUP BY period{model_column} ORDER BY period{model_column}",
+            params
+        )
+
+    def class_distribution(self, **filters):
+        """Predicciones por clase y por resultado (VP/VN/FP/FN)"""
+        where, params = self._filters('day', **filters)
+        return self._query(
+            f"SELECT prediction, result, SUM(predictions) AS predictions FROM daily_stats{where} "
+            "GROUP BY prediction, result ORDER BY prediction, result",
+            params
+        )
+
+    def predictions(self, limit=100, offset=0, **filters):
+        """Filas individuales más recientes (paginadas) usando los índices por modelo/clase/fecha"""
+        where, params = self._filters('created_at', **filters)
+        return self._query(
+            f"SELECT * FROM predictions{where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+
+
+def benchmark(rows, days=365, models=3, batch_size=10000, seed=0):
+    """Insertar filas sintéticas y medir las consultas del historial"""
+    rng = np.random.default_rng(seed)
+    classes = ['Benign', 'Malignant', 'Normal']
+    results = ['VP', 'VN', 'FP', 'FN']
+    start_day = datetime(2025, 1, 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(Path(directory) / "history.sqlite3")
+
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            count = min(batch_size, rows - offset)
+            day = start_day + timedelta(days=int(offset / rows * days))
+            model_hash = f"modelo{offset * models // rows}"
+            probabilities = rng.dirichlet([2, 1, 1], count)
+            batch = [
+                {
+                    'Nombre_Archivo': f"imagen_{offset + i}.png",
+                    'Prediccion': classes[int(p.argmax())],
+                    'Resultado': results[i % 4],
+                    'Confianza': f"{p.max():.4f}",
+                    'Prob_Benign': f"{p[0]:.4f}", 'Prob_Malignant': f"{p[1]:.4f}", 'Prob_Normal': f"{p[2]:.4f}"
+                }
+                for i, p in enumerate(probabilities)
+            ]
+            store.record(f"run{offset}", model_hash, batch, timestamp=day)
+        insert_seconds = time.perf_counter() - start
+
+        middle = start_day + timedelta(days=days // 2)
+        queries = {
+            'Resumen total': lambda: store.summary(),
+            'Tendencia mensual por modelo': lambda: store.trend('month'),
+            'Tendencia diaria, 1 modelo, 30 días': lambda: store.trend('day', model_hash='modelo1', date_from=middle, date_to=middle + timedelta(days=30)),
+            'Distribución de clases, malignos': lambda: store.class_distribution(prediction='Malignant'),
+            'Página de filas (modelo + fechas)': lambda: store.predictions(limit=50, model_hash='modelo1', date_from=middle),
+        }
+        timings = []
+        for name, query in queries.items():
+            start = time.perf_counter()
+            query()
+            timings.append((name, time.perf_counter() - start))
+
+        # Referencia: el mismo agregado mensual recorriendo todas las filas
+        with closing(store._connect()) as connection:
+            start = time.perf_counter()
+            connection.execute(
+                "SELECT substr(created_at, 1, 7), model_hash, COUNT(*), AVG(confidence) "
+                "FROM predictions GROUP BY 1, 2"
+            ).fetchall()
+            timings.append(('Tendencia mensual sobre filas (sin agregados)', time.perf_counter() - start))
+
+        size_mb = store.db_path.stat().st_size / (1024 * 1024)
+    return insert_seconds, size_mb, timings
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['benchmark'])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=365)
+
+
+def run(args):
+    insert_seconds, size_mb, timings = benchmark(args.rows, args.days)
+    print(f"{args.rows} filas insertadas en {insert_seconds:.1f} s ({args.rows / insert_seconds:,.0f} filas/s) | {size_mb:.0f} MB")
+    for name, seconds in timings:
+        print(f"{name:<48} {1000 * seconds:>9.1f} ms")
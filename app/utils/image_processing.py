@@ -2,17 +2,44 @@ import numpy as np
 import tensorflow as tf
 from PIL import Image
 from app.config import Config
+from app.utils.performance import PerformanceTracker
+from app.utils.embedding_cache import EmbeddingCache, split_backbone_head
+from app.utils.perceptual_hash import dhash
+
+
+def error_row(file_name, error):
+    """Fila de resultado de un archivo que no se pudo clasificar"""
+    return {
+        'Nombre_Archivo': file_name,
+        'Prediccion': 'ERROR',
+        'Confianza': 'N/A',
+        'Prob_Benign': 'N/A',
+        'Prob_Malignant': 'N/A',
+        'Prob_Normal': 'N/A',
+        'Error': str(error)
+    }
+
 
 class ImageProcessor:
-    def __init__(self):
+    def __init__(self, tracker=None):
         self.config = Config()
+        self.tracker = tracker or PerformanceTracker(enabled=False)
+        self._split_model_id = None
+        self._split = (None, None, None)
     
     def load_image(self, uploaded_file):
         """Cargar imagen desde archivo subido"""
-        return Image.open(uploaded_file)
+        with self.tracker.span('decode'):
+            image = Image.open(uploaded_file)
+            image.load()
+        return image
     
     def preprocess_image(self, image):
         """Preprocesar imagen para el modelo"""
+        with self.tracker.span('preprocess'):
+            return self._preprocess(image)
+    
+    def _preprocess(self, image):
         if image.mode == 'RGBA':
             background = Image.new('RGB', image.size, (255, 255, 255))
             background.paste(image, mask=image.split()[-1])
@@ -38,25 +65,87 @@ class ImageProcessor:
         
         return img_array
     
-    def predict_image(self, image, model):
+    def predict_image(self, image, model, image_hash=None):
         """Predecir clase de una imagen"""
         try:
             processed_image = self.preprocess_image(image)
             
-            predictions = model.predict(processed_image)
-            probabilities = predictions[0]
+            with self.tracker.span('inference'):
+                predictions = self._predict(processed_image, model, image_hash)
+            
+            return self.format_prediction(predictions[0])
+            
+        except Exception as e:
+            raise ValueError(f"Error en predicción: {str(e)}")
+    
+    def predict_image_deduplicated(self, image, model, duplicates, name, image_hash=None):
+        """
+        Como predict_image, pero reutiliza la predicción de una imagen casi idéntica
+        del índice perceptual (PerceptualIndex); las nuevas predicciones se agregan al índice.
+        """
+        try:
+            processed_image = self.preprocess_image(image)
             
-            predicted_class_index = np.argmax(probabilities)
-            predicted_class = self.config.CLASS_MAPPING[predicted_class_index]
-            confidence = probabilities[predicted_class_index]
+            with self.tracker.span('dedup'):
+                perceptual_hash = dhash(processed_image[0])
+                match = duplicates.find(perceptual_hash)
+            if match is not None:
+                payload, distance = match
+                return {**payload['prediction'], 'Duplicado_De': payload['name'], 'Distancia_Hash': distance}
             
-            return {
-                'Prediccion': predicted_class,
-                'Confianza': f"{confidence:.4f}",
-                'Prob_Benign': f"{probabilities[0]:.4f}",
-                'Prob_Malignant': f"{probabilities[1]:.4f}",
-                'Prob_Normal': f"{probabilities[2]:.4f}"
-            }
+            with self.tracker.span('inference'):
+                predictions = self._predict(processed_image, model, image_hash)
+            
+            result = self.format_prediction(predictions[0])
+            duplicates.add(perceptual_hash, {'name': name, 'prediction': result})
+            return result
             
         except Exception as e:
-            raise ValueError(f"Error en predicción: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Error en predicción: {str(e)}")
+    
+    def predict_batch(self, batch, model, batch_size=None):
+        """Probabilidades de un lote ya preprocesado (N, alto, ancho, 3) en una sola llamada"""
+        with self.tracker.span('inference'):
+            return model.predict(batch, batch_size=batch_size, verbose=0)
+    
+    def format_prediction(self, probabilities):
+        """Columnas de resultado (clase, confianza y probabilidades) para un vector de probabilidades"""
+        predicted_class_index = int(np.argmax(probabilities))
+        predicted_class = self.config.CLASS_MAPPING[predicted_class_index]
+        confidence = probabilities[predicted_class_index]
+        
+        return {
+            'Prediccion': predicted_class,
+            'Confianza': f"{confidence:.4f}",
+            'Prob_Benign': f"{probabilities[0]:.4f}",
+            'Prob_Malignant': f"{probabilities[1]:.4f}",
+            'Prob_Normal': f"{probabilities[2]:.4f}"
+        }
+    
+    def _predict(self, processed_image, model, image_hash):
+        """Inferencia directa o, con la cache de características activa, backbone cacheado + cabeza"""
+        if image_hash is None or not self.config.ENABLE_EMBEDDING_CACHE:
+            return model.predict(processed_image)
+        
+        backbone, head, cache = self._backbone_split(model)
+        if backbone is None:
+            return model.predict(processed_image)
+        
+        features = cache.compute(backbone, processed_image, [image_hash])
+        return head.predict(features, verbose=0)
+    
+    def _backbone_split(self, model):
+        """Backbone, cabeza y cache del modelo actual (se recalculan al cambiar de modelo)"""
+        if self._split_model_id != id(model):
+            self.flush_caches()
+            backbone, head = split_backbone_head(model)
+            cache = EmbeddingCache.for_backbone(backbone) if backbone is not None else None
+            self._split = (backbone, head, cache)
+            self._split_model_id = id(model)
+        return self._split
+    
+    def flush_caches(self):
+        """Persistir las características pendientes de la cache"""
+        cache = self._split[2]
+        if cache is not None:
+            cache.flush()
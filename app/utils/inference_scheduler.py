@@ -0,0 +1,210 @@
+"""
+Planificador de inferencia compartido entre sesiones.
+
+Cada ejecución abre un trabajo y pide turno por lote. Los lotes esperan en la
+cola de su trabajo y se conceden con un máximo de lotes en curso; los trabajos
+pequeños tienen un carril prioritario y el resto se reparte con colas justas
+ponderadas (tiempo virtual = imágenes servidas / peso).
+
+Uso:
+    python -m app.utils scheduler benchmark --model models/trained/model_complete.h5
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.config import Config
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """Planificador único del proceso, común a todas las sesiones"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = InferenceScheduler()
+        return _shared
+
+
+class SchedulerJob:
+    """Una ejecución de una sesión: imágenes totales, servidas y tiempos de espera por lote"""
+
+    def __init__(self, session_id, total, weight, small, virtual_time):
+        self.job_id = uuid.uuid4().hex[:8]
+        self.session_id = session_id
+        self.total = total
+        self.weight = weight
+        self.small = small
+        self.virtual_time = virtual_time
+        self.served = 0
+        self.waits = []
+
+    def summary(self):
+        return {
+            'Trabajo': self.job_id,
+            'Sesion': self.session_id,
+            'Imagenes': self.total,
+            'Servidas': self.served,
+            'Carril': 'prioritario' if self.small else 'normal',
+            'Lotes': len(self.waits),
+            'Espera_media_s': round(float(np.mean(self.waits)), 3) if self.waits else 0.0,
+            'Espera_max_s': round(max(self.waits), 3) if self.waits else 0.0
+        }
+
+
+class InferenceScheduler:
+    """
+    Concede turnos de inferencia por lote entre los trabajos activos de todas las
+    sesiones: como máximo max_in_flight lotes a la vez, primero los trabajos de
+    hasta small_job_images imágenes y, entre el resto, el de menor tiempo virtual.
+    """
+
+    def __init__(self, max_in_flight=None, small_job_images=None):
+        self.config = Config()
+        self.max_in_flight = max_in_flight or self.config.SCHEDULER_MAX_IN_FLIGHT
+        self.small_job_images = self.config.SCHEDULER_SMALL_JOB_IMAGES if small_job_images is None else small_job_images
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = []
+        self._jobs = {}
+        self._sequence = itertools.count()
+
+    @contextmanager
+    def job(self, session_id, total, weight=1.0):
+        """Registrar una ejecución mientras dura el bloque with"""
+        with self._condition:
+            # Un trabajo nuevo empieza en el tiempo virtual de los activos: no adelanta a nadie por llegar tarde
+            start = min((job.virtual_time for job in self._jobs.values()), default=0.0)
+            job = SchedulerJob(session_id, total, weight, total <= self.small_job_images, start)
+            self._jobs[job.job_id] = job
+        try:
+            yield job
+        finally:
+            with self._condition:
+                self._jobs.pop(job.job_id, None)
+                self._condition.notify_all()
+
+    def _priority(self, ticket):
+        job, _, sequence = ticket
+        return (not job.small, job.virtual_time, sequence)
+
+    @contextmanager
+    def slot(self, job, images):
+        """Esperar turno para un lote de `images` imágenes del trabajo y ocuparlo durante el bloque"""
+        ticket = (job, images, next(self._sequence))
+        requested = time.perf_counter()
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                while self._in_flight >= self.max_in_flight or min(self._waiting, key=self._priority) is not ticket:
+                    self._condition.wait()
+            finally:
+                self._waiting.remove(ticket)
+                # Con este ticket fuera de la cola otro puede ser el primero y quedar un turno libre
+                self._condition.notify_all()
+            self._in_flight += 1
+        job.waits.append(time.perf_counter() - requested)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                job.served += images
+                job.virtual_time += images / job.weight
+                self._condition.notify_all()
+
+    def busy(self):
+        """True si un lote nuevo tendría que esperar"""
+        with self._condition:
+            return self._in_flight >= self.max_in_flight or bool(self._waiting)
+
+    def status(self):
+        with self._condition:
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'waiting': len(self._waiting),
+                'jobs': [job.summary() for job in self._jobs.values()]
+            }
+
+
+def benchmark(model, large_jobs=2, large_images=160, small_jobs=4, small_images=5, batch_size=16, small_delay=2.0):
+    """
+    Sesiones simuladas con hilos: trabajos grandes que arrancan a la vez y
+    trabajos pequeños que llegan después. Devuelve la latencia de extremo a
+    extremo de cada trabajo pequeño sin planificador y con él.
+    """
+    rng = np.random.default_rng(0)
+    batch = rng.random((batch_size, *model.input_shape[1:]), dtype=np.float32)
+    model.predict(batch, batch_size=batch_size, verbose=0)
+    model.predict(batch[:small_images], verbose=0)
+
+    def run_job(scheduler, session_id, images, latencies):
+        start = time.perf_counter()
+        if scheduler is None:
+            for offset in range(0, images, batch_size):
+                model.predict(batch[:min(batch_size, images - offset)], verbose=0)
+        else:
+            with scheduler.job(session_id, images) as job:
+                for offset in range(0, images, batch_size):
+                    size = min(batch_size, images - offset)
+                    with scheduler.slot(job, size):
+                        model.predict(batch[:size], verbose=0)
+        latencies.append(time.perf_counter() - start)
+
+    results = {}
+    for mode in ('sin_planificador', 'con_planificador'):
+        scheduler = InferenceScheduler() if mode == 'con_planificador' else None
+        large_latencies, small_latencies = [], []
+        threads = [
+            threading.Thread(target=run_job, args=(scheduler, f"grande-{i}", large_images, large_latencies))
+            for i in range(large_jobs)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for i in range(small_jobs):
+            # Los trabajos pequeños llegan escalonados mientras los grandes están en curso
+            time.sleep(small_delay if i == 0 else small_delay / 2)
+            thread = threading.Thread(target=run_job, args=(scheduler, f"pequeño-{i}", small_images, small_latencies))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        results[mode] = {
+            'total_s': round(time.perf_counter() - start, 2),
+            'small_latencies_s': [round(value, 2) for value in small_latencies],
+            'large_latencies_s': [round(value, 2) for value in large_latencies]
+        }
+    return results
+
+
+def add_arguments(parser):
+    config = Config()
+    parser.add_argument("action", choices=['benchmark'])
+    parser.add_argument("--model", default=str(config.DEFAULT_MODEL_PATH))
+    parser.add_argument("--large-jobs", type=int, default=2)
+    parser.add_argument("--large-images", type=int, default=160)
+    parser.add_argument("--small-jobs", type=int, default=4)
+    parser.add_argument("--small-images", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=16)
+
+
+def run(args):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    results = benchmark(model, args.large_jobs, args.large_images, args.small_jobs, args.small_images, args.batch_size)
+    print(f"{args.large_jobs} trabajos de {args.large_images} imágenes + {args.small_jobs} de {args.small_images} "
+          f"| lotes de {args.batch_size} | máx. en curso {Config.SCHEDULER_MAX_IN_FLIGHT}")
+    for mode, result in results.items():
+        small = result['small_latencies_s']
+        print(f"{mode:>17}: total {result['total_s']:>6.1f} s | pequeños p50 {np.median(small):>5.1f} s "
+              f"máx {max(small):>5.1f} s | grandes máx {max(result['large_latencies_s']):>6.1f} s")
@@ -0,0 +1,286 @@
+"""
+Carga de modelos HDF5 grandes con pesos memory-mapped.
+
+load_model inicializa todas las variables con valores aleatorios y después
+lee cada tensor completo a memoria del proceso; con modelos de 1-3 GB el pico
+supera varias veces el tamaño del modelo. Aquí la arquitectura se construye
+dentro de un StatelessScope, las variables se crean en cero y cada peso se
+copia por bloques desde un np.memmap del archivo (HDF5 contiguo o archivo
+plano convertido), así el pico queda cerca del tamaño del modelo. Cada bloque
+se libera tras copiarse: al terminar, los pesos son una copia privada en las
+variables de TensorFlow y no se comparten entre procesos (solo las lecturas
+aprovechan la cache de páginas del sistema).
+
+Usa APIs internas de Keras (deserialización HDF5 heredada e inicializador de
+las variables); si esta versión no las tiene se recurre a load_model.
+
+Uso:
+    python -m app.utils weights convert models/trained/model_complete.h5
+    python -m app.utils weights benchmark models/trained/model_complete.h5
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+import tensorflow as tf
+
+from app.config import Config
+from app.utils.fingerprint import file_fingerprint
+
+try:
+    from keras.src.legacy.saving import saving_options, saving_utils
+except ImportError:
+    saving_options = saving_utils = None
+
+PAGE_SIZE = 4096
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+class LazyWeightLoader:
+    """Construir el modelo sin inicializar pesos y leerlos con memory-map desde el HDF5 o un archivo plano"""
+
+    FLAT_SUFFIX = ".weights.bin"
+    INDEX_SUFFIX = ".weights.json"
+
+    def __init__(self):
+        self.config = Config()
+
+    def flat_paths_for(self, model_path):
+        model_path = Path(model_path)
+        return (
+            model_path.with_name(model_path.stem + self.FLAT_SUFFIX),
+            model_path.with_name(model_path.stem + self.INDEX_SUFFIX)
+        )
+
+    def read_layout(self, model_path):
+        """Configuración del modelo y ubicación (offset, forma, dtype) de cada peso por capa"""
+        layout = self._flat_layout(model_path)
+        if layout is not None:
+            return layout
+
+        with h5py.File(model_path, 'r') as f:
+            model_config = f.attrs.get('model_config')
+            if model_config is None:
+                raise ValueError("El archivo no contiene la arquitectura del modelo")
+            if isinstance(model_config, bytes):
+                model_config = model_config.decode('utf-8')
+
+            group = f['model_weights']
+            layers = []
+            for layer_name in self._names(group.attrs.get('layer_names', [])):
+                layer_group = group[layer_name]
+                weight_names = self._names(layer_group.attrs.get('weight_names', []))
+                if weight_names:
+                    layers.append({
+                        'name': layer_name,
+                        'weights': [self._dataset_location(layer_group[name], name) for name in weight_names]
+                    })
+
+        return {'source': str(model_path), 'model_config': json.loads(model_config), 'layers': layers}
+
+    def _dataset_location(self, dataset, name):
+        # Solo los datasets contiguos y sin compresión tienen un offset que se pueda mapear
+        offset = dataset.id.get_offset()
+        contiguous = dataset.chunks is None and dataset.compression is None and offset is not None
+        return {
+            'name': name,
+            'path': dataset.name,
+            'shape': list(dataset.shape),
+            'dtype': dataset.dtype.name,
+            'offset': int(offset) if contiguous else None
+        }
+
+    def _flat_layout(self, model_path):
+        """Layout del archivo plano convertido, si existe y corresponde al modelo actual"""
+        flat_path, index_path = self.flat_paths_for(model_path)
+        if not flat_path.exists() or not index_path.exists():
+            return None
+        with open(index_path, 'r', encoding='utf-8') as f:
+            layout = json.load(f)
+        if layout.get('fingerprint') != file_fingerprint(model_path):
+            return None
+        layout['source'] = str(flat_path)
+        return layout
+
+    def load(self, model_path):
+        """Modelo (sin compilar) con los pesos copiados por bloques desde el archivo mapeado"""
+        if saving_utils is None:
+            return tf.keras.models.load_model(model_path)
+        layout = self.read_layout(model_path)
+
+        with tf.keras.StatelessScope():
+            model = self._model_from_config(layout['model_config'])
+            pairs = self._match_variables(model, layout['layers'])
+            deferred = all(hasattr(variable, '_initializer') for variable, _ in pairs)
+            if deferred:
+                # Ceros en lugar de inicializadores aleatorios: el tensor se reutiliza como buffer de la variable
+                for variable, _ in pairs:
+                    variable._initializer = tf.keras.initializers.Zeros()
+        if not deferred:
+            # Variables ya inicializadas al crearse: la copia por bloques no reduciría el pico
+            return tf.keras.models.load_model(model_path)
+
+        h5_file = None
+        if any(location['offset'] is None for _, location in pairs):
+            h5_file = h5py.File(layout['source'], 'r')
+        try:
+            for variable, location in pairs:
+                self._fill(variable, layout['source'], location, h5_file)
+        finally:
+            if h5_file is not None:
+                h5_file.close()
+
+        return model
+
+    def _model_from_config(self, model_config):
+        """Misma deserialización que load_model usa para HDF5 (configuración heredada sin módulos)"""
+        with saving_options.keras_option_scope(use_legacy_config=True):
+            return saving_utils.model_from_config(model_config)
+
+    def _match_variables(self, model, saved_layers):
+        """Pares (variable, ubicación en archivo) en el orden del formato HDF5 heredado"""
+        layers = [layer for layer in model.layers if self._legacy_weights(layer)]
+        if len(layers) != len(saved_layers):
+            raise ValueError(f"El modelo tiene {len(layers)} capas con pesos y el archivo {len(saved_layers)}")
+
+        pairs = []
+        for layer, saved in zip(layers, saved_layers):
+            variables = self._legacy_weights(layer)
+            if len(variables) != len(saved['weights']):
+                raise ValueError(
+                    f"La capa {layer.name} espera {len(variables)} pesos y el archivo tiene {len(saved['weights'])}"
+                )
+            for variable, location in zip(variables, saved['weights']):
+                if tuple(variable.shape) != tuple(location['shape']):
+                    raise ValueError(
+                        f"Forma incompatible en {layer.name}/{location['name']}: "
+                        f"{tuple(variable.shape)} vs {tuple(location['shape'])}"
+                    )
+                pairs.append((variable, location))
+        return pairs
+
+    def _legacy_weights(self, layer):
+        # Mismo orden con el que el formato HDF5 heredado guarda los pesos
+        return layer.trainable_weights + layer.non_trainable_weights
+
+    def _fill(self, variable, source, location, h5_file):
+        """
+        Copiar un peso a su variable por bloques de filas. Cada bloque se mapea,
+        se asigna en el buffer existente (sin leer la variable, así no hay
+        copia completa) y se libera antes del siguiente.
+        """
+        shape = tuple(location['shape'])
+        dtype = np.dtype(location['dtype'])
+        if not shape:
+            variable.assign(np.asarray(self._read_rows(source, location, h5_file, 0, None), dtype=variable.dtype))
+            return
+
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        rows = max(1, BLOCK_BYTES // max(row_bytes, 1))
+        for start in range(0, shape[0], rows):
+            end = min(start + rows, shape[0])
+            block = self._read_rows(source, location, h5_file, start, end)
+            tf.raw_ops.ResourceStridedSliceAssign(
+                ref=variable.handle,
+                begin=[start] + [0] * (len(shape) - 1),
+                end=[end] + list(shape[1:]),
+                strides=[1] * len(shape),
+                value=np.asarray(block, dtype=variable.dtype)
+            )
+            del block
+
+    def _read_rows(self, source, location, h5_file, start, end):
+        if location['offset'] is None:
+            dataset = h5_file[location['path']]
+            return dataset[()] if end is None else dataset[start:end]
+
+        shape = tuple(location['shape'])
+        if end is None:
+            return np.memmap(source, dtype=location['dtype'], mode='r', offset=location['offset'], shape=shape)
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * np.dtype(location['dtype']).itemsize
+        return np.memmap(source, dtype=location['dtype'], mode='r',
+                         offset=location['offset'] + start * row_bytes, shape=(end - start,) + shape[1:])
+
+    def convert(self, model_path):
+        """Escribir todos los pesos en un archivo plano alineado a páginas (sirve para HDF5 comprimidos o en chunks)"""
+        flat_path, index_path = self.flat_paths_for(model_path)
+        layout = self.read_layout(model_path)
+        position = 0
+
+        with h5py.File(model_path, 'r') as f, open(flat_path, 'wb') as out:
+            for saved in layout['layers']:
+                for location in saved['weights']:
+                    padding = -position % PAGE_SIZE
+                    out.write(b'\0' * padding)
+                    position += padding
+                    data = np.ascontiguousarray(f[location['path']][()])
+                    out.write(data.tobytes())
+                    location['offset'] = position
+                    position += data.nbytes
+
+        layout.pop('source', None)
+        layout['fingerprint'] = file_fingerprint(model_path)
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump(layout, f)
+        return flat_path
+
+    def _names(self, values):
+        return [value.decode('utf-8') if isinstance(value, bytes) else str(value) for value in values]
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual en MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['convert', 'load', 'benchmark'])
+    parser.add_argument("model", help="Modelo .h5")
+    parser.add_argument("--mode", default='lazy', choices=['standard', 'lazy'],
+                        help="Modo de carga para 'load' (un proceso por medición)")
+
+
+def run(args):
+    loader = LazyWeightLoader()
+    if args.action == 'convert':
+        print(f"Archivo plano: {loader.convert(args.model)}")
+        return
+
+    if args.action == 'load':
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        if args.mode == 'lazy':
+            model = loader.load(args.model)
+        else:
+            model = tf.keras.models.load_model(args.model, compile=False)
+        seconds = time.perf_counter() - start
+        print(json.dumps({
+            'mode': args.mode,
+            'seconds': round(seconds, 2),
+            'baseline_rss_mb': round(baseline),
+            'peak_rss_mb': round(peak_rss_mb()),
+            'params': int(model.count_params())
+        }))
+        return
+
+    # benchmark: cada modo en un proceso nuevo para que el pico de RSS sea independiente
+    print(f"Modelo: {args.model} ({os.path.getsize(args.model) / (1024 ** 3):.2f} GB)")
+    for mode in ('standard', 'lazy'):
+        result = subprocess.run(
+            [sys.executable, "-m", "app.utils", "weights", "load", args.model, "--mode", mode],
+            capture_output=True, text=True
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+        if result.returncode != 0 or not lines:
+            print(f"{mode:<9} falló (código {result.returncode}; {'sin memoria' if result.returncode == -9 else 'error'})")
+            continue
+        measurement = json.loads(lines[-1])
+        print(f"{mode:<9} carga {measurement['seconds']:>7.2f} s  pico RSS {measurement['peak_rss_mb']:>6} MB "
+              f"(base {measurement['baseline_rss_mb']} MB)")
@@ -0,0 +1,371 @@
+"""
+Prueba de carga multi-sesión del camino de procesamiento de la aplicación.
+
+Cada sesión simulada es un AppTest con su propio st.session_state que ejecuta
+las mismas funciones que main.py: carga el modelo con ModelManager, analiza
+una mezcla de imágenes de test_images/ con analyze_files, muestra los
+resultados (tabla, gráficos y reportes descargables) y pulsa "Nuevo Análisis".
+Las sesiones corren en paralelo en el mismo proceso, como en el servidor, y
+comparten el planificador, el gobernador de memoria y las caches de modelos.
+
+Por defecto se usa un modelo sustituto pequeño con la misma entrada y salida
+que el modelo real; los almacenes (ejecuciones, historial, índices) se
+escriben en un directorio temporal.
+
+Uso:
+    python -m app.utils loadtest --sessions 1 2 4 --cycles 3 --mix benign=6 malignant=3 normal=3
+"""
+
+import gc
+import io
+import json
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+from app.utils.memory_governor import rss_mb
+
+
+class UploadedImage(io.BytesIO):
+    """Archivo de test_images/ con la interfaz de un UploadedFile de Streamlit"""
+
+    def __init__(self, path):
+        path = Path(path)
+        super().__init__(path.read_bytes())
+        self.name = path.name
+        self.size = len(self.getbuffer())
+        self.type = f"image/{path.suffix.lstrip('.').lower()}"
+
+
+def session_state_footprint(state):
+    """Número de claves, MB aproximados (DataFrames y bytes incluidos) y bytes por clave de un session_state"""
+    sizes = {}
+    for key in list(state.keys()):
+        value = state[key]
+        if isinstance(value, pd.DataFrame):
+            size = int(value.memory_usage(deep=True).sum())
+        elif isinstance(value, (bytes, bytearray, str)):
+            size = len(value)
+        elif isinstance(value, (list, dict)):
+            size = sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+        else:
+            size = sys.getsizeof(value)
+        sizes[key] = size
+    return len(sizes), sum(sizes.values()) / (1024 * 1024), sizes
+
+
+def build_stand_in_model(path):
+    """Modelo sustituto: misma entrada (Config.INPUT_SIZE) y salida softmax que el modelo real, pesos aleatorios"""
+    import tensorflow as tf
+
+    config = Config()
+    model = tf.keras.Sequential([
+        tf.keras.Input(config.INPUT_SIZE),
+        tf.keras.layers.Conv2D(8, 3, strides=4, activation='relu'),
+        tf.keras.layers.Conv2D(16, 3, strides=4, activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(len(config.CLASS_MAPPING), activation='softmax')
+    ], name="stand_in")
+    model.save(path)
+    return path
+
+
+def sample_mix(mix, test_dir=None, seed=0):
+    """Rutas de imágenes por clase ({clase: cantidad}) de test_images/, sin máscaras de segmentación"""
+    test_dir = Path(test_dir or Config.PROJECT_ROOT / "test_images")
+    rng = np.random.default_rng(seed)
+    paths = []
+    for label, count in mix.items():
+        candidates = sorted(path for path in (test_dir / label).glob("*.png") if "_mask" not in path.name)
+        picks = rng.choice(len(candidates), size=count, replace=count > len(candidates))
+        paths.extend(str(candidates[i]) for i in picks)
+    return paths
+
+
+def _session_script(paths, model_path, cycles, records, pending, baselines, session_index):
+    """
+    Una recarga de la sesión (corre dentro de AppTest): pulsar "Nuevo Análisis" si
+    hay resultados del ciclo anterior y, si quedan ciclos, analizar y mostrar los
+    resultados del siguiente.
+    """
+    import time
+
+    import streamlit as st
+
+    import app.main as main_app
+    from app.utils.load_test import UploadedImage, session_state_footprint
+    from app.utils.memory_governor import rss_mb
+
+    main_app.initialize_components()
+
+    record = pending.pop(session_index, None)
+    if record is not None:
+        main_app.clear_analysis_results()
+        keys, cleared_mb, sizes = session_state_footprint(st.session_state)
+        # Datos (>= 1 KB) que no existían antes del primer análisis y sobreviven a "Nuevo Análisis"
+        retained = sorted(
+            key for key, size in sizes.items()
+            if key not in baselines[session_index] and size >= 1024 and st.session_state[key] is not None
+        )
+        record.update({
+            'cleared_state_keys': keys,
+            'cleared_state_mb': cleared_mb,
+            'retained_keys': retained,
+            'retained_kb': sum(sizes[key] for key in retained) / 1024,
+            'rss_mb': rss_mb(),
+            'finished': time.perf_counter()
+        })
+        records.append(record)
+
+    if sum(row['session'] == session_index for row in records) >= cycles:
+        return
+
+    manager = st.session_state.model_manager
+    model = manager.get_current_model()
+    if model is None:
+        model = manager.load_model_from_path(model_path)
+    if session_index not in baselines:
+        baselines[session_index] = {key for key in st.session_state.keys() if st.session_state[key] is not None}
+
+    files = [UploadedImage(path) for path in paths]
+    start = time.perf_counter()
+    main_app.analyze_files(
+        files, model, st.session_state.image_processor, st.session_state.metrics_calc, st.session_state.report_gen
+    )
+    analysis_seconds = time.perf_counter() - start
+    main_app.show_persistent_results(model)
+    pending[session_index] = {
+        'session': session_index,
+        'images': len(files),
+        'analysis_seconds': analysis_seconds,
+        'cycle_seconds': time.perf_counter() - start,
+        'results_state_mb': session_state_footprint(st.session_state)[1]
+    }
+
+
+class LoadTest:
+    """Sesiones simuladas concurrentes con medición de rendimiento, latencia y memoria"""
+
+    # Almacenes que la prueba redirige a su directorio de trabajo
+    ISOLATED_PATHS = {
+        'RUNS_DB_FILE': "runs.sqlite3",
+        'HISTORY_DB_FILE': "history.sqlite3",
+        'PERCEPTUAL_INDEX_DIR': "perceptual",
+        'EMBEDDING_CACHE_DIR': "embeddings",
+        'MODEL_REGISTRY_FILE': "model_registry.json",
+        'READINESS_FILE': "readiness.json",
+        'PROMETHEUS_FILE': "metrics.prom",
+        'REPORT_CACHE_DIR': "report_cache"
+    }
+
+    def __init__(self, model_path=None, mix=None, cycles=3, workdir=None, timeout=600, seed=0):
+        self.workdir = Path(workdir or tempfile.mkdtemp(prefix="bcc_loadtest_"))
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self._isolate()
+        self.model_path = str(model_path or build_stand_in_model(str(self.workdir / "stand_in.h5")))
+        self.mix = mix or {'benign': 6, 'malignant': 3, 'normal': 3}
+        self.cycles = cycles
+        self.timeout = timeout
+        self.seed = seed
+
+    def _isolate(self):
+        for attribute, name in self.ISOLATED_PATHS.items():
+            setattr(Config, attribute, self.workdir / name)
+        # Las sesiones cargan el modelo indicado, no el precargado por defecto
+        Config.PRELOAD_DEFAULT_MODEL = False
+        Config.AUTOTUNE_ON_START = False
+
+    def _run_session(self, index, paths, records, pending, errors, barrier):
+        from streamlit.testing.v1 import AppTest
+
+        app = AppTest.from_function(
+            _session_script, args=(paths, self.model_path, self.cycles, records, pending, self._baselines, index),
+            default_timeout=self.timeout
+        )
+        barrier.wait()
+        try:
+            # La última recarga solo pulsa "Nuevo Análisis" para medir lo que queda en session_state
+            for _ in range(self.cycles + 1):
+                app.run()
+                if app.exception:
+                    errors.append(f"sesión {index}: {app.exception[0].value}")
+                    return
+        except Exception as e:
+            errors.append(f"sesión {index}: {e}")
+
+    def run(self, sessions):
+        """Ejecutar `sessions` sesiones concurrentes de `cycles` ciclos cada una y resumir"""
+        records, errors, samples, pending = [], [], [], {}
+        self._baselines = {}
+        barrier = threading.Barrier(sessions + 1)
+        stop = threading.Event()
+
+        def sample_memory():
+            while not stop.is_set():
+                samples.append(rss_mb())
+                stop.wait(0.25)
+
+        threads = [
+            threading.Thread(
+                target=self._run_session,
+                args=(index, sample_mix(self.mix, seed=self.seed + index), records, pending, errors, barrier)
+            )
+            for index in range(sessions)
+        ]
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        for thread in threads:
+            thread.start()
+
+        gc.collect()
+        rss_start = rss_mb()
+        sampler.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - start
+        stop.set()
+        sampler.join()
+        gc.collect()
+
+        return self.summarize(sessions, records, errors, samples, rss_start, rss_mb(), wall_seconds)
+
+    def summarize(self, sessions, records, errors, samples, rss_start, rss_end, wall_seconds):
+        cycles = pd.DataFrame(records)
+        summary = {
+            'sessions': sessions,
+            'cycles_completed': len(cycles),
+            'errors': errors,
+            'wall_seconds': round(wall_seconds, 2),
+            'rss_start_mb': round(rss_start, 1),
+            'rss_peak_mb': round(max(samples, default=rss_end), 1),
+            'rss_end_mb': round(rss_end, 1)
+        }
+        if cycles.empty:
+            return summary
+
+        latencies = cycles['cycle_seconds']
+        images = int(cycles['images'].sum())
+        summary.update({
+            'images': images,
+            'images_per_second': round(images / wall_seconds, 2),
+            'cycle_p50_s': round(float(latencies.quantile(0.5)), 2),
+            'cycle_p95_s': round(float(latencies.quantile(0.95)), 2),
+            'cycle_max_s': round(float(latencies.max()), 2),
+            'per_session': [
+                {
+                    'session': int(session),
+                    'cycles': len(group),
+                    'cycle_seconds': [round(value, 2) for value in group['cycle_seconds']],
+                    'cleared_state_mb': [round(value, 3) for value in group['cleared_state_mb']]
+                }
+                for session, group in cycles.groupby('session')
+            ]
+        })
+
+        # Fuga: lo que queda en session_state tras "Nuevo Análisis" crece entre ciclos
+        growth = cycles.groupby('session')['cleared_state_mb'].agg(lambda values: values.iloc[-1] - values.iloc[0])
+        retained = sorted({key for keys in cycles['retained_keys'] for key in keys})
+        ordered = cycles.sort_values('finished')
+        summary.update({
+            'cleared_state_mb_max': round(float(cycles['cleared_state_mb'].max()), 3),
+            'cleared_state_growth_mb': round(float(growth.max()), 3),
+            'retained_after_clear': retained,
+            'retained_kb_max': round(float(cycles['retained_kb'].max()), 1),
+            # Pendiente de la memoria residente por ciclo completado (MB/ciclo)
+            'rss_growth_mb_per_cycle': round(float(np.polyfit(np.arange(len(ordered)), ordered['rss_mb'], 1)[0]), 2)
+            if len(ordered) > 1 else 0.0
+        })
+        return summary
+
+    def capacity(self, session_counts, target_p95=None):
+        """Ejecutar varias cantidades de sesiones y elegir la mayor que cumple el objetivo de latencia p95"""
+        target_p95 = target_p95 or Config.LOAD_TEST_TARGET_P95_SECONDS
+        results = [self.run(sessions) for sessions in session_counts]
+        within = [
+            result['sessions'] for result in results
+            if not result['errors'] and result.get('cycle_p95_s', float('inf')) <= target_p95
+        ]
+        return {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'model_path': self.model_path,
+            'mix': self.mix,
+            'cycles_per_session': self.cycles,
+            'target_p95_s': target_p95,
+            'max_sessions_within_target': max(within) if within else 0,
+            'runs': results
+        }
+
+    def write_report(self, report, output_dir=None):
+        """Guardar el informe de capacidad como JSON y Markdown; devuelve las rutas"""
+        output_dir = Path(output_dir or Config.LOAD_TEST_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"capacidad_{datetime.now():%Y%m%d_%H%M%S}"
+        json_path = output_dir / f"{stem}.json"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        lines = [
+            "# Informe de capacidad",
+            "",
+            f"- Modelo: `{report['model_path']}`",
+            f"- Mezcla por sesión: {', '.join(f'{label}={count}' for label, count in report['mix'].items())}",
+            f"- Ciclos por sesión: {report['cycles_per_session']}",
+            f"- Objetivo de latencia p95 por ciclo: {report['target_p95_s']} s",
+            f"- **Sesiones concurrentes dentro del objetivo: {report['max_sessions_within_target']}**",
+            "",
+            "| Sesiones | Imágenes/s | p50 (s) | p95 (s) | Máx (s) | RSS inicio/pico/fin (MB) | RSS MB/ciclo | session_state tras limpiar (MB) | Errores |",
+            "|---|---|---|---|---|---|---|---|---|"
+        ]
+        for run in report['runs']:
+            lines.append(
+                f"| {run['sessions']} | {run.get('images_per_second', 'N/A')} | {run.get('cycle_p50_s', 'N/A')} | "
+                f"{run.get('cycle_p95_s', 'N/A')} | {run.get('cycle_max_s', 'N/A')} | "
+                f"{run['rss_start_mb']:.0f} / {run['rss_peak_mb']:.0f} / {run['rss_end_mb']:.0f} | "
+                f"{run.get('rss_growth_mb_per_cycle', 'N/A')} | {run.get('cleared_state_mb_max', 'N/A')} | {len(run['errors'])} |"
+            )
+        retained = sorted({key for run in report['runs'] for key in run.get('retained_after_clear', [])})
+        if retained:
+            retained_kb = max(run.get('retained_kb_max', 0) for run in report['runs'])
+            lines += ["", f"⚠️ Datos que siguen en session_state tras \"Nuevo Análisis\": {', '.join(retained)} "
+                          f"(hasta {retained_kb:.0f} KB por sesión)"]
+
+        markdown_path = output_dir / f"{stem}.md"
+        markdown_path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        return json_path, markdown_path
+
+
+def parse_mix(values):
+    """['benign=6', 'normal=2'] -> {'benign': 6, 'normal': 2}"""
+    return {label: int(count) for label, count in (value.split('=') for value in values)}
+
+
+def add_arguments(parser):
+    parser.add_argument("--sessions", type=int, nargs='+', default=[1, 2, 4], help="Cantidades de sesiones concurrentes")
+    parser.add_argument("--cycles", type=int, default=3, help="Ciclos de análisis + \"Nuevo Análisis\" por sesión")
+    parser.add_argument("--mix", nargs='+', default=['benign=6', 'malignant=3', 'normal=3'], help="Imágenes por clase")
+    parser.add_argument("--model", default=None, help="Modelo a usar (por defecto un sustituto pequeño)")
+    parser.add_argument("--target-p95", type=float, default=None, help="Objetivo de latencia p95 por ciclo (s)")
+    parser.add_argument("--output-dir", default=None)
+
+
+def run(args):
+    load_test = LoadTest(args.model, parse_mix(args.mix), cycles=args.cycles)
+    report = load_test.capacity(args.sessions, args.target_p95)
+    for result in report['runs']:
+        print(f"{result['sessions']:>3} sesiones: {result.get('images_per_second', 0):>6.2f} img/s | "
+              f"ciclo p50 {result.get('cycle_p50_s', 0):>6.2f} s p95 {result.get('cycle_p95_s', 0):>6.2f} s | "
+              f"RSS pico {result['rss_peak_mb']:.0f} MB ({result.get('rss_growth_mb_per_cycle', 0):+.1f} MB/ciclo) | "
+              f"session_state tras limpiar {result.get('cleared_state_mb_max', 0):.3f} MB | errores {len(result['errors'])}")
+        for error in result['errors']:
+            print(f"    {error}")
+    print(f"Sesiones dentro del objetivo p95 ({report['target_p95_s']} s): {report['max_sessions_within_target']}")
+    for path in load_test.write_report(report, args.output_dir):
+        print(f"Informe: {path}")
@@ -0,0 +1,161 @@
+import ctypes
+import gc
+import os
+import resource
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from app.config import Config
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_governor():
+    """Gobernador único del proceso: la memoria residente es común a todas las sesiones"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MemoryGovernor()
+        return _shared
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (pico si /proc no está disponible)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def memory_limit_mb():
+    """Límite de memoria del contenedor (cgroup v2/v1) o, si no hay, la RAM física"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path, 'r') as f:
+                value = f.read().strip()
+            # Sin límite: 'max' (v2) o un valor enorme (v1)
+            if value != 'max' and int(value) < 1 << 60:
+                return int(value) / (1024 * 1024)
+        except (OSError, ValueError):
+            continue
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+
+
+def _release_free_memory():
+    # glibc conserva la memoria liberada; malloc_trim la devuelve al sistema
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class MemoryGovernor:
+    """
+    Controla la memoria residente del proceso frente a un presupuesto. Por encima
+    del umbral suave libera caches en orden de prioridad; si no basta, reduce el
+    lote admitido y, por encima del umbral duro, pausa la decodificación hasta que
+    baje la presión. Las decisiones quedan registradas para el panel de rendimiento.
+    """
+
+    LEVEL_NORMAL = 'normal'
+    LEVEL_HIGH = 'alta'
+    LEVEL_CRITICAL = 'crítica'
+
+    def __init__(self, budget_mb=None, soft_limit=None, hard_limit=None, max_pause_seconds=None, history=200):
+        self.config = Config()
+        budget_mb = budget_mb or self.config.MEMORY_BUDGET_MB
+        self.budget_mb = budget_mb or memory_limit_mb() * self.config.MEMORY_AUTO_BUDGET_FRACTION
+        self.soft_limit = soft_limit or self.config.MEMORY_SOFT_LIMIT
+        self.hard_limit = hard_limit or self.config.MEMORY_HARD_LIMIT
+        self.max_pause_seconds = self.config.MEMORY_MAX_PAUSE_SECONDS if max_pause_seconds is None else max_pause_seconds
+        self._decisions = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def pressure(self):
+        """Fracción del presupuesto en uso"""
+        return rss_mb() / self.budget_mb
+
+    def level(self, pressure=None):
+        pressure = self.pressure() if pressure is None else pressure
+        if pressure >= self.hard_limit:
+            return self.LEVEL_CRITICAL
+        if pressure >= self.soft_limit:
+            return self.LEVEL_HIGH
+        return self.LEVEL_NORMAL
+
+    def status(self):
+        usage = rss_mb()
+        return {
+            'rss_mb': round(usage, 1),
+            'budget_mb': round(self.budget_mb, 1),
+            'pressure': round(usage / self.budget_mb, 3),
+            'level': self.level(usage / self.budget_mb)
+        }
+
+    def _record(self, stage, action, detail, pressure):
+        with self._lock:
+            self._decisions.append({
+                'Hora': datetime.now().strftime('%H:%M:%S'),
+                'Etapa': stage,
+                'Accion': action,
+                'Detalle': detail,
+                'RSS_MB': round(pressure * self.budget_mb, 1),
+                'Presion_%': round(100 * pressure, 1)
+            })
+
+    def decisions(self):
+        with self._lock:
+            return list(self._decisions)
+
+    def relieve(self, evictors, stage=''):
+        """
+        Ejecutar los liberadores [(nombre, función)] en orden hasta bajar del
+        umbral suave; devuelve la presión final.
+        """
+        pressure = self.pressure()
+        for name, evict in evictors:
+            if pressure < self.soft_limit:
+                break
+            before = pressure
+            if not evict():
+                continue
+            _release_free_memory()
+            pressure = self.pressure()
+            freed_mb = (before - pressure) * self.budget_mb
+            if freed_mb >= 1:
+                self._record(stage, 'liberar', f"{name}: {freed_mb:.0f} MB", pressure)
+        return pressure
+
+    def admit(self, requested, evictors=(), stage=''):
+        """
+        Tamaño de lote que se puede procesar ahora (entre 1 y requested): completo
+        por debajo del umbral suave, proporcionalmente menor entre el suave y el
+        duro y 1 tras pausar si se supera el duro.
+        """
+        pressure = self.pressure()
+        if pressure < self.soft_limit:
+            return requested
+
+        pressure = self.relieve(evictors, stage)
+        if pressure < self.soft_limit:
+            return requested
+
+        if pressure >= self.hard_limit:
+            waited = 0.0
+            while pressure >= self.hard_limit and waited < self.max_pause_seconds:
+                time.sleep(0.5)
+                waited += 0.5
+                _release_free_memory()
+                pressure = self.pressure()
+            self._record(stage, 'pausar', f"{waited:.1f} s esperando memoria; lote {requested} -> 1", pressure)
+            return 1
+
+        allowed = max(1, int(requested * (self.hard_limit - pressure) / (self.hard_limit - self.soft_limit)))
+        if allowed < requested:
+            self._record(stage, 'reducir lote', f"{requested} -> {allowed}", pressure)
+        return allowed
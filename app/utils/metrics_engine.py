@@ -0,0 +1,292 @@
+"""
+Motor de métricas de una sola pasada.
+
+Todo sale de una matriz de confusión 3x3 construida con np.bincount y de las
+columnas de probabilidad: conteos binarios (maligno frente al resto),
+precisión/sensibilidad/F1/especificidad binarias y por clase, promedios macro
+y ponderados, y AUC por rangos (Mann-Whitney). La instantánea se calcula una
+vez por ejecución y la consumen el dashboard, el Excel y la línea de comandos.
+
+Uso:
+    python -m app.utils metrics benchmark --rows 1000000
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+
+BINARY_RESULTS = ['VN', 'FP', 'FN', 'VP']
+PROBABILITY_COLUMNS = ['Prob_Benign', 'Prob_Malignant', 'Prob_Normal']
+
+
+def _ratio(numerator, denominator):
+    """Cociente elemento a elemento con 0 donde el denominador es 0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _average_ranks(values):
+    """Rangos (desde 1) con empates promediados, como scipy.stats.rankdata"""
+    order = np.argsort(values, kind='mergesort')
+    sorted_values = values[order]
+    boundaries = np.flatnonzero(sorted_values[1:] != sorted_values[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(values)]))
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = np.repeat((starts + ends + 1) / 2.0, ends - starts)
+    return ranks
+
+
+def binary_auc(y_true, scores):
+    """Área bajo la curva ROC por rangos; None si falta alguna de las dos clases"""
+    positives = int(y_true.sum())
+    negatives = len(y_true) - positives
+    if positives == 0 or negatives == 0:
+        return None
+    rank_sum = _average_ranks(scores)[y_true].sum()
+    return float((rank_sum - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def roc_points(y_true, scores, max_points=500):
+    """Curva ROC (fpr, tpr) en los umbrales distintos, submuestreada a max_points para graficar"""
+    order = np.argsort(-scores, kind='mergesort')
+    sorted_scores, sorted_true = scores[order], y_true[order]
+    # Último índice de cada grupo de puntuaciones iguales
+    ends = np.concatenate((np.flatnonzero(sorted_scores[1:] != sorted_scores[:-1]), [len(scores) - 1]))
+    tps = np.cumsum(sorted_true)[ends]
+    fps = ends + 1 - tps
+    tpr = np.concatenate(([0.0], tps / max(tps[-1], 1)))
+    fpr = np.concatenate(([0.0], fps / max(fps[-1], 1)))
+    if len(fpr) > max_points:
+        keep = np.unique(np.linspace(0, len(fpr) - 1, max_points).round().astype(int))
+        fpr, tpr = fpr[keep], tpr[keep]
+    return {'fpr': fpr.tolist(), 'tpr': tpr.tolist()}
+
+
+class MetricsEngine:
+    """
+    Instantánea de métricas a partir de etiquetas codificadas (0..2, -1 =
+    desconocida) o del DataFrame de resultados. La clase positiva de las
+    métricas binarias es Malignant.
+    """
+
+    def __init__(self):
+        self.config = Config()
+        self.class_names = [self.config.CLASS_MAPPING[i] for i in sorted(self.config.CLASS_MAPPING)]
+        self.positive = self.class_names.index('Malignant')
+
+    def confusion_matrix(self, y_true, y_pred):
+        """Matriz 3x3 (filas = real, columnas = predicha) de las filas con ambas etiquetas conocidas"""
+        classes = len(self.class_names)
+        known = (y_true >= 0) & (y_pred >= 0)
+        return np.bincount(y_true[known] * classes + y_pred[known], minlength=classes * classes).reshape(classes, classes)
+
+    def binary(self, counts, y_true=None, scores=None):
+        """Métricas binarias de los conteos [VN, FP, FN, VP]; AUC por rangos si hay puntuaciones"""
+        vn, fp, fn, vp = (int(value) for value in counts)
+        total = vn + fp + fn + vp
+        if total == 0:
+            return None
+        precision = float(_ratio(vp, vp + fp))
+        sensitivity = float(_ratio(vp, vp + fn))
+        specificity = float(_ratio(vn, vn + fp))
+        auc = binary_auc(y_true, scores) if scores is not None and len(scores) else None
+        snapshot = {
+            'VP': vp, 'VN': vn, 'FP': fp, 'FN': fn, 'TOTAL': total,
+            'precision': precision, 'sensitivity': sensitivity, 'specificity': specificity,
+            'f1_score': float(_ratio(2 * precision * sensitivity, precision + sensitivity)),
+            'accuracy': (vp + vn) / total,
+            # Sin probabilidades (o con una sola clase real) se mantiene la aproximación por exactitud balanceada
+            'auc': auc if auc is not None else (sensitivity + specificity) / 2,
+            'auc_source': 'roc' if auc is not None else 'balanced'
+        }
+        if auc is not None:
+            snapshot['roc'] = roc_points(y_true, scores)
+        return snapshot
+
+    def multiclass(self, cm, y_true=None, probabilities=None):
+        """Métricas por clase, macro y ponderadas de una matriz 3x3; AUC uno contra el resto si hay probabilidades"""
+        tp = np.diag(cm).astype(np.float64)
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        total = cm.sum()
+        fp = predicted - tp
+        fn = support - tp
+        tn = total - tp - fp - fn
+        per_class = {
+            'precision': _ratio(tp, predicted),
+            'recall': _ratio(tp, support),
+            'specificity': _ratio(tn, tn + fp),
+        }
+        per_class['f1'] = _ratio(2 * per_class['precision'] * per_class['recall'],
+                                 per_class['precision'] + per_class['recall'])
+
+        weights = _ratio(support, support.sum())
+        # Como scikit-learn con etiquetas inferidas: el promedio macro solo cubre las clases reales o predichas
+        present = (support + predicted) > 0
+        snapshot = {
+            'confusion_matrix': cm,
+            'accuracy_multiclass': float(_ratio(tp.sum(), total)),
+            'per_class': {
+                name: {**{metric: float(values[i]) for metric, values in per_class.items()}, 'support': int(support[i])}
+                for i, name in enumerate(self.class_names)
+            },
+            'macro': {
+                metric: float(values[present].mean()) if present.any() else 0.0 for metric, values in per_class.items()
+            },
+            'weighted': {metric: float((values * weights).sum()) for metric, values in per_class.items()}
+        }
+
+        if probabilities is not None and len(probabilities):
+            aucs = [binary_auc(y_true == i, probabilities[:, i]) for i in range(len(self.class_names))]
+            snapshot['auc_per_class'] = dict(zip(self.class_names, aucs))
+            valid = [(auc, int(support[i])) for i, auc in enumerate(aucs) if auc is not None]
+            if valid:
+                snapshot['auc_macro'] = float(np.mean([auc for auc, _ in valid]))
+                snapshot['auc_weighted'] = float(sum(auc * weight for auc, weight in valid) / max(sum(w for _, w in valid), 1))
+        return snapshot
+
+    def from_labels(self, y_true, y_pred, y_proba=None):
+        """
+        Instantánea completa de etiquetas enteras (y probabilidades (N, 3) opcionales).
+        Solo cuentan las filas con ambas etiquetas conocidas (-1 = desconocida).
+        """
+        y_true = np.asarray(y_true, dtype=np.int64)
+        y_pred = np.asarray(y_pred, dtype=np.int64)
+        known = (y_pred >= 0) & (y_true >= 0)
+        truth_positive = y_true[known] == self.positive
+        counts = np.bincount(2 * truth_positive + (y_pred[known] == self.positive), minlength=4)
+
+        probabilities = None if y_proba is None else np.asarray(y_proba, dtype=np.float64)
+        scores = None if probabilities is None else probabilities[known, self.positive]
+        snapshot = self.binary(counts, truth_positive, scores) or {}
+
+        if known.any():
+            snapshot.update(self.multiclass(
+                self.confusion_matrix(y_true, y_pred), y_true[known],
+                None if probabilities is None else probabilities[known]
+            ))
+        return snapshot or None
+
+    def from_results(self, results_df):
+        """
+        Instantánea del DataFrame de resultados: conteos binarios de 'Resultado'
+        (VP/VN/FP/FN) y, si están las columnas, matriz 3x3 de Diagnostico y
+        Prediccion y AUC de las columnas Prob_*. Las filas ERROR no cuentan.
+        """
+        if 'Resultado' not in results_df.columns:
+            return None
+        outcome = pd.Categorical(results_df['Resultado'], categories=BINARY_RESULTS).codes
+        scored = outcome >= 0
+        counts = np.bincount(outcome[scored], minlength=4)
+        # VP y FN son las filas realmente malignas
+        truth_positive = outcome[scored] >= 2
+
+        probabilities = None
+        if all(column in results_df.columns for column in PROBABILITY_COLUMNS):
+            values = results_df[PROBABILITY_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+            finite = np.isfinite(values).all(axis=1)
+            if (finite & scored).any():
+                probabilities = values
+        scores_mask = scored & finite if probabilities is not None else None
+        snapshot = self.binary(
+            counts,
+            None if probabilities is None else (outcome[scores_mask] >= 2),
+            None if probabilities is None else probabilities[scores_mask, self.positive]
+        )
+        if snapshot is None:
+            return None
+
+        if 'Diagnostico' in results_df.columns and 'Prediccion' in results_df.columns:
+            y_true = pd.Categorical(results_df['Diagnostico'], categories=self.class_names).codes.astype(np.int64)
+            y_pred = pd.Categorical(results_df['Prediccion'], categories=self.class_names).codes.astype(np.int64)
+            known = scored & (y_true >= 0) & (y_pred >= 0)
+            if known.any():
+                with_scores = known & finite if probabilities is not None else None
+                snapshot.update(self.multiclass(
+                    self.confusion_matrix(y_true[scored], y_pred[scored]),
+                    None if probabilities is None else y_true[with_scores],
+                    None if probabilities is None else probabilities[with_scores]
+                ))
+        return snapshot
+
+
+def _sklearn_detailed(y_true, y_pred, y_proba):
+    """Las llamadas de scikit-learn que hacía MetricsCalculator.calculate_detailed_metrics"""
+    from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, precision_score, recall_score, roc_auc_score
+
+    confusion_matrix(y_true, y_pred, labels=[0, 1, 2])
+    accuracy_score(y_true, y_pred)
+    for average in ('macro', None):
+        precision_score(y_true, y_pred, average=average, zero_division=0)
+        recall_score(y_true, y_pred, average=average, zero_division=0)
+        f1_score(y_true, y_pred, average=average, zero_division=0)
+    roc_auc_score(y_true, y_proba, multi_class='ovr', average='macro')
+    roc_auc_score(y_true, y_proba, multi_class='ovr', average='weighted')
+
+
+def benchmark(rows=1_000_000, seed=0, repeats=3):
+    """Segundos (mejor de repeats) del motor frente a scikit-learn y al cálculo anterior con value_counts"""
+    rng = np.random.default_rng(seed)
+    y_true = rng.integers(0, 3, rows)
+    logits = rng.normal(size=(rows, 3)) + 1.5 * np.eye(3)[y_true]
+    y_proba = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    y_pred = y_proba.argmax(axis=1)
+    results = np.where(y_pred == 1, np.where(y_true == 1, 'VP', 'FP'), np.where(y_true == 1, 'FN', 'VN'))
+    names = np.array(['Benign', 'Malignant', 'Normal'])
+    df = pd.DataFrame({
+        'Diagnostico': names[y_true], 'Prediccion': names[y_pred], 'Resultado': results,
+        **{column: y_proba[:, i] for i, column in enumerate(PROBABILITY_COLUMNS)}
+    })
+    engine = MetricsEngine()
+
+    def best(function):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def value_counts_binary():
+        counts = df['Resultado'].value_counts()
+        return counts.get('VP', 0), counts.get('FN', 0)
+
+    # Comprobación: el motor reproduce a scikit-learn
+    from sklearn.metrics import f1_score, roc_auc_score
+    snapshot = engine.from_labels(y_true, y_pred, y_proba)
+    checks = {
+        'f1_macro': abs(snapshot['macro']['f1'] - f1_score(y_true, y_pred, average='macro')),
+        'auc_macro': abs(snapshot['auc_macro'] - roc_auc_score(y_true, y_proba, multi_class='ovr', average='macro'))
+    }
+
+    return {
+        'rows': rows,
+        'sklearn_detailed_s': best(lambda: _sklearn_detailed(y_true, y_pred, y_proba)),
+        'engine_labels_s': best(lambda: engine.from_labels(y_true, y_pred, y_proba)),
+        'engine_labels_no_auc_s': best(lambda: engine.from_labels(y_true, y_pred)),
+        'value_counts_binary_s': best(value_counts_binary),
+        'engine_dataframe_s': best(lambda: engine.from_results(df)),
+        'max_abs_diff': max(checks.values())
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['benchmark'])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+
+
+def run(args):
+    result = benchmark(args.rows, repeats=args.repeats)
+    print(f"{result['rows']:,} filas (mejor de {args.repeats})")
+    print(f"  scikit-learn (6 métricas + matriz + 2 AUC): {result['sklearn_detailed_s']:>7.3f} s")
+    print(f"  motor, etiquetas con AUC:                 {result['engine_labels_s']:>7.3f} s")
+    print(f"  motor, etiquetas sin AUC:                 {result['engine_labels_no_auc_s']:>7.3f} s")
+    print(f"  value_counts binario (anterior):          {result['value_counts_binary_s']:>7.3f} s")
+    print(f"  motor, DataFrame de resultados completo:  {result['engine_dataframe_s']:>7.3f} s")
+    print(f"  diferencia máxima con scikit-learn: {result['max_abs_diff']:.2e}")
@@ -0,0 +1,135 @@
+import re
+from contextlib import nullcontext
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+from app.utils.metrics_calculator import MetricsCalculator
+
+
+class ModelComparison:
+    """
+    Comparar varios modelos sobre las mismas imágenes.
+    Cada imagen se decodifica y preprocesa una sola vez; los lotes resultantes
+    pasan por todos los modelos antes de preparar el siguiente lote.
+    """
+
+    METRIC_LABELS = {
+        'accuracy': 'Exactitud',
+        'precision': 'Precisión',
+        'sensitivity': 'Sensibilidad',
+        'specificity': 'Especificidad',
+        'f1_score': 'F1-Score',
+        'auc': 'AUC',
+        'VP': 'VP', 'VN': 'VN', 'FP': 'FP', 'FN': 'FN'
+    }
+
+    PREDICTION_COLUMNS = ['Prediccion', 'Confianza', 'Prob_Benign', 'Prob_Malignant', 'Prob_Normal', 'Resultado']
+    # Nombre con el que el modelo activo entra en la comparación (reservado en el registro)
+    ACTIVE_MODEL_NAME = 'Activo'
+
+    def __init__(self, image_processor, metrics_calc=None, batch_size=None):
+        self.config = Config()
+        self.image_processor = image_processor
+        self.metrics_calc = metrics_calc or MetricsCalculator()
+        self.batch_size = batch_size or self.config.COMPARISON_BATCH_SIZE
+
+    @staticmethod
+    def column_suffix(name):
+        """Sufijo de las columnas de un modelo (Prediccion_<sufijo>); debe ser único en la comparación"""
+        return re.sub(r'\W+', '_', name).strip('_')
+
+    def run(self, uploaded_files, models, progress_callback=None, slot=None):
+        """
+        Puntuar todos los archivos con todos los modelos ({nombre: modelo}) y resumir.
+        slot(imágenes), si se indica, devuelve el turno del planificador para cada lote.
+        """
+        tracker = self.image_processor.tracker
+        rows = [None] * len(uploaded_files)
+        pending = []
+
+        for i, uploaded_file in enumerate(uploaded_files):
+            try:
+                with tracker.image(uploaded_file.name):
+                    image = self.image_processor.load_image(uploaded_file)
+                    pending.append((i, uploaded_file.name, self.image_processor.preprocess_image(image)[0]))
+            except Exception as e:
+                rows[i] = {'Nombre_Archivo': uploaded_file.name, 'Error': str(e)}
+
+            if len(pending) >= self.batch_size or (i == len(uploaded_files) - 1 and pending):
+                with slot(len(pending)) if slot else nullcontext():
+                    self._score(pending, models, rows)
+                pending = []
+
+            if progress_callback:
+                progress_callback(i + 1, len(uploaded_files))
+
+        return self.summarize(rows, list(models))
+
+    def _score(self, pending, models, rows):
+        batch = np.stack([array for _, _, array in pending])
+        probabilities = {
+            name: self.image_processor.predict_batch(batch, model)
+            for name, model in models.items()
+        }
+
+        for position, (i, filename, _) in enumerate(pending):
+            diagnosis = self.metrics_calc.extract_diagnosis_from_filename(filename)
+            row = {'Nombre_Archivo': filename, 'Diagnostico': diagnosis}
+            for name, model_probabilities in probabilities.items():
+                prediction = self.image_processor.format_prediction(model_probabilities[position])
+                prediction['Resultado'] = self.metrics_calc.calculate_classification_result(
+                    prediction['Prediccion'], diagnosis
+                )
+                suffix = self.column_suffix(name)
+                row.update({f"{column}_{suffix}": value for column, value in prediction.items()})
+            rows[i] = row
+
+    def summarize(self, rows, names):
+        """DataFrame por imagen, métricas por modelo y estadísticas de acuerdo"""
+        df = pd.DataFrame(rows)
+        suffixes = {name: self.column_suffix(name) for name in names}
+        for column in ['Diagnostico'] + [f"{column}_{suffix}" for suffix in suffixes.values() for column in self.PREDICTION_COLUMNS]:
+            if column not in df.columns:
+                df[column] = None
+        scored = df[df[f"Prediccion_{suffixes[names[0]]}"].notna()].copy()
+
+        predictions = scored[[f"Prediccion_{suffix}" for suffix in suffixes.values()]]
+        scored['Acuerdo'] = np.where(predictions.nunique(axis=1) == 1, 'Sí', 'No')
+        df.loc[scored.index, 'Acuerdo'] = scored['Acuerdo']
+
+        metrics = {}
+        for name, suffix in suffixes.items():
+            model_df = scored.rename(columns={f"{column}_{suffix}": column for column in self.PREDICTION_COLUMNS})
+            metrics[name] = self.metrics_calc.calculate_real_time_metrics(model_df) if len(model_df) else None
+
+        pairwise = pd.DataFrame(1.0, index=names, columns=names)
+        for first, second in combinations(names, 2):
+            rate = float((scored[f"Prediccion_{suffixes[first]}"] == scored[f"Prediccion_{suffixes[second]}"]).mean()) if len(scored) else 0.0
+            pairwise.loc[first, second] = pairwise.loc[second, first] = rate
+
+        return {
+            'df': df,
+            'models': names,
+            'metrics': metrics,
+            'metrics_table': self.metrics_table(metrics),
+            'pairwise_agreement': pairwise,
+            'images': len(df),
+            'scored': len(scored),
+            'agreement_rate': float((scored['Acuerdo'] == 'Sí').mean()) if len(scored) else 0.0,
+            'disagreements': scored[scored['Acuerdo'] == 'No']
+        }
+
+    def metrics_table(self, metrics):
+        """Métricas de MetricsCalculator lado a lado (una columna por modelo)"""
+        table = {}
+        for name, values in metrics.items():
+            if values is None:
+                continue
+            table[name] = {
+                label: (round(float(values[key]), 4) if key not in ('VP', 'VN', 'FP', 'FN') else int(values[key]))
+                for key, label in self.METRIC_LABELS.items()
+            }
+        return pd.DataFrame(table, dtype=object)
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import h5py
+import numpy as np
+import tensorflow as tf
+
+from app.config import Config
+from app.utils.fingerprint import file_fingerprint, file_sha256
+
+
+class ModelExporter:
+    """Exportar modelos cargados como artefactos de solo inferencia (sin estado del optimizador)"""
+
+    SLIM_SUFFIX = ".slim.h5"
+
+    def __init__(self):
+        self.config = Config()
+
+    def slim_path_for(self, model_path):
+        """Ruta del artefacto slim asociado a un modelo (junto al original)"""
+        model_path = Path(model_path)
+        return model_path.with_name(model_path.stem + self.SLIM_SUFFIX)
+
+    def sidecar_path_for(self, slim_path):
+        slim_path = Path(slim_path)
+        return slim_path.with_name(slim_path.name[:-len(".h5")] + ".json")
+
+    def export(self, model, output_path, float16=False, source_path=None):
+        """Guardar el modelo sin optimizador (opcionalmente con pesos float16) y su JSON de metadatos"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_name(output_path.name + ".tmp.h5")
+
+        model.save(str(tmp_path), include_optimizer=False)
+        if float16:
+            half_path = output_path.with_name(output_path.name + ".f16.h5")
+            self._convert_weights_to_float16(tmp_path, half_path)
+            os.replace(half_path, tmp_path)
+        os.replace(tmp_path, output_path)
+
+        info = self._model_info(model, output_path, float16, source_path)
+        sidecar_path = self.sidecar_path_for(output_path)
+        with open(sidecar_path, 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=4, ensure_ascii=False)
+
+        return info
+
+    def _convert_weights_to_float16(self, source_path, target_path):
+        """Copiar el HDF5 convirtiendo los pesos float32 a float16"""
+        with h5py.File(source_path, 'r') as src, h5py.File(target_path, 'w') as dst:
+            for key, value in src.attrs.items():
+                dst.attrs[key] = value
+
+            def copy(name, obj):
+                if isinstance(obj, h5py.Group):
+                    group = dst.require_group(name)
+                    for key, value in obj.attrs.items():
+                        group.attrs[key] = value
+                    return
+
+                data = obj[()]
+                if name.startswith("model_weights/") and obj.dtype == np.float32:
+                    data = data.astype(np.float16)
+                dataset = dst.create_dataset(name, data=data)
+                for key, value in obj.attrs.items():
+                    dataset.attrs[key] = value
+
+            src.visititems(copy)
+
+    def _model_info(self, model, output_path, float16, source_path):
+        """Metadatos: model_info.json del proyecto extendido con clases, entrada y hash"""
+        base_info_path = self.config.PROJECT_ROOT / "models" / "model_info.json"
+        info = {}
+        if base_info_path.exists():
+            with open(base_info_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+
+        info.update({
+            'classes': [self.config.CLASS_MAPPING[i] for i in sorted(self.config.CLASS_MAPPING)],
+            'class_mapping': {str(k): v for k, v in self.config.CLASS_MAPPING.items()},
+            'input_size': list(model.input_shape[1:]),
+            'output_shape': list(model.output_shape[1:]),
+            'total_params': int(model.count_params()),
+            'artifact': output_path.name,
+            'sha256': file_sha256(output_path),
+            'size_bytes': output_path.stat().st_size,
+            'weights_dtype': 'float16' if float16 else 'float32',
+            'include_optimizer': False,
+            'exported_at': datetime.now().isoformat(timespec='seconds')
+        })
+
+        if source_path and os.path.exists(source_path):
+            info['source'] = {
+                'path': str(source_path),
+                'size_bytes': os.path.getsize(source_path),
+                'fingerprint': file_fingerprint(source_path)
+            }
+        return info
+
+    def load_sidecar(self, slim_path):
+        sidecar_path = self.sidecar_path_for(slim_path)
+        if not sidecar_path.exists():
+            return None
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def find_slim(self, model_path):
+        """Artefacto slim vigente para un modelo (el sidecar debe coincidir con el original actual)"""
+        model_path = Path(model_path)
+        if model_path.name.endswith(self.SLIM_SUFFIX):
+            return None
+
+        slim_path = self.slim_path_for(model_path)
+        if not slim_path.exists():
+            return None
+
+        info = self.load_sidecar(slim_path)
+        if not info or 'source' not in info:
+            return None
+        source = info['source']
+        if source['size_bytes'] != os.path.getsize(model_path) or source['fingerprint'] != file_fingerprint(model_path):
+            return None
+        return slim_path
+
+    def compare(self, model_path, slim_path):
+        """Comparar tamaño y tiempo de carga del modelo original y del artefacto slim"""
+        rows = []
+        for label, path in (("Original", model_path), ("Slim", slim_path)):
+            # Misma llamada que ModelManager (compila y restaura el optimizador si existe)
+            start = time.perf_counter()
+            model = tf.keras.models.load_model(str(path))
+            seconds = time.perf_counter() - start
+            rows.append({
+                'Artefacto': label,
+                'Ruta': str(path),
+                'Tamaño_MB': round(os.path.getsize(path) / (1024 * 1024), 1),
+                'Carga_s': round(seconds, 2),
+                'Parametros': int(model.count_params())
+            })
+            del model
+            tf.keras.backend.clear_session()
+        return rows
+
+
+def add_arguments(parser):
+    parser.add_argument("model", help="Modelo .h5/.keras a exportar")
+    parser.add_argument("--output", default=None, help="Ruta del artefacto (por defecto <modelo>.slim.h5)")
+    parser.add_argument("--float16", action="store_true", help="Guardar los pesos en float16")
+
+
+def run(args):
+    exporter = ModelExporter()
+    output_path = args.output or exporter.slim_path_for(args.model)
+    model = tf.keras.models.load_model(args.model, compile=False)
+    info = exporter.export(model, output_path, float16=args.float16, source_path=args.model)
+    del model
+    tf.keras.backend.clear_session()
+
+    print(f"Artefacto: {output_path} ({info['weights_dtype']}, sha256 {info['sha256'][:12]}...)")
+    for row in exporter.compare(args.model, output_path):
+        print(f"{row['Artefacto']:<9} {row['Tamaño_MB']:>10.1f} MB  carga {row['Carga_s']:>7.2f} s  ({row['Ruta']})")
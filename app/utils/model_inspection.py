@@ -0,0 +1,240 @@
+import json
+import os
+import time
+import zipfile
+from collections import Counter
+
+import h5py
+import numpy as np
+
+from app.config import Config
+
+MODEL_CLASSES = ('Functional', 'Model', 'Sequential')
+
+
+class ModelInspector:
+    """
+    Inspección rápida de modelos .h5/.keras sin cargarlos en TensorFlow.
+    Lee solo la configuración JSON y el manifiesto de pesos (formas y dtypes).
+    """
+
+    def __init__(self):
+        self.config = Config()
+
+    def inspect(self, source):
+        """Resumen del modelo desde una ruta o un archivo abierto (p. ej. un archivo subido)"""
+        start = time.perf_counter()
+        if isinstance(source, (str, os.PathLike)):
+            file_size = os.path.getsize(source)
+        else:
+            source.seek(0, os.SEEK_END)
+            file_size = source.tell()
+            source.seek(0)
+
+        if zipfile.is_zipfile(source):
+            summary = self._inspect_keras(source)
+        else:
+            if not isinstance(source, (str, os.PathLike)):
+                source.seek(0)
+            summary = self._inspect_h5(source)
+
+        summary['file_size_mb'] = file_size / (1024 * 1024)
+        summary['compatibility'] = self._compatibility(summary)
+        summary['seconds'] = time.perf_counter() - start
+        return summary
+
+    def _inspect_h5(self, source):
+        """Formato HDF5 heredado: atributo model_config y grupos model_weights/optimizer_weights"""
+        with h5py.File(source, 'r') as f:
+            model_config = self._json_attr(f.attrs.get('model_config'))
+            training_config = self._json_attr(f.attrs.get('training_config'))
+            keras_version = self._text(f.attrs.get('keras_version'))
+
+            weights_group = f['model_weights'] if 'model_weights' in f else f
+            weights = self._manifest(weights_group)
+            optimizer = self._manifest(f['optimizer_weights']) if 'optimizer_weights' in f else []
+
+        optimizer_name = None
+        if training_config:
+            optimizer_name = training_config.get('optimizer_config', {}).get('class_name')
+        return self._summary('h5', keras_version, model_config, weights, optimizer, optimizer_name)
+
+    def _inspect_keras(self, source):
+        """Formato .keras: zip con config.json, metadata.json y model.weights.h5"""
+        with zipfile.ZipFile(source) as archive:
+            names = archive.namelist()
+            model_config = json.loads(archive.read('config.json')) if 'config.json' in names else None
+            metadata = json.loads(archive.read('metadata.json')) if 'metadata.json' in names else {}
+
+            weights, optimizer = [], []
+            if 'model.weights.h5' in names:
+                with archive.open('model.weights.h5') as member, h5py.File(member, 'r') as f:
+                    for entry in self._manifest(f):
+                        (optimizer if entry['name'].startswith('optimizer/') else weights).append(entry)
+
+        optimizer_name = None
+        if model_config and model_config.get('compile_config'):
+            optimizer_config = model_config['compile_config'].get('optimizer')
+            if isinstance(optimizer_config, dict):
+                optimizer_name = optimizer_config.get('class_name')
+            elif optimizer_config:
+                optimizer_name = str(optimizer_config)
+        return self._summary('keras', metadata.get('keras_version'), model_config, weights, optimizer, optimizer_name)
+
+    def _manifest(self, group):
+        """Lista de datasets (nombre, forma, dtype) de un grupo HDF5 sin leer sus datos"""
+        entries = []
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                entries.append({'name': name, 'shape': tuple(obj.shape), 'dtype': obj.dtype.name})
+
+        group.visititems(visit)
+        return entries
+
+    def _summary(self, file_format, keras_version, model_config, weights, optimizer, optimizer_name):
+        dtypes = Counter()
+        dtype_bytes = Counter()
+        for entry in weights:
+            size = int(np.prod(entry['shape'], dtype=np.int64))
+            dtypes[entry['dtype']] += size
+            dtype_bytes[entry['dtype']] += size * np.dtype(entry['dtype']).itemsize
+
+        optimizer_bytes = sum(
+            int(np.prod(entry['shape'], dtype=np.int64)) * np.dtype(entry['dtype']).itemsize
+            for entry in optimizer
+        )
+
+        summary = {
+            'format': file_format,
+            'keras_version': keras_version,
+            'has_architecture': model_config is not None,
+            'architecture': None,
+            'backbone': None,
+            'layers': 0,
+            'input_shape': None,
+            'output_units': None,
+            'output_activation': None,
+            'total_params': sum(dtypes.values()),
+            'weights_mb': sum(dtype_bytes.values()) / (1024 * 1024),
+            'dtypes': {
+                dtype: {'params': dtypes[dtype], 'mb': dtype_bytes[dtype] / (1024 * 1024)}
+                for dtype in sorted(dtypes)
+            },
+            'optimizer': optimizer_name,
+            'optimizer_mb': optimizer_bytes / (1024 * 1024)
+        }
+
+        if model_config:
+            layers = model_config.get('config', {}).get('layers', [])
+            nested = [layer for layer in layers if layer.get('class_name') in MODEL_CLASSES]
+            summary['architecture'] = model_config.get('class_name')
+            summary['backbone'] = nested[0]['config'].get('name') if nested else None
+            summary['layers'] = len([layer for layer in layers if layer.get('class_name') != 'InputLayer'])
+            summary['input_shape'] = self._input_shape(model_config)
+            summary['output_units'], summary['output_activation'] = self._output(model_config)
+        return summary
+
+    def _input_shape(self, model_config):
+        """Forma de entrada declarada (InputLayer, batch_input_shape o build_input_shape)"""
+        config = model_config.get('config', {})
+        for layer in config.get('layers', []):
+            layer_config = layer.get('config', {})
+            shape = layer_config.get('batch_shape') or layer_config.get('batch_input_shape')
+            if shape:
+                return list(shape)
+            if layer.get('class_name') in MODEL_CLASSES:
+                shape = self._input_shape(layer)
+                if shape:
+                    return shape
+            if model_config.get('class_name') == 'Sequential':
+                break
+
+        shape = config.get('build_input_shape') or model_config.get('build_config', {}).get('input_shape')
+        return list(shape) if shape else None
+
+    def _output(self, model_config):
+        """Unidades y activación de la última capa con unidades (Dense) del modelo"""
+        layers = model_config.get('config', {}).get('layers', [])
+        candidates = list(reversed(layers))
+        if model_config.get('class_name') != 'Sequential':
+            # En modelos funcionales se empieza por las capas declaradas como salida
+            output_names = self._output_names(model_config.get('config', {}).get('output_layers'))
+            by_name = {layer.get('config', {}).get('name'): layer for layer in layers}
+            candidates = [by_name[name] for name in output_names if name in by_name] + candidates
+
+        activation = None
+        for layer in candidates:
+            layer_config = layer.get('config', {})
+            if layer.get('class_name') == 'Activation' and activation is None:
+                activation = layer_config.get('activation')
+            if 'units' in layer_config:
+                return layer_config['units'], activation or layer_config.get('activation')
+            if layer.get('class_name') in MODEL_CLASSES:
+                units, nested_activation = self._output(layer)
+                if units is not None:
+                    return units, activation or nested_activation
+        return None, activation
+
+    def _output_names(self, output_layers):
+        if not output_layers:
+            return []
+        if isinstance(output_layers[0], str):
+            return [output_layers[0]]
+        names = []
+        for item in output_layers:
+            names.extend(self._output_names(item))
+        return names
+
+    def _compatibility(self, summary):
+        """Problemas de compatibilidad con Config.INPUT_SIZE y Config.CLASS_MAPPING"""
+        issues = []
+        if not summary['has_architecture']:
+            issues.append("El archivo solo contiene pesos: falta la arquitectura del modelo")
+            return {'compatible': False, 'issues': issues}
+
+        expected_input = list(self.config.INPUT_SIZE)
+        input_shape = summary['input_shape']
+        if input_shape is None:
+            issues.append("No se pudo determinar la forma de entrada")
+        elif list(input_shape[1:]) != expected_input:
+            issues.append(f"Entrada {tuple(input_shape[1:])} distinta de la esperada {tuple(expected_input)}")
+
+        expected_classes = len(self.config.CLASS_MAPPING)
+        if summary['output_units'] is None:
+            issues.append("No se pudo determinar el número de salidas")
+        elif summary['output_units'] != expected_classes:
+            issues.append(f"{summary['output_units']} salidas para {expected_classes} clases configuradas")
+        elif summary['output_activation'] not in (None, 'softmax'):
+            issues.append(f"Activación de salida '{summary['output_activation']}' (se espera softmax)")
+
+        return {'compatible': not issues, 'issues': issues}
+
+    def _json_attr(self, value):
+        value = self._text(value)
+        return json.loads(value) if value else None
+
+    def _text(self, value):
+        if isinstance(value, bytes):
+            return value.decode('utf-8')
+        return value
+
+
+def add_arguments(parser):
+    parser.add_argument("model", help="Modelo .h5/.keras a inspeccionar")
+
+
+def run(args):
+    summary = ModelInspector().inspect(args.model)
+    print(f"Formato: {summary['format']} (Keras {summary['keras_version']}) | {summary['file_size_mb']:.1f} MB | "
+          f"inspección {summary['seconds'] * 1000:.0f} ms")
+    print(f"Arquitectura: {summary['architecture']} | backbone: {summary['backbone']} | capas: {summary['layers']}")
+    print(f"Entrada: {summary['input_shape']} | salidas: {summary['output_units']} ({summary['output_activation']})")
+    print(f"Parámetros: {summary['total_params']:,} ({summary['weights_mb']:.1f} MB)")
+    for dtype, values in summary['dtypes'].items():
+        print(f"  {dtype:<8} {values['params']:>14,}  {values['mb']:>9.1f} MB")
+    print(f"Optimizador: {summary['optimizer'] or '-'} ({summary['optimizer_mb']:.1f} MB)")
+    compatibility = summary['compatibility']
+    print("Compatible: sí" if compatibility['compatible'] else "Compatible: no")
+    for issue in compatibility['issues']:
+        print(f"  - {issue}")
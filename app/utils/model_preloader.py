@@ -0,0 +1,202 @@
+"""
+Precarga del modelo por defecto en segundo plano con calentamiento y sonda de disponibilidad.
+
+Streamlit solo ejecuta main.py cuando se conecta una sesión; `serve` arranca
+la precarga en el mismo proceso antes de levantar el servidor, de modo que el
+modelo ya se está cargando cuando llega el primer usuario. El estado se
+escribe en Config.READINESS_FILE para que el orquestador retenga el tráfico
+hasta que el modelo esté caliente.
+
+Uso:
+    python -m app.utils preload serve --port 8501
+    python -m app.utils preload ready      # código de salida 0 solo si el modelo está listo
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import h5py
+import numpy as np
+import tensorflow as tf
+
+from app.config import Config
+from app.utils.autotune import InferenceAutotuner
+from app.utils.lazy_weights import LazyWeightLoader
+from app.utils.model_export import ModelExporter
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_preloader():
+    """Precargador único del proceso (compartido por todas las sesiones); lo arranca la primera llamada"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ModelPreloader()
+            _shared.start()
+        return _shared
+
+
+class ModelPreloader:
+    """
+    Carga el modelo por defecto (o su artefacto slim) en un hilo, lo calienta con
+    lotes de ceros de los tamaños usados en el análisis y publica el estado.
+    """
+
+    STATUS_IDLE = 'inactivo'
+    STATUS_TUNING = 'afinando'
+    STATUS_LOADING = 'cargando'
+    STATUS_WARMING = 'calentando'
+    STATUS_READY = 'listo'
+    STATUS_ERROR = 'error'
+    PENDING = (STATUS_LOADING, STATUS_TUNING, STATUS_WARMING)
+
+    def __init__(self, model_path=None, readiness_file=None, lazy=None, warmup_batches=None, autotune=None):
+        self.config = Config()
+        self.model_path = str(model_path or self.config.DEFAULT_MODEL_PATH)
+        self.readiness_file = Path(readiness_file or self.config.READINESS_FILE)
+        self.lazy = self.config.LAZY_WEIGHT_LOADING if lazy is None else lazy
+        self.warmup_batches = warmup_batches or self.config.PRELOAD_WARMUP_BATCHES
+        self.autotune = self.config.AUTOTUNE_ON_START if autotune is None else autotune
+        self.model = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._state = {'status': self.STATUS_IDLE, 'pid': os.getpid(), 'requested_path': self.model_path}
+
+    def start(self):
+        """Lanzar la carga en segundo plano (solo la primera vez)"""
+        if self._thread is None:
+            self._update(status=self.STATUS_LOADING, started_at=datetime.now().isoformat(timespec='seconds'))
+            self._thread = threading.Thread(target=self._run, name="model-preloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Esperar a que termine la precarga (con éxito o error); True si el modelo está listo"""
+        self._ready.wait(timeout)
+        return self.is_ready()
+
+    def is_ready(self):
+        return self._state['status'] == self.STATUS_READY
+
+    def state(self):
+        """Copia del estado: status, rutas, tiempos de carga/calentamiento y error"""
+        state = dict(self._state)
+        if state['status'] in self.PENDING and 'started' in state:
+            state['elapsed_seconds'] = round(time.perf_counter() - state['started'], 1)
+        state.pop('started', None)
+        return state
+
+    def _run(self):
+        self._state['started'] = time.perf_counter()
+        try:
+            if not os.path.exists(self.model_path):
+                raise FileNotFoundError(f"Modelo por defecto no encontrado: {self.model_path}")
+
+            slim_path = ModelExporter().find_slim(self.model_path)
+            path = str(slim_path) if slim_path is not None else self.model_path
+
+            # Primer arranque en este host con este modelo: medir lote e hilos antes de iniciar TensorFlow
+            tuner = InferenceAutotuner()
+            tuning = tuner.lookup(path)
+            if tuning is None and self.autotune:
+                self._update(status=self.STATUS_TUNING)
+                tuning = tuner.tune(path)
+            if tuning is not None:
+                threads = tuner.apply_threads(path)
+                self._update(batch_size=tuning['batch_size'], threads=threads)
+                self.warmup_batches = sorted({1, tuning['batch_size']})
+
+            self._update(status=self.STATUS_LOADING)
+            start = time.perf_counter()
+            model = self._load(path)
+            load_seconds = time.perf_counter() - start
+            self._update(status=self.STATUS_WARMING, path=path, slim=slim_path is not None,
+                         load_seconds=round(load_seconds, 2))
+
+            warmup = {}
+            for batch_size in self.warmup_batches:
+                start = time.perf_counter()
+                model.predict(np.zeros((batch_size, *model.input_shape[1:]), dtype=np.float32), verbose=0)
+                warmup[str(batch_size)] = round(time.perf_counter() - start, 3)
+
+            self.model = model
+            self._update(status=self.STATUS_READY, warmup_seconds=warmup,
+                         size_mb=round(os.path.getsize(path) / (1024 * 1024), 1),
+                         ready_at=datetime.now().isoformat(timespec='seconds'))
+        except Exception as e:
+            self._update(status=self.STATUS_ERROR, error=str(e))
+        finally:
+            self._ready.set()
+
+    def _load(self, path):
+        if self.lazy and h5py.is_hdf5(path):
+            try:
+                return LazyWeightLoader().load(path)
+            except Exception:
+                pass
+        return tf.keras.models.load_model(path)
+
+    def _update(self, **values):
+        self._state.update(values)
+        self._write()
+
+    def _write(self):
+        # Escritura atómica: la sonda nunca lee un JSON a medias
+        state = self.state()
+        state['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        self.readiness_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.readiness_file.with_name(self.readiness_file.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.readiness_file)
+
+
+def read_readiness(readiness_file=None):
+    """Estado publicado por el precargador, o None si no hay archivo o su proceso ya no existe"""
+    path = Path(readiness_file or Config.READINESS_FILE)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    try:
+        os.kill(state['pid'], 0)
+    except (KeyError, ProcessLookupError):
+        return None
+    except PermissionError:
+        pass
+    return state
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['serve', 'ready'])
+    parser.add_argument("--readiness-file", default=None, help="Archivo de estado (por defecto Config.READINESS_FILE)")
+    parser.add_argument("--port", type=int, default=None, help="Puerto del servidor Streamlit (serve)")
+    parser.add_argument("--address", default=None, help="Dirección del servidor Streamlit (serve)")
+
+
+def run(args):
+    if args.action == 'ready':
+        state = read_readiness(args.readiness_file)
+        if state is None:
+            print("sin precarga activa")
+            sys.exit(1)
+        print(json.dumps(state, ensure_ascii=False))
+        sys.exit(0 if state['status'] == ModelPreloader.STATUS_READY else 1)
+
+    from streamlit.web import bootstrap
+
+    shared_preloader()
+    flag_options = {}
+    if args.port:
+        flag_options['server.port'] = args.port
+    if args.address:
+        flag_options['server.address'] = args.address
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(str(Config.PROJECT_ROOT / "app" / "main.py"), False, [], flag_options)
@@ -0,0 +1,79 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from app.config import Config
+from app.utils.model_comparison import ModelComparison
+from app.utils.model_inspection import ModelInspector
+
+
+class ModelRegistry:
+    """Registro persistente de modelos con nombre (producción, candidatos) para comparaciones"""
+
+    def __init__(self, registry_file=None):
+        self.config = Config()
+        self.registry_file = Path(registry_file or self.config.MODEL_REGISTRY_FILE)
+        self._entries = self._load()
+
+    def _load(self):
+        if self.registry_file.exists():
+            with open(self.registry_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return []
+
+    def _save(self):
+        self.registry_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.registry_file.with_name(self.registry_file.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.registry_file)
+
+    def entries(self):
+        return list(self._entries)
+
+    def names(self):
+        return [entry['name'] for entry in self._entries]
+
+    def get(self, name):
+        for entry in self._entries:
+            if entry['name'] == name:
+                return entry
+        return None
+
+    def register(self, name, path, role='candidato'):
+        """Registrar (o actualizar) un modelo; se valida con la inspección rápida sin cargarlo"""
+        name = name.strip()
+        if not name:
+            raise ValueError("El nombre del modelo no puede estar vacío")
+        # En la comparación cada modelo escribe columnas Prediccion_<sufijo>: dos sufijos iguales se pisarían
+        suffix = ModelComparison.column_suffix(name)
+        if not suffix:
+            raise ValueError(f"El nombre '{name}' necesita al menos una letra o un número")
+        if suffix == ModelComparison.column_suffix(ModelComparison.ACTIVE_MODEL_NAME):
+            raise ValueError(f"'{ModelComparison.ACTIVE_MODEL_NAME}' está reservado para el modelo activo")
+        for existing in self._entries:
+            if existing['name'] != name and ModelComparison.column_suffix(existing['name']) == suffix:
+                raise ValueError(f"El nombre '{name}' coincide en las columnas con el modelo '{existing['name']}'")
+        if not os.path.exists(path):
+            raise ValueError(f"No existe el archivo {path}")
+
+        summary = ModelInspector().inspect(path)
+        if not summary['compatibility']['compatible']:
+            raise ValueError("; ".join(summary['compatibility']['issues']))
+
+        entry = {
+            'name': name,
+            'path': str(path),
+            'role': role,
+            'total_params': summary['total_params'],
+            'size_mb': round(summary['file_size_mb'], 1),
+            'registered_at': datetime.now().isoformat(timespec='seconds')
+        }
+        self._entries = [existing for existing in self._entries if existing['name'] != name] + [entry]
+        self._save()
+        return entry
+
+    def remove(self, name):
+        self._entries = [entry for entry in self._entries if entry['name'] != name]
+        self._save()
@@ -1,14 +1,33 @@
+import gc
+import h5py
 import streamlit as st
 import tensorflow as tf
 import os
 import tempfile
+import threading
+import weakref
+from collections import defaultdict
 from pathlib import Path
 from app.config import Config
+from app.utils.model_export import ModelExporter
+from app.utils.model_inspection import ModelInspector
+from app.utils.lazy_weights import LazyWeightLoader
+
+# Modelos cargados del proceso, compartidos por las sesiones: (ruta, lazy) -> modelo.
+# _cached los mantiene vivos aunque nadie los use; _live solo mientras alguna sesión
+# (o el explicador, la cascada...) los referencia, para no cargar una segunda copia.
+_cached = {}
+_live = weakref.WeakValueDictionary()
+_cache_lock = threading.Lock()
+_load_locks = defaultdict(threading.Lock)
 
 class ModelManager:
     def __init__(self):
         self.config = Config()
         self.max_file_size = 3 * 1024 * 1024 * 1024  # 3GB
+        self.exporter = ModelExporter()
+        self.inspector = ModelInspector()
+        self.lazy_loader = LazyWeightLoader()
         
         if 'model_loaded' not in st.session_state:
             st.session_state.model_loaded = None
@@ -16,6 +35,8 @@ class ModelManager:
             st.session_state.model_info = None
         if 'model_path' not in st.session_state:
             st.session_state.model_path = None
+        if 'lazy_weights' not in st.session_state:
+            st.session_state.lazy_weights = self.config.LAZY_WEIGHT_LOADING
     
     def load_model_interface(self):
         """Interface de Streamlit para cargar modelos con límite de 3GB"""
@@ -27,10 +48,17 @@ class ModelManager:
             if st.session_state.model_info:
                 info = st.session_state.model_info
                 st.info(f"Modelo activo: {info.get('original_name', 'modelo')} ({info.get('size_mb', 0):.1f} MB)")
+            self.export_interface(current_model)
         
         # Mostrar límite actualizado
         st.info("✅ Límite de archivo configurado: 3GB (3072MB)")
         
+        st.checkbox(
+            "🧠 Cargar pesos con memory-map",
+            key="lazy_weights",
+            help="Solo .h5: los pesos se copian por bloques desde el archivo mapeado; el pico de memoria queda cerca del tamaño del modelo"
+        )
+        
         st.markdown("**Opción 1: Subir Archivo (Hasta 3GB)**")
         
         with st.expander("Instrucciones para archivos grandes (2-3GB)"):
@@ -76,6 +104,8 @@ class ModelManager:
                 else:
                     st.metric("Estado", "✅ Normal")
             
+            self.show_inspection(self._inspect_upload(uploaded_file))
+            
             # Advertencia para archivos muy grandes
             if file_size_mb > 2000:
                 st.warning("""
@@ -115,6 +145,8 @@ class ModelManager:
                     
             except:
                 st.warning("No se puede obtener información del archivo")
+            
+            self.show_inspection(self._inspect_path(model_path, os.path.getmtime(model_path)))
         elif model_path:
             st.error("Archivo no encontrado en la ruta especificada")
         
@@ -123,7 +155,7 @@ class ModelManager:
                 with st.spinner("Cargando modelo desde ruta..."):
                     loaded_model = self.load_model_from_path(model_path)
                     if loaded_model:
-                        st.experimental_rerun()
+                        st.rerun()
             else:
                 st.error("Especifica una ruta válida")
         
@@ -174,16 +206,15 @@ class ModelManager:
             
             # Cargar modelo
             st.info("🔄 Cargando modelo en memoria...")
-            model = self._load_model_from_path(tmp_file_path)
+            model = self._load_model_from_path(tmp_file_path, st.session_state.lazy_weights)
             
             if model:
-                # Guardar permanentemente
-                permanent_path = self.config.MODELS_DIR / f"uploaded_{uploaded_file.name}"
-                permanent_path.parent.mkdir(parents=True, exist_ok=True)
+                # Guardar permanentemente solo lo necesario para inferencia (sin optimizador)
+                permanent_path = self.config.MODELS_DIR / f"uploaded_{Path(uploaded_file.name).stem}{self.exporter.SLIM_SUFFIX}"
                 
                 # Guardar con barra de progreso
                 with st.spinner("Guardando modelo permanentemente..."):
-                    model.save(str(permanent_path))
+                    self.exporter.export(model, permanent_path)
                 
                 # Actualizar session state
                 st.session_state.model_loaded = model
@@ -194,6 +225,7 @@ class ModelManager:
                     'path': str(permanent_path),
                     'size_mb': file_size / (1024 * 1024),
                     'size_gb': file_size / (1024 * 1024 * 1024),
+                    'saved_size_mb': permanent_path.stat().st_size / (1024 * 1024),
                     'input_shape': model.input_shape,
                     'output_shape': model.output_shape,
                     'total_params': model.count_params()
@@ -218,20 +250,108 @@ class ModelManager:
                 pass
             return None
 
-    # Mantén tus otros métodos existentes...
-    @st.cache_resource
-    def _load_model_from_path(_self, model_path):
-        """Cargar modelo desde una ruta específica (versión interna con cache)"""
+    def _inspect_upload(self, uploaded_file):
         try:
-            model = tf.keras.models.load_model(model_path)
-            return model
+            return self.inspector.inspect(uploaded_file)
         except Exception as e:
-            st.error(f"Error cargando modelo: {str(e)}")
-            return None
+            return {'error': str(e)}
+        finally:
+            uploaded_file.seek(0)
+
+    @st.cache_data(show_spinner=False)
+    def _inspect_path(_self, model_path, mtime):
+        """Inspección del archivo sin cargarlo (cacheada por ruta y fecha de modificación)"""
+        try:
+            return _self.inspector.inspect(model_path)
+        except Exception as e:
+            return {'error': str(e)}
+
+    def show_inspection(self, summary):
+        """Mostrar arquitectura, formas, parámetros y compatibilidad antes de cargar"""
+        if 'error' in summary:
+            st.error(f"❌ No se pudo leer el archivo como modelo Keras: {summary['error']}")
+            return
+        
+        compatibility = summary['compatibility']
+        if compatibility['compatible']:
+            st.success(f"🔎 Modelo compatible ({summary['seconds'] * 1000:.0f} ms de inspección)")
+        else:
+            st.warning("🔎 Posibles incompatibilidades:\n\n" + "\n".join(f"- {issue}" for issue in compatibility['issues']))
+        
+        with st.expander("🔎 Inspección del modelo (sin cargar)"):
+            architecture = summary['architecture'] or '-'
+            if summary['backbone']:
+                architecture += f" ({summary['backbone']})"
+            st.markdown(f"""
+            - **Arquitectura:** {architecture}, {summary['layers']} capas
+            - **Entrada:** {summary['input_shape']}
+            - **Salidas:** {summary['output_units']} ({summary['output_activation'] or '-'})
+            - **Parámetros:** {summary['total_params']:,} ({summary['weights_mb']:.1f} MB)
+            - **Optimizador:** {summary['optimizer'] or '-'} ({summary['optimizer_mb']:.1f} MB)
+            """)
+            for dtype, values in summary['dtypes'].items():
+                st.caption(f"{dtype}: {values['params']:,} parámetros ({values['mb']:.1f} MB)")
+
+    # Mantén tus otros métodos existentes...
+    def _load_model_from_path(self, model_path, lazy=False):
+        """Cargar modelo desde una ruta específica (versión interna con cache de proceso)"""
+        key = (str(model_path), bool(lazy))
+        with _load_locks[key]:
+            with _cache_lock:
+                model = _cached.get(key)
+                if model is None:
+                    model = _live.get(key)
+                if model is not None:
+                    _cached[key] = model
+                    return model
+            try:
+                model = None
+                if lazy and h5py.is_hdf5(model_path):
+                    try:
+                        model = self.lazy_loader.load(model_path)
+                    except Exception as e:
+                        st.warning(f"⚠️ Carga con memory-map no disponible ({str(e)}); usando carga estándar")
+                if model is None:
+                    model = tf.keras.models.load_model(model_path)
+            except Exception as e:
+                st.error(f"Error cargando modelo: {str(e)}")
+                return None
+            with _cache_lock:
+                _cached[key] = model
+                _live[key] = model
+            return model
+
+    @staticmethod
+    def release_idle_models():
+        """
+        Soltar los modelos cacheados que ya no usa ninguna sesión ni el precargador;
+        los que siguen en uso se conservan (liberarlos no ahorraría memoria y la
+        siguiente carga crearía una copia). Devuelve cuántos modelos se liberaron.
+        """
+        with _cache_lock:
+            keys = list(_cached)
+            _cached.clear()
+        # Los modelos Keras tienen ciclos de referencias: solo el recolector los libera
+        gc.collect()
+        released = 0
+        with _cache_lock:
+            for key in keys:
+                model = _live.get(key)
+                if model is None:
+                    released += 1
+                else:
+                    _cached[key] = model
+        return released
 
     def load_model_from_path(self, model_path):
         """Cargar modelo desde ruta y guardarlo en session_state"""
         try:
+            original_path = model_path
+            slim_path = self.exporter.find_slim(model_path)
+            if slim_path is not None:
+                st.info(f"⚡ Usando artefacto de inferencia: {slim_path.name}")
+                model_path = str(slim_path)
+            
             file_size = os.path.getsize(model_path)
             file_size_gb = file_size / (1024*1024*1024)
             
@@ -240,7 +360,7 @@ class ModelManager:
             else:
                 st.info(f"Cargando modelo ({file_size / (1024*1024):.1f} MB)...")
             
-            model = self._load_model_from_path(model_path)
+            model = self._load_model_from_path(model_path, st.session_state.lazy_weights)
             
             if model:
                 st.session_state.model_loaded = model
@@ -248,6 +368,8 @@ class ModelManager:
                 st.session_state.model_info = {
                     'source': 'path',
                     'path': model_path,
+                    'original_path': original_path,
+                    'slim': slim_path is not None,
                     'size_mb': file_size / (1024*1024),
                     'size_gb': file_size_gb,
                     'input_shape': model.input_shape,
@@ -265,11 +387,56 @@ class ModelManager:
             st.error(f"Error cargando modelo: {str(e)}")
             return None
 
+    def export_interface(self, model):
+        """Exportar el modelo activo como artefacto slim de solo inferencia"""
+        info = st.session_state.model_info or {}
+        source_path = info.get('original_path') or info.get('path')
+        if info.get('slim') or not source_path or source_path.endswith(self.exporter.SLIM_SUFFIX):
+            return
+        
+        with st.expander("📦 Exportar modelo de inferencia"):
+            st.caption("Guarda el modelo sin estado del optimizador; se usará automáticamente al cargar desde la misma ruta")
+            float16 = st.checkbox("Pesos en float16 (mitad de tamaño)", key="export_float16")
+            if st.button("Exportar", key="btn_export_slim"):
+                slim_path = self.exporter.slim_path_for(source_path)
+                with st.spinner("Exportando modelo..."):
+                    try:
+                        export_info = self.exporter.export(model, slim_path, float16=float16, source_path=source_path)
+                    except Exception as e:
+                        st.error(f"❌ Error exportando modelo: {str(e)}")
+                        return
+                original_mb = os.path.getsize(source_path) / (1024 * 1024)
+                slim_mb = export_info['size_bytes'] / (1024 * 1024)
+                st.success(f"✅ {slim_path.name}: {original_mb:.1f} MB → {slim_mb:.1f} MB")
+
     def get_current_model(self):
         return st.session_state.model_loaded
 
+    def use_preloaded(self, preloader):
+        """Usar en esta sesión el modelo precargado (compartido entre sesiones) si aún no hay uno"""
+        if st.session_state.model_loaded is not None or not preloader.is_ready():
+            return st.session_state.model_loaded
+        state = preloader.state()
+        model = preloader.model
+        st.session_state.model_loaded = model
+        st.session_state.model_path = state['path']
+        st.session_state.model_info = {
+            'source': 'preload',
+            'path': state['path'],
+            'original_path': state['requested_path'],
+            'original_name': os.path.basename(state['requested_path']),
+            'slim': state['slim'],
+            'size_mb': state['size_mb'],
+            'size_gb': state['size_mb'] / 1024,
+            'input_shape': model.input_shape,
+            'output_shape': model.output_shape,
+            'total_params': model.count_params()
+        }
+        return model
+
     def clear_model(self):
         st.session_state.model_loaded = None
         st.session_state.model_info = None
         st.session_state.model_path = None
         st.cache_resource.clear()
+        self.release_idle_models()
@@ -0,0 +1,227 @@
+"""
+Índice de hashes perceptuales para reutilizar predicciones de imágenes casi idénticas.
+
+Uso:
+    python -m app.utils dedup benchmark --sizes 1000 10000 100000
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from app.config import Config
+from app.utils.file_lock import file_lock
+from app.utils.fingerprint import file_fingerprint
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+@lru_cache(maxsize=4)
+def _bit_permutation(bits, seed=0):
+    # Mezcla fija de bits: cada bloque del índice combina zonas distintas de la imagen
+    return np.random.default_rng(seed).permutation(bits)
+
+
+def dhash(image_array, hash_size=None):
+    """
+    dHash de hash_size² bits sobre la imagen preprocesada (alto, ancho, 3) en [0, 1]:
+    escala de grises reducida a hash_size x (hash_size + 1) y comparación de vecinos horizontales.
+    """
+    hash_size = hash_size or Config.PERCEPTUAL_HASH_SIZE
+    gray = np.tensordot(np.asarray(image_array, dtype=np.float32), GRAY_WEIGHTS, axes=([-1], [0]))
+    small = tf.image.resize(gray[..., np.newaxis], (hash_size, hash_size + 1), method='area').numpy()[..., 0]
+    bits = (small[:, 1:] > small[:, :-1]).flatten()[_bit_permutation(hash_size * hash_size)]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(first, second):
+    return (first ^ second).bit_count()
+
+
+class PerceptualIndex:
+    """
+    Búsqueda por distancia de Hamming con multi-index hashing: el hash se divide
+    en max_distance + 1 bloques y, por el principio del palomar, cualquier hash a
+    distancia <= max_distance coincide exactamente en al menos un bloque. Solo los
+    candidatos de esos bloques se comparan completos.
+    Con namespace, las entradas se guardan en disco y sirven entre ejecuciones; el
+    archivo solo crece y cada flush() agrega las entradas nuevas bajo un bloqueo,
+    incorporando antes las que otros procesos hayan escrito.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, namespace=None, index_dir=None, max_distance=None, hash_bits=None):
+        self.config = Config()
+        self.max_distance = self.config.PERCEPTUAL_MAX_DISTANCE if max_distance is None else max_distance
+        self.hash_bits = hash_bits or self.config.PERCEPTUAL_HASH_SIZE ** 2
+        self.directory = Path(index_dir or self.config.PERCEPTUAL_INDEX_DIR) / namespace if namespace else None
+
+        chunks = self.max_distance + 1
+        bounds = [round(i * self.hash_bits / chunks) for i in range(chunks + 1)]
+        self._chunks = [(self.hash_bits - end, (1 << (end - start)) - 1) for start, end in zip(bounds[:-1], bounds[1:])]
+        self._tables = [{} for _ in self._chunks]
+        self._hashes = []
+        self._payloads = []
+        self._pending = []
+        self._stored = 0
+        self._load()
+
+    @classmethod
+    def for_model(cls, model_path, index_dir=None, max_distance=None):
+        """
+        Índice persistente de las predicciones de un modelo (espacio de nombres: huella
+        rápida del archivo, como el historial); sin archivo el índice queda en memoria.
+        """
+        namespace = file_fingerprint(model_path)[:16] if model_path and os.path.exists(model_path) else None
+        return cls(namespace, index_dir, max_distance)
+
+    def _read_entries(self):
+        """Entradas guardadas en disco ([] si no hay índice o es de otro tamaño de hash)"""
+        if self.directory is None or not (self.directory / self.INDEX_NAME).exists():
+            return []
+        with open(self.directory / self.INDEX_NAME, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get('hash_bits') != self.hash_bits:
+            return []
+        return stored['entries']
+
+    def _load(self):
+        entries = self._read_entries()
+        for hex_hash, payload in entries:
+            self._insert(int(hex_hash, 16), payload)
+        self._stored = len(entries)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self._chunks]
+
+    def _insert(self, value, payload):
+        position = len(self._hashes)
+        self._hashes.append(value)
+        self._payloads.append(payload)
+        for table, key in zip(self._tables, self._keys(value)):
+            table.setdefault(key, []).append(position)
+        return position
+
+    def add(self, value, payload):
+        """Agregar un hash con sus datos (p. ej. nombre y predicción); se escribe a disco con flush()"""
+        payload = {**payload, 'added': datetime.now().isoformat(timespec='seconds')}
+        self._pending.append((value, payload))
+        return self._insert(value, payload)
+
+    def candidates(self, value):
+        """Posiciones que comparten al menos un bloque exacto con el hash"""
+        found = set()
+        for table, key in zip(self._tables, self._keys(value)):
+            found.update(table.get(key, ()))
+        return found
+
+    def find(self, value, max_distance=None):
+        """(datos, distancia) del hash más cercano dentro de max_distance, o None"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        best = None
+        for position in self.candidates(value):
+            distance = hamming(value, self._hashes[position])
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = (position, distance)
+        if best is None:
+            return None
+        return self._payloads[best[0]], best[1]
+
+    def flush(self):
+        """Agregar las entradas nuevas al índice en disco (escritura atómica) si las hay"""
+        if self.directory is None or not self._pending:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        width = (self.hash_bits + 3) // 4
+        with file_lock(self.directory / (self.INDEX_NAME + ".lock")):
+            entries = self._read_entries()
+            # Entradas que otros procesos escribieron desde la última lectura
+            for hex_hash, payload in entries[self._stored:]:
+                self._insert(int(hex_hash, 16), payload)
+            entries += [[f"{value:0{width}x}", payload] for value, payload in self._pending]
+            tmp_path = self.directory / (self.INDEX_NAME + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'hash_bits': self.hash_bits, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.directory / self.INDEX_NAME)
+        self._stored = len(entries)
+        self._pending = []
+
+
+def benchmark(sizes, queries=1000, seed=0):
+    """Tiempo por consulta del índice frente a un recorrido lineal para varios tamaños"""
+    config = Config()
+    rng = np.random.default_rng(seed)
+    bits = config.PERCEPTUAL_HASH_SIZE ** 2
+    width = bits // 8
+
+    def random_hashes(count):
+        return [int.from_bytes(rng.bytes(width), 'big') for _ in range(count)]
+
+    def as_bytes(values):
+        return np.frombuffer(b''.join(value.to_bytes(width, 'big') for value in values), dtype=np.uint8).reshape(-1, width)
+
+    def flip(value, count):
+        for bit in rng.choice(bits, count, replace=False):
+            value ^= 1 << int(bit)
+        return value
+
+    rows = []
+    for size in sizes:
+        stored = random_hashes(size)
+        index = PerceptualIndex()
+        start = time.perf_counter()
+        for value in stored:
+            index._insert(value, None)
+        build_seconds = time.perf_counter() - start
+
+        # La mitad de las consultas son casi duplicados de entradas existentes
+        picks = rng.integers(0, size, queries // 2)
+        probes = [flip(stored[i], int(rng.integers(1, index.max_distance + 1))) for i in picks] + random_hashes(queries - len(picks))
+
+        start = time.perf_counter()
+        found = sum(index.find(value) is not None for value in probes)
+        index_seconds = time.perf_counter() - start
+        candidates = np.mean([len(index.candidates(value)) for value in probes[:200]])
+
+        # Recorrido lineal vectorizado con numpy (XOR + conteo de bits) como referencia
+        matrix = as_bytes(stored)
+        linear_probes = probes[:max(20, queries // 10)]
+        start = time.perf_counter()
+        for probe in as_bytes(linear_probes):
+            np.unpackbits(matrix ^ probe, axis=1).sum(axis=1).min()
+        linear_seconds = (time.perf_counter() - start) / len(linear_probes) * len(probes)
+
+        rows.append({
+            'Hashes': size,
+            'Construccion_s': round(build_seconds, 2),
+            'Candidatos_medios': round(float(candidates), 2),
+            'Indice_us_por_consulta': round(1e6 * index_seconds / len(probes), 1),
+            'Lineal_us_por_consulta': round(1e6 * linear_seconds / len(probes), 1),
+            'Encontrados': f"{found}/{len(probes)}"
+        })
+    return rows
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['benchmark'])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=1000)
+
+
+def run(args):
+    config = Config()
+    print(f"dHash {config.PERCEPTUAL_HASH_SIZE ** 2} bits | distancia máxima {config.PERCEPTUAL_MAX_DISTANCE}")
+    for row in benchmark(args.sizes, args.queries):
+        print(f"{row['Hashes']:>7} hashes  construcción {row['Construccion_s']:>6.2f} s  "
+              f"candidatos {row['Candidatos_medios']:>5.2f}  índice {row['Indice_us_por_consulta']:>8.1f} µs  "
+              f"lineal {row['Lineal_us_por_consulta']:>9.1f} µs  encontrados {row['Encontrados']}")
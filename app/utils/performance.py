@@ -0,0 +1,284 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from app.config import Config
+
+
+class _NullSpan:
+    """Span vacío usado cuando la instrumentación está desactivada"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Cronómetro de una etapa que registra su duración al salir"""
+    __slots__ = ('tracker', 'stage', 'image', 'start')
+
+    def __init__(self, tracker, stage, image):
+        self.tracker = tracker
+        self.stage = stage
+        self.image = image
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracker._record(self.stage, self.image, time.perf_counter() - self.start)
+        return False
+
+
+class _StageStats:
+    """Acumulador de conteo, suma y máximo de una etapa"""
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+# Totales del proceso compartidos por todas las sesiones (exportados a Prometheus)
+_process_lock = threading.Lock()
+_process_stages = {}
+_process_runs = {'count': 0, 'images': 0, 'seconds': 0.0, 'last_seconds': 0.0, 'last_images': 0}
+_process_export = {'last': 0.0, 'pending': False}
+# Serializa los volcados: el último en escribir siempre lleva los totales más recientes
+_export_lock = threading.Lock()
+
+
+class PerformanceTracker:
+    """Instrumentación ligera por etapas (decodificación, preproceso, inferencia, reportes)"""
+
+    STAGE_LABELS = {
+        'decode': 'Decodificación',
+        'preprocess': 'Preproceso',
+        'inference': 'Inferencia',
+        'report': 'Reporte',
+        'report_excel': 'Reporte Excel',
+        'visualization': 'Visualización'
+    }
+
+    LATENCY_COLUMNS = {
+        'decode': 'Latencia_Decodificacion_ms',
+        'preprocess': 'Latencia_Preproceso_ms',
+        'inference': 'Latencia_Inferencia_ms'
+    }
+
+    def __init__(self, enabled=None):
+        self.config = Config()
+        self.enabled = self.config.ENABLE_PERFORMANCE_METRICS if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Descartar los tiempos de la ejecución actual"""
+        with self._lock:
+            self.run_id = None
+            self.run_started_at = None
+            self.run_seconds = None
+            self.image_timings = {}
+            self.stage_stats = {}
+            self._run_start = None
+
+    def start_run(self, run_id=None):
+        """Iniciar la medición de una ejecución completa"""
+        if not self.enabled:
+            return
+        self.reset()
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.run_started_at = datetime.now()
+        self._run_start = time.perf_counter()
+
+    def end_run(self):
+        """Cerrar la ejecución y acumular los totales del proceso"""
+        if not self.enabled or self._run_start is None:
+            return
+        self.run_seconds = time.perf_counter() - self._run_start
+        self._run_start = None
+
+        with self._lock:
+            stage_items = [(stage, stats.count, stats.total, stats.max) for stage, stats in self.stage_stats.items()]
+            images = len(self.image_timings)
+
+        with _process_lock:
+            for stage, count, total, maximum in stage_items:
+                stats = _process_stages.setdefault(stage, _StageStats())
+                stats.count += count
+                stats.total += total
+                stats.max = max(stats.max, maximum)
+            _process_runs['count'] += 1
+            _process_runs['images'] += images
+            _process_runs['seconds'] += self.run_seconds
+            _process_runs['last_seconds'] = self.run_seconds
+            _process_runs['last_images'] = images
+
+        self._export()
+
+    def _export(self):
+        if self.config.PROMETHEUS_FILE:
+            with _export_lock:
+                with _process_lock:
+                    _process_export['last'] = time.monotonic()
+                try:
+                    self.write_prometheus()
+                except OSError:
+                    pass
+
+    def span(self, stage, image=None):
+        """Context manager que mide una etapa; sin costo cuando está desactivado"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, image if image is not None else getattr(self._local, 'image', None))
+
+    @contextmanager
+    def image(self, name):
+        """Asociar los spans del hilo actual a una imagen"""
+        if not self.enabled:
+            yield
+            return
+        previous = getattr(self._local, 'image', None)
+        self._local.image = name
+        try:
+            yield
+        finally:
+            self._local.image = previous
+
+    def _record(self, stage, image, seconds):
+        with self._lock:
+            stats = self.stage_stats.get(stage)
+            if stats is None:
+                stats = self.stage_stats[stage] = _StageStats()
+            stats.add(seconds)
+            if image is not None:
+                timings = self.image_timings.setdefault(image, {})
+                timings[stage] = timings.get(stage, 0.0) + seconds
+            closed = self.run_id is not None and self._run_start is None
+        if closed:
+            # Etapas posteriores al cierre (gráficos en reruns, reportes bajo demanda): cuentan para la ejecución guardada
+            # y se exportan como mucho una vez por intervalo (lo que llegue entre medias sale al final del intervalo)
+            with _process_lock:
+                _process_stages.setdefault(stage, _StageStats()).add(seconds)
+                if _process_export['pending']:
+                    return
+                _process_export['pending'] = True
+                wait = _process_export['last'] + self.config.PROMETHEUS_EXPORT_INTERVAL_SECONDS - time.monotonic()
+            if wait > 0:
+                timer = threading.Timer(wait, self._export_pending)
+                timer.daemon = True
+                timer.start()
+            else:
+                self._export_pending()
+
+    def _export_pending(self):
+        with _process_lock:
+            _process_export['pending'] = False
+        self._export()
+
+    def latency_columns(self, image):
+        """Columnas de latencia (ms) de una imagen para la tabla de resultados"""
+        if not self.enabled or not self.config.PERFORMANCE_LATENCY_COLUMNS:
+            return {}
+        timings = self.image_timings.get(image, {})
+        columns = {
+            column: round(timings[stage] * 1000, 2)
+            for stage, column in self.LATENCY_COLUMNS.items() if stage in timings
+        }
+        if columns:
+            columns['Latencia_Total_ms'] = round(sum(timings.values()) * 1000, 2)
+        return columns
+
+    def stage_summary(self):
+        """Resumen por etapa de la ejecución actual"""
+        with self._lock:
+            items = list(self.stage_stats.items())
+
+        summary = []
+        for stage, stats in items:
+            summary.append({
+                'Etapa': self.STAGE_LABELS.get(stage, stage),
+                'Llamadas': stats.count,
+                'Total_s': round(stats.total, 4),
+                'Promedio_ms': round(stats.total / stats.count * 1000, 2) if stats.count else 0.0,
+                'Max_ms': round(stats.max * 1000, 2)
+            })
+        return summary
+
+    def run_summary(self):
+        """Resumen de la ejecución actual"""
+        images = len(self.image_timings)
+        return {
+            'run_id': self.run_id,
+            'images': images,
+            'seconds': self.run_seconds,
+            'images_per_second': images / self.run_seconds if self.run_seconds else None
+        }
+
+    def to_prometheus(self):
+        """Exportar los totales del proceso en formato de texto de Prometheus"""
+        with _process_lock:
+            stages = [(stage, stats.count, stats.total, stats.max) for stage, stats in sorted(_process_stages.items())]
+            runs = dict(_process_runs)
+
+        lines = [
+            "# HELP bcc_stage_duration_seconds Tiempo acumulado por etapa del procesamiento.",
+            "# TYPE bcc_stage_duration_seconds summary"
+        ]
+        for stage, count, total, _ in stages:
+            lines.append(f'bcc_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'bcc_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+        lines.append("# HELP bcc_stage_duration_max_seconds Duración máxima observada por etapa.")
+        lines.append("# TYPE bcc_stage_duration_max_seconds gauge")
+        for stage, _, _, maximum in stages:
+            lines.append(f'bcc_stage_duration_max_seconds{{stage="{stage}"}} {maximum:.6f}')
+
+        lines.extend([
+            "# HELP bcc_runs_total Ejecuciones de análisis completadas.",
+            "# TYPE bcc_runs_total counter",
+            f"bcc_runs_total {runs['count']}",
+            "# HELP bcc_images_total Imágenes procesadas.",
+            "# TYPE bcc_images_total counter",
+            f"bcc_images_total {runs['images']}",
+            "# HELP bcc_run_duration_seconds_total Tiempo acumulado de ejecuciones.",
+            "# TYPE bcc_run_duration_seconds_total counter",
+            f"bcc_run_duration_seconds_total {runs['seconds']:.6f}",
+            "# HELP bcc_last_run_duration_seconds Duración de la última ejecución.",
+            "# TYPE bcc_last_run_duration_seconds gauge",
+            f"bcc_last_run_duration_seconds {runs['last_seconds']:.6f}",
+            "# HELP bcc_last_run_images Imágenes de la última ejecución.",
+            "# TYPE bcc_last_run_images gauge",
+            f"bcc_last_run_images {runs['last_images']}"
+        ])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """Escribir el volcado de Prometheus de forma atómica (textfile collector)"""
+        path = path or self.config.PROMETHEUS_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Un temporal por proceso e hilo: sesiones y hilos de reportes exportan a la vez
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(self.to_prometheus(), encoding='utf-8')
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return path
@@ -0,0 +1,97 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from app.config import Config
+
+
+class RunProfiler:
+    """Perfilado opcional de una ejecución: cProfile (.prof) y muestreo de pilas colapsadas"""
+
+    def __init__(self, output_dir=None, interval=None, run_id=None):
+        self.config = Config()
+        self.output_dir = output_dir or self.config.PROFILES_DIR
+        self.interval = interval or self.config.PROFILE_SAMPLE_INTERVAL
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.prof_path = None
+        self.collapsed_path = None
+        self.samples = 0
+        self.top = []
+
+        self._profile = cProfile.Profile()
+        self._stacks = Counter()
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._target_ident = None
+
+    def __enter__(self):
+        self._target_ident = threading.get_ident()
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="run-profiler-sampler", daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profile.disable()
+        self._stop_event.set()
+        self._sampler.join()
+        self._write_outputs()
+        return False
+
+    def _sample_loop(self):
+        """Tomar muestras periódicas de la pila del hilo perfilado"""
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._target_ident)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+
+            self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _write_outputs(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        self.prof_path = self.output_dir / f"run_{self.run_id}.prof"
+        self._profile.dump_stats(str(self.prof_path))
+
+        self.collapsed_path = self.output_dir / f"run_{self.run_id}.collapsed.txt"
+        with open(self.collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        self.top = self.top_functions()
+
+    def artifacts(self):
+        """Rutas de los artefactos generados"""
+        return {
+            'run_id': self.run_id,
+            'prof_path': str(self.prof_path) if self.prof_path else None,
+            'collapsed_path': str(self.collapsed_path) if self.collapsed_path else None,
+            'samples': self.samples,
+            'interval': self.interval,
+            'top_functions': self.top
+        }
+
+    def top_functions(self, limit=15):
+        """Funciones con mayor tiempo acumulado"""
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                'Funcion': f"{os.path.basename(filename)}:{name}:{line}",
+                'Llamadas': ncalls,
+                'Tiempo_Propio_s': round(tottime, 4),
+                'Tiempo_Acumulado_s': round(cumtime, 4)
+            })
+        rows.sort(key=lambda row: row['Tiempo_Acumulado_s'], reverse=True)
+        return rows[:limit]
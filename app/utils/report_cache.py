@@ -0,0 +1,235 @@
+"""
+Cache en disco de los reportes descargables.
+
+Cada reporte (Excel, CSV, CSV comprimido o Parquet) se genera la primera vez
+que alguien lo pide, en un hilo de fondo que publica su progreso, y se guarda
+como <REPORT_CACHE_DIR>/<run_id>.<formato>. Los archivos que llevan
+REPORT_CACHE_TTL_SECONDS sin usarse se borran en la siguiente petición.
+
+Uso:
+    python -m app.utils reports build <run_id> --format csv.gz parquet
+    python -m app.utils reports status
+    python -m app.utils reports purge [--all]
+"""
+
+import gzip
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.config import Config
+from app.utils.report_generator import ReportGenerator
+from app.utils.run_store import RunStore
+
+try:
+    import pyarrow  # noqa: F401  (motor de DataFrame.to_parquet)
+except ImportError:
+    pyarrow = None
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_report_cache():
+    """Cache de reportes única del proceso (los hilos de generación se comparten entre sesiones)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ReportCache()
+        return _shared
+
+
+class ReportCache:
+    """Reportes por ejecución y formato en disco, generados bajo demanda en segundo plano"""
+
+    STATUS_MISSING = 'pendiente'
+    STATUS_BUILDING = 'generando'
+    STATUS_READY = 'listo'
+    STATUS_ERROR = 'error'
+
+    FORMATS = {
+        'xlsx': {'label': "Excel", 'icon': "📊", 'mime': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+        'csv': {'label': "CSV", 'icon': "📄", 'mime': "text/csv"},
+        'csv.gz': {'label': "CSV comprimido", 'icon': "🗜️", 'mime': "application/gzip"},
+        'parquet': {'label': "Parquet", 'icon': "🧱", 'mime': "application/vnd.apache.parquet"}
+    }
+    # Límite de filas de una hoja de Excel (sin contar la cabecera)
+    EXCEL_MAX_ROWS = 1048575
+
+    def __init__(self, cache_dir=None, ttl_seconds=None, workers=None):
+        self.config = Config()
+        self.cache_dir = Path(cache_dir or self.config.REPORT_CACHE_DIR)
+        self.ttl_seconds = self.config.REPORT_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or self.config.REPORT_CACHE_WORKERS, thread_name_prefix="report-cache"
+        )
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    @classmethod
+    def available_formats(cls, rows=0):
+        """Formatos que se pueden generar aquí (Parquet necesita pyarrow; Excel tiene límite de filas)"""
+        return [
+            fmt for fmt in cls.FORMATS
+            if (fmt != 'parquet' or pyarrow is not None) and (fmt != 'xlsx' or rows <= cls.EXCEL_MAX_ROWS)
+        ]
+
+    def path(self, run_id, fmt):
+        return self.cache_dir / f"{run_id}.{fmt}"
+
+    def get(self, run_id, fmt):
+        """Ruta del reporte si está en disco y no ha caducado (cada uso renueva su TTL)"""
+        path = self.path(run_id, fmt)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                return None
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def state(self, run_id, fmt):
+        """status, progress (0-1), error y bytes del reporte"""
+        path = self.get(run_id, fmt)
+        if path is not None:
+            return {'status': self.STATUS_READY, 'progress': 1.0, 'error': None, 'bytes': path.stat().st_size}
+        with self._lock:
+            job = self._jobs.get((run_id, fmt))
+            return dict(job) if job else {'status': self.STATUS_MISSING, 'progress': 0.0, 'error': None, 'bytes': 0}
+
+    def request(self, run_id, fmt, enhanced_results, results_df, metrics=None, report_gen=None):
+        """Encolar la generación si el reporte no está en disco ni en curso; devuelve el estado"""
+        self.evict_expired()
+        with self._lock:
+            job = self._jobs.get((run_id, fmt))
+            if self.get(run_id, fmt) is None and (job is None or job['status'] == self.STATUS_ERROR):
+                self._jobs[(run_id, fmt)] = {'status': self.STATUS_BUILDING, 'progress': 0.0, 'error': None, 'bytes': 0}
+                self._executor.submit(self._build_job, run_id, fmt, enhanced_results, results_df, metrics, report_gen)
+        return self.state(run_id, fmt)
+
+    def _build_job(self, run_id, fmt, enhanced_results, results_df, metrics, report_gen):
+        key = (run_id, fmt)
+
+        def progress(fraction):
+            with self._lock:
+                self._jobs[key]['progress'] = min(max(float(fraction), 0.0), 0.99)
+
+        try:
+            self.build(run_id, fmt, enhanced_results, results_df, metrics, report_gen, progress)
+        except Exception as e:
+            with self._lock:
+                self._jobs[key].update(status=self.STATUS_ERROR, error=str(e))
+        else:
+            # Desde aquí el estado se lee del disco
+            with self._lock:
+                self._jobs.pop(key, None)
+
+    def build(self, run_id, fmt, enhanced_results, results_df, metrics=None, report_gen=None, progress=None):
+        """Generar el reporte en el hilo actual y dejarlo en disco (escritura atómica); devuelve la ruta"""
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Formato de reporte desconocido: {fmt}")
+        report_gen = report_gen or ReportGenerator()
+        progress = progress or (lambda fraction: None)
+        path = self.path(run_id, fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            if fmt == 'xlsx':
+                with open(tmp_path, 'wb') as f:
+                    f.write(report_gen.create_excel_report(enhanced_results, metrics, progress))
+            elif fmt == 'parquet':
+                if pyarrow is None:
+                    raise RuntimeError("Parquet necesita pyarrow (pip install pyarrow)")
+                results_df.to_parquet(tmp_path, index=False)
+            else:
+                if fmt == 'csv.gz':
+                    f = gzip.open(tmp_path, 'wt', encoding='utf-8-sig', newline='', compresslevel=6)
+                else:
+                    f = open(tmp_path, 'w', encoding='utf-8-sig', newline='')
+                chunk = self.config.REPORT_CSV_CHUNK_ROWS
+                with f:
+                    for start in range(0, max(len(results_df), 1), chunk):
+                        results_df.iloc[start:start + chunk].to_csv(f, header=start == 0, index=False)
+                        progress((start + chunk) / max(len(results_df), 1))
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return path
+
+    def evict_expired(self, everything=False):
+        """Borrar los reportes caducados (o todos) que no se estén generando; devuelve (archivos, bytes)"""
+        removed, freed = 0, 0
+        if not self.cache_dir.exists():
+            return removed, freed
+        with self._lock:
+            building = {self.path(run_id, fmt).name for (run_id, fmt), job in self._jobs.items()
+                        if job['status'] == self.STATUS_BUILDING}
+        now = time.time()
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or entry.name in building:
+                    continue
+                try:
+                    stat = entry.stat()
+                    if everything or now - stat.st_mtime > self.ttl_seconds:
+                        os.unlink(entry.path)
+                        removed += 1
+                        freed += stat.st_size
+                except FileNotFoundError:
+                    continue
+        return removed, freed
+
+    def entries(self):
+        """Reportes en disco: ejecución, formato, tamaño y segundos desde el último uso"""
+        if not self.cache_dir.exists():
+            return []
+        now = time.time()
+        rows = []
+        for path in sorted(self.cache_dir.iterdir()):
+            if path.name.startswith('.'):
+                continue
+            run_id, _, fmt = path.name.partition('.')
+            stat = path.stat()
+            rows.append({'run_id': run_id, 'format': fmt, 'bytes': stat.st_size, 'idle_seconds': now - stat.st_mtime})
+        return rows
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['build', 'status', 'purge'])
+    parser.add_argument("run_id", nargs='?', default=None, help="Ejecución guardada en el RunStore (build)")
+    parser.add_argument("--format", nargs='+', default=['xlsx'], choices=list(ReportCache.FORMATS))
+    parser.add_argument("--all", action='store_true', help="Borrar también los reportes vigentes (purge)")
+
+
+def run(args):
+    cache = ReportCache()
+    if args.action == 'status':
+        rows = cache.entries()
+        for row in rows:
+            print(f"{row['run_id']:<10} {row['format']:<8} {row['bytes'] / 1024:>10.1f} KB  "
+                  f"sin uso desde hace {row['idle_seconds'] / 3600:.1f} h")
+        if not rows:
+            print("sin reportes en cache")
+    elif args.action == 'purge':
+        removed, freed = cache.evict_expired(everything=args.all)
+        print(f"{removed} reportes borrados ({freed / (1024 * 1024):.1f} MB)")
+    else:
+        if not args.run_id:
+            sys.exit("build necesita el identificador de la ejecución")
+        results = RunStore().results(args.run_id)
+        if not results:
+            sys.exit(f"La ejecución {args.run_id} no tiene resultados guardados")
+        from app.utils.metrics_calculator import MetricsCalculator
+
+        report_gen = ReportGenerator()
+        enhanced_results = report_gen.create_enhanced_results(results)
+        results_df = report_gen.create_dataframe(enhanced_results)
+        successful = results_df[results_df['Prediccion'] != 'ERROR']
+        metrics = MetricsCalculator().calculate_real_time_metrics(successful) if not successful.empty else None
+        for fmt in args.format:
+            start = time.perf_counter()
+            path = cache.get(args.run_id, fmt) or cache.build(args.run_id, fmt, enhanced_results, results_df, metrics, report_gen)
+            print(f"{path} ({path.stat().st_size / 1024:.1f} KB, {time.perf_counter() - start:.1f} s)")
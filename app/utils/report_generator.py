@@ -6,14 +6,22 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
 from app.config import Config
 from app.utils.metrics_calculator import MetricsCalculator
+from app.utils.performance import PerformanceTracker
 
 class ReportGenerator:
-    def __init__(self):
+    PROGRESS_ROWS = 500
+    
+    def __init__(self, tracker=None):
         self.config = Config()
         self.metrics_calc = MetricsCalculator()
+        self.tracker = tracker or PerformanceTracker(enabled=False)
     
     def create_enhanced_results(self, results):
         """Crear resultados mejorados con diagnóstico y clasificación"""
+        with self.tracker.span('report'):
+            return self._create_enhanced_results(results)
+    
+    def _create_enhanced_results(self, results):
         enhanced_results = []
         
         for result in results:
@@ -39,18 +47,28 @@ class ReportGenerator:
     
     def create_dataframe(self, results):
         """Crear DataFrame con los resultados"""
-        df = pd.DataFrame(results)
-        df['Fecha_Procesamiento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        columns_order = ['Nombre_Archivo', 'Prediccion', 'Diagnostico', 'Resultado', 'Confianza', 
-                        'Prob_Benign', 'Prob_Malignant', 'Prob_Normal', 'Fecha_Procesamiento']
-        available_columns = [col for col in columns_order if col in df.columns]
-        df = df[available_columns]
-        
-        return df
+        with self.tracker.span('report'):
+            df = pd.DataFrame(results)
+            df['Fecha_Procesamiento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            
+            columns_order = ['Nombre_Archivo', 'Prediccion', 'Diagnostico', 'Resultado', 'Confianza', 
+                            'Prob_Benign', 'Prob_Malignant', 'Prob_Normal', 'Etapa_Decision', 'Confianza_Rapida',
+                            'Duplicado_De', 'Distancia_Hash', 'Fecha_Procesamiento']
+            columns_order += list(PerformanceTracker.LATENCY_COLUMNS.values()) + ['Latencia_Total_ms']
+            available_columns = [col for col in columns_order if col in df.columns]
+            df = df[available_columns]
+            
+            return df
+    
+    def create_excel_report(self, results, metrics=None, progress=None):
+        """
+        Crear reporte Excel con formato profesional (metrics: instantánea ya calculada
+        de la ejecución; progress(fracción) opcional se llama cada PROGRESS_ROWS filas)
+        """
+        with self.tracker.span('report_excel'):
+            return self._create_excel_report(results, metrics, progress)
     
-    def create_excel_report(self, results):
-        """Crear reporte Excel con formato profesional"""
+    def _create_excel_report(self, results, metrics=None, progress=None):
         df = self.create_dataframe(results)
         
         wb = Workbook()
@@ -94,6 +112,8 @@ class ReportGenerator:
         
         for row_num, row_data in enumerate(df.iterrows(), 2):
             _, data = row_data
+            if progress is not None and row_num % self.PROGRESS_ROWS == 0:
+                progress(row_num / len(df))
             for col_num, value in enumerate(data, 1):
                 cell = ws.cell(row=row_num, column=col_num, value=value)
                 cell.border = thin_border
@@ -137,35 +157,59 @@ class ReportGenerator:
         for col, width in column_widths.items():
             ws.column_dimensions[col].width = width
         
-        self._create_summary_sheet(wb, df)
+        self._create_summary_sheet(wb, df, metrics)
         
         return self._excel_to_bytes(wb)
     
-    def _create_summary_sheet(self, wb, df):
-        """Crear hoja de resumen con métricas"""
+    def _create_summary_sheet(self, wb, df, metrics=None):
+        """Crear hoja de resumen con métricas (la instantánea de la ejecución o, si no se pasa, la del DataFrame)"""
         summary_ws = wb.create_sheet("Resumen Métricas")
         
-        if 'Resultado' in df.columns:
-            counts = df['Resultado'].value_counts()
-            vp = counts.get('VP', 0)
-            vn = counts.get('VN', 0)
-            fp = counts.get('FP', 0)
-            fn = counts.get('FN', 0)
-            total = vp + vn + fp + fn
-            
-            if total > 0:
-                precision = vp / (vp + fp) if (vp + fp) > 0 else 0
-                sensitivity = vp / (vp + fn) if (vp + fn) > 0 else 0
-                specificity = vn / (vn + fp) if (vn + fp) > 0 else 0
-                f1_score = 2 * (precision * sensitivity) / (precision + sensitivity) if (precision + sensitivity) > 0 else 0
-                accuracy = (vp + vn) / total
-                auc = (sensitivity + specificity) / 2
-                
-                summary_ws['A1'] = "RESUMEN DE MÉTRICAS - ANÁLISIS DE CÁNCER DE MAMA"
-                summary_ws['A1'].font = Font(size=16, bold=True, color="366092")
-                summary_ws['A1'].alignment = Alignment(horizontal="center")
-                summary_ws.merge_cells('A1:D1')
-                
+        if metrics is None:
+            metrics = self.metrics_calc.calculate_real_time_metrics(df)
+        if not metrics:
+            return
+        
+        summary_ws['A1'] = "RESUMEN DE MÉTRICAS - ANÁLISIS DE CÁNCER DE MAMA"
+        summary_ws['A1'].font = Font(size=16, bold=True, color="366092")
+        summary_ws['A1'].alignment = Alignment(horizontal="center")
+        summary_ws.merge_cells('A1:D1')
+        
+        header_font = Font(bold=True)
+        summary_ws['A3'], summary_ws['B3'] = "Métrica (Malignant vs resto)", "Valor"
+        summary_ws['D3'], summary_ws['E3'] = "Resultado", "Cantidad"
+        for cell in ('A3', 'B3', 'D3', 'E3'):
+            summary_ws[cell].font = header_font
+        
+        indicators = [
+            ("Precisión", metrics['precision']),
+            ("Sensibilidad", metrics['sensitivity']),
+            ("Especificidad", metrics['specificity']),
+            ("F1-Score", metrics['f1_score']),
+            ("Exactitud", metrics['accuracy']),
+            ("AUC" if metrics.get('auc_source') == 'roc' else "AUC (aprox. balanceada)", metrics['auc'])
+        ]
+        for row, (label, value) in enumerate(indicators, start=4):
+            summary_ws.cell(row=row, column=1, value=label)
+            summary_ws.cell(row=row, column=2, value=value).number_format = '0.0%'
+        for row, key in enumerate(['VP', 'VN', 'FP', 'FN', 'TOTAL'], start=4):
+            summary_ws.cell(row=row, column=4, value=key)
+            summary_ws.cell(row=row, column=5, value=metrics[key])
+        
+        if 'per_class' in metrics:
+            headers = ["Clase", "Precisión", "Sensibilidad", "Especificidad", "F1-Score", "Soporte"]
+            for column, header in enumerate(headers, start=1):
+                summary_ws.cell(row=12, column=column, value=header).font = header_font
+            rows = list(metrics['per_class'].items()) + [("Macro", metrics['macro']), ("Ponderado", metrics['weighted'])]
+            for row, (name, values) in enumerate(rows, start=13):
+                summary_ws.cell(row=row, column=1, value=name)
+                for column, key in enumerate(['precision', 'recall', 'specificity', 'f1'], start=2):
+                    summary_ws.cell(row=row, column=column, value=values[key]).number_format = '0.0%'
+                if 'support' in values:
+                    summary_ws.cell(row=row, column=6, value=values['support'])
+        
+        for column, width in zip('ABCDEF', [30, 14, 14, 14, 12, 10]):
+            summary_ws.column_dimensions[column].width = width
     
     def _excel_to_bytes(self, workbook):
         """Convertir workbook a bytes"""
@@ -0,0 +1,74 @@
+import math
+
+import pandas as pd
+
+
+class ResultsTable:
+    """
+    Vista paginada de los resultados de una ejecución.
+    Filtra y ordena en el servidor y solo estiliza la página visible;
+    los resúmenes se calculan una vez al crear la tabla.
+    """
+
+    RESULT_STYLES = {
+        'VP': 'background-color: #d4edda; color: #155724',
+        'VN': 'background-color: #d1ecf1; color: #0c5460',
+        'FP': 'background-color: #fff3cd; color: #856404',
+        'FN': 'background-color: #f8d7da; color: #721c24',
+        'ERROR': 'background-color: #f5f5f5; color: #6c757d'
+    }
+
+    SORT_OPTIONS = {
+        'Orden original': None,
+        'Confianza (menor primero)': True,
+        'Confianza (mayor primero)': False
+    }
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self.confidence = pd.to_numeric(self.df.get('Confianza'), errors='coerce') if 'Confianza' in self.df else None
+        self.summary = self._summary()
+
+    def _summary(self):
+        successful = self.df[self.df['Prediccion'] != 'ERROR'] if 'Prediccion' in self.df else self.df
+        confidence = self.confidence[successful.index] if self.confidence is not None else pd.Series(dtype=float)
+        return {
+            'total': len(self.df),
+            'successful': len(successful),
+            'errors': len(self.df) - len(successful),
+            'predictions': successful['Prediccion'].value_counts() if 'Prediccion' in successful else pd.Series(dtype=int),
+            'results': self.df['Resultado'].value_counts() if 'Resultado' in self.df else pd.Series(dtype=int),
+            'mean_confidence': float(confidence.mean()) if confidence.notna().any() else None,
+            'low_confidence': int((confidence < 0.6).sum())
+        }
+
+    def options(self, column):
+        """Valores disponibles para filtrar una columna"""
+        if column not in self.df:
+            return []
+        return sorted(self.df[column].dropna().astype(str).unique())
+
+    def query(self, resultados=None, predicciones=None, sort=None):
+        """Índices de las filas que cumplen los filtros, en el orden pedido"""
+        mask = pd.Series(True, index=self.df.index)
+        if resultados and 'Resultado' in self.df:
+            mask &= self.df['Resultado'].isin(resultados)
+        if predicciones and 'Prediccion' in self.df:
+            mask &= self.df['Prediccion'].isin(predicciones)
+
+        index = self.df.index[mask]
+        ascending = self.SORT_OPTIONS.get(sort)
+        if ascending is not None and self.confidence is not None:
+            index = self.confidence[index].sort_values(ascending=ascending, na_position='last', kind='stable').index
+        return index
+
+    def page_count(self, rows, page_size):
+        return max(1, math.ceil(rows / page_size))
+
+    def page(self, index, page_number, page_size):
+        """Filas de una página (page_number empieza en 1) con el estilo de la columna Resultado"""
+        start = (page_number - 1) * page_size
+        page_df = self.df.loc[index[start:start + page_size]]
+        if 'Resultado' not in page_df:
+            return page_df
+        return page_df.style.map(lambda value: self.RESULT_STYLES.get(value, ''), subset=['Resultado'])
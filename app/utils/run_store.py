@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.config import Config
+
+
+class RunStore:
+    """
+    Persistencia incremental de las ejecuciones de análisis en SQLite (modo WAL).
+    Cada lote de resultados se confirma al terminar; una ejecución interrumpida se
+    reanuda omitiendo los archivos ya puntuados (nombre + hash del contenido).
+    Cada lote renueva el latido de la ejecución: solo se reanudan las de la misma
+    sesión o las abandonadas (sin latido desde RUN_STORE_STALE_SECONDS).
+    """
+
+    STATUS_RUNNING = 'en_curso'
+    STATUS_COMPLETED = 'completada'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            completed_at TEXT,
+            model_path TEXT,
+            total INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            owner TEXT,
+            heartbeat_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            run_id TEXT NOT NULL REFERENCES runs(run_id),
+            file_name TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            scored INTEGER NOT NULL,
+            row_json TEXT NOT NULL,
+            PRIMARY KEY (run_id, file_name, content_hash)
+        );
+    """
+
+    def __init__(self, db_path=None):
+        self.config = Config()
+        self.db_path = Path(db_path or self.config.RUNS_DB_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+            # Bases creadas antes del latido por ejecución
+            columns = {row['name'] for row in connection.execute("PRAGMA table_info(runs)")}
+            for column in ('owner', 'heartbeat_at'):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE runs ADD COLUMN {column} TEXT")
+
+    def _connect(self):
+        # Una conexión por operación: Streamlit puede ejecutar cada rerun en otro hilo
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def create_run(self, total, model_path=None, owner=None):
+        run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        now = datetime.now().isoformat(timespec='seconds')
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT INTO runs (run_id, created_at, model_path, total, status, owner, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, now, model_path, total, self.STATUS_RUNNING, owner, now)
+            )
+        return run_id
+
+    def heartbeat(self, run_id):
+        """Marcar la ejecución como viva (la renueva cada lote; los procesos de larga duración, además, al esperar)"""
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "UPDATE runs SET heartbeat_at = ? WHERE run_id = ?", (datetime.now().isoformat(timespec='seconds'), run_id)
+            )
+
+    def claim(self, run_id, owner=None, total=None):
+        """
+        Tomar una ejecución en curso si es de `owner` o está abandonada; atómico,
+        así dos sesiones no pueden reanudar la misma. `total` actualiza el número
+        de archivos de la carga que la reanuda. True si se tomó.
+        """
+        now = datetime.now()
+        stale = (now - timedelta(seconds=self.config.RUN_STORE_STALE_SECONDS)).isoformat(timespec='seconds')
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "UPDATE runs SET owner = ?, heartbeat_at = ?, total = COALESCE(?, total) "
+                "WHERE run_id = ? AND status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ? OR owner IS ?)",
+                (owner, now.isoformat(timespec='seconds'), total, run_id, self.STATUS_RUNNING, stale, owner)
+            )
+            return cursor.rowcount == 1
+
+    def append(self, run_id, items):
+        """Confirmar un lote de (posición, nombre, hash, fila) en una sola transacción"""
+        records = [
+            (run_id, name, content_hash, position, int(row.get('Prediccion') != 'ERROR'), json.dumps(row, default=str))
+            for position, name, content_hash, row in items
+        ]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO results (run_id, file_name, content_hash, position, scored, row_json) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                records
+            )
+            connection.execute(
+                "UPDATE runs SET heartbeat_at = ? WHERE run_id = ?", (datetime.now().isoformat(timespec='seconds'), run_id)
+            )
+
+    def scored_keys(self, run_id):
+        """(nombre, hash) de los archivos ya puntuados; los errores se vuelven a intentar"""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT file_name, content_hash FROM results WHERE run_id = ? AND scored = 1", (run_id,)
+            ).fetchall()
+        return {(row['file_name'], row['content_hash']) for row in rows}
+
+    def stored_keys(self, run_id):
+        """(nombre, hash) de todos los archivos guardados, puntuados o con error"""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT file_name, content_hash FROM results WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {(row['file_name'], row['content_hash']) for row in rows}
+
+    def results(self, run_id):
+        """Filas de resultado de la ejecución en el orden de los archivos"""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT row_json FROM results WHERE run_id = ? ORDER BY position, file_name", (run_id,)
+            ).fetchall()
+        return [json.loads(row['row_json']) for row in rows]
+
+    def complete(self, run_id):
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "UPDATE runs SET status = ?, completed_at = ? WHERE run_id = ?",
+                (self.STATUS_COMPLETED, datetime.now().isoformat(timespec='seconds'), run_id)
+            )
+
+    def runs(self, status=None, limit=20):
+        """Ejecuciones recientes con el número de archivos guardados"""
+        query = (
+            "SELECT runs.*, COUNT(results.file_name) AS stored FROM runs "
+            "LEFT JOIN results ON results.run_id = runs.run_id "
+            + ("WHERE runs.status = ? " if status else "")
+            + "GROUP BY runs.run_id ORDER BY runs.created_at DESC LIMIT ?"
+        )
+        params = (status, limit) if status else (limit,)
+        with closing(self._connect()) as connection:
+            return [dict(row) for row in connection.execute(query, params).fetchall()]
+
+    def find_resumable(self, keys, model_path=None, candidates=5, owner=None):
+        """
+        Ejecución interrumpida más reciente del mismo modelo con algún archivo puntuado
+        y cuyos archivos guardados (también los que dieron error) forman parte de la
+        carga actual, o None. La devuelta queda tomada por `owner` con el total de la
+        carga actual; las que otra sesión sigue procesando no se reanudan.
+        """
+        keys = set(keys)
+        for run in self.runs(status=self.STATUS_RUNNING, limit=candidates):
+            if run['model_path'] != model_path:
+                continue
+            # Una fila guardada que no está en la carga aparecería en sus resultados
+            if not self.scored_keys(run['run_id']) or not self.stored_keys(run['run_id']) <= keys:
+                continue
+            if self.claim(run['run_id'], owner, total=len(keys)):
+                return run['run_id']
+        return None
@@ -0,0 +1,164 @@
+import sqlite3
+from contextlib import closing, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from app.config import Config
+
+
+def _jet(values):
+    """Colormap jet (azul -> rojo) de valores en [0, 1] a RGB en [0, 1]"""
+    values = values[..., None]
+    return np.clip(1.5 - np.abs(4 * values - np.array([3.0, 2.0, 1.0])), 0, 1)
+
+
+class SaliencyCache:
+    """Mapas Grad-CAM de baja resolución (float16) en SQLite, por hash de modelo e imagen"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS saliency (
+            model_hash TEXT NOT NULL,
+            image_hash TEXT NOT NULL,
+            height INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            cam BLOB NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (model_hash, image_hash)
+        );
+    """
+
+    def __init__(self, db_path=None):
+        self.config = Config()
+        self.db_path = Path(db_path or self.config.SALIENCY_CACHE_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get_many(self, model_hash, image_hashes):
+        found = {}
+        image_hashes = list(image_hashes)
+        with closing(self._connect()) as connection:
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(image_hashes), 500):
+                chunk = image_hashes[start:start + 500]
+                rows = connection.execute(
+                    f"SELECT image_hash, height, width, cam FROM saliency WHERE model_hash = ? "
+                    f"AND image_hash IN ({','.join('?' * len(chunk))})",
+                    [model_hash, *chunk]
+                )
+                for image_hash, height, width, cam in rows:
+                    found[image_hash] = np.frombuffer(cam, dtype=np.float16).reshape(height, width).astype(np.float32)
+        return found
+
+    def put_many(self, model_hash, cams):
+        created_at = datetime.now().isoformat(timespec='seconds')
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO saliency (model_hash, image_hash, height, width, cam, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(model_hash, image_hash, *cam.shape, cam.astype(np.float16).tobytes(), created_at)
+                 for image_hash, cam in cams.items()]
+            )
+
+
+class GradCamExplainer:
+    """
+    Grad-CAM bajo demanda sobre el último bloque convolucional. El modelo se
+    divide en extractor (hasta la última salida 4D, en los modelos de los
+    notebooks el DenseNet121) y cabeza; el extractor solo se ejecuta hacia
+    delante y la cinta de gradientes cubre la cabeza, una pasada por lote.
+    """
+
+    def __init__(self, model, model_hash, cache=None, image_processor=None, batch_size=None):
+        self.config = Config()
+        self.model = model
+        self.model_hash = model_hash
+        self.cache = cache or SaliencyCache()
+        self.image_processor = image_processor
+        self.batch_size = batch_size or self.config.RUN_STORE_BATCH_SIZE
+        self.features, self.head, self.grad_model = self._split(model)
+
+    @staticmethod
+    def _split(model):
+        layers = getattr(model, 'layers', None) or []
+        if isinstance(model, tf.keras.Sequential):
+            spatial = [i for i, layer in enumerate(layers) if len(layer.output.shape) == 4]
+            if spatial and spatial[-1] < len(layers) - 1:
+                cut = spatial[-1] + 1
+                features = tf.keras.Sequential(layers[:cut], name=f"{model.name}_features")
+                head = tf.keras.Sequential(layers[cut:], name=f"{model.name}_explain_head")
+                head.build((None,) + tuple(layers[cut - 1].output.shape[1:]))
+                return features, head, None
+        for layer in reversed(layers):
+            if len(layer.output.shape) == 4:
+                # Modelo funcional: el gradiente recorre el modelo completo
+                return None, None, tf.keras.Model(model.inputs, [layer.output, model.output])
+        raise ValueError("El modelo no tiene capas convolucionales con salida espacial para Grad-CAM")
+
+    def _grad_cam(self, batch):
+        """Mapas (N, h, w) normalizados a [0, 1] respecto a la clase predicha de cada imagen"""
+        batch = tf.convert_to_tensor(batch)
+        if self.grad_model is None:
+            feature_maps = self.features(batch, training=False)
+            with tf.GradientTape() as tape:
+                tape.watch(feature_maps)
+                predictions = self.head(feature_maps, training=False)
+                scores = tf.gather(predictions, tf.argmax(predictions, axis=1), axis=1, batch_dims=1)
+        else:
+            with tf.GradientTape() as tape:
+                feature_maps, predictions = self.grad_model(batch, training=False)
+                scores = tf.gather(predictions, tf.argmax(predictions, axis=1), axis=1, batch_dims=1)
+        # Cada puntuación depende solo de su imagen: el gradiente de la suma da el de cada fila
+        gradients = tape.gradient(scores, feature_maps)
+        weights = tf.reduce_mean(gradients, axis=(1, 2))
+        cams = tf.nn.relu(tf.einsum('bhwc,bc->bhw', feature_maps, weights)).numpy()
+        peaks = cams.reshape(len(cams), -1).max(axis=1)
+        return cams / np.where(peaks > 0, peaks, 1)[:, None, None]
+
+    def explain(self, items, slot=None):
+        """
+        Mapas de [(hash_imagen, archivo)] como {hash_imagen: mapa}; solo se
+        calculan los que no están en la cache, por lotes de batch_size. `slot(n)`
+        opcional devuelve el context manager del turno de inferencia de cada lote.
+        """
+        items = list(dict(items).items())
+        cams = self.cache.get_many(self.model_hash, [image_hash for image_hash, _ in items])
+        missing = [(image_hash, source) for image_hash, source in items if image_hash not in cams]
+        for start in range(0, len(missing), self.batch_size):
+            chunk = missing[start:start + self.batch_size]
+            arrays, hashes = [], []
+            for image_hash, source in chunk:
+                try:
+                    image = self.image_processor.load_image(source)
+                    arrays.append(self.image_processor.preprocess_image(image)[0])
+                    hashes.append(image_hash)
+                except Exception:
+                    continue
+            if not arrays:
+                continue
+            with slot(len(arrays)) if slot is not None else nullcontext():
+                computed = dict(zip(hashes, self._grad_cam(np.stack(arrays))))
+            self.cache.put_many(self.model_hash, computed)
+            cams.update(computed)
+        return cams
+
+    def overlay(self, image, cam, size=None, alpha=None):
+        """Miniatura RGB de la imagen con el mapa superpuesto (colormap jet)"""
+        size = size or self.config.SALIENCY_OVERLAY_SIZE
+        alpha = self.config.SALIENCY_OVERLAY_ALPHA if alpha is None else alpha
+        image = image.convert('RGB')
+        image.thumbnail((size, size))
+        heat = Image.fromarray(np.uint8(255 * np.clip(cam, 0, 1))).resize(image.size, Image.BILINEAR)
+        colored = _jet(np.asarray(heat) / 255.0)
+        blended = (1 - alpha) * np.asarray(image, dtype=np.float32) / 255.0 + alpha * colored
+        return Image.fromarray(np.uint8(255 * np.clip(blended, 0, 1)))
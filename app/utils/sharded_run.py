@@ -0,0 +1,346 @@
+"""
+Reclasificación por fragmentos del archivo de imágenes completo.
+
+`plan` reparte un manifiesto de rutas en K fragmentos por hash de la ruta
+(el reparto no depende del orden ni de la máquina). Cada fragmento lo procesa
+un trabajador independiente, en este host o en otro nodo que lea el mismo
+sistema de archivos, y escribe su propio CSV parcial; `merge` combina los
+fragmentos en el DataFrame final, las métricas y el reporte Excel. Un
+fragmento fallido se vuelve a lanzar solo, sin repetir los demás, y retoma
+las imágenes que ya había escrito.
+
+Uso:
+    python -m app.utils shard plan --dir dataset --recursive --shards 8
+    python -m app.utils shard work --run-dir reports/sharded/<id> --workers 2
+    python -m app.utils shard work --run-dir reports/sharded/<id> --shard 3      # en otro nodo
+    python -m app.utils shard status --run-dir reports/sharded/<id>
+    python -m app.utils shard merge --run-dir reports/sharded/<id>
+"""
+
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+from app.files import is_mask_file
+from app.utils.fingerprint import file_fingerprint
+
+
+def _json_value(value):
+    """Arrays y escalares de numpy (matriz de confusión, conteos) como tipos JSON"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} no es serializable a JSON")
+
+
+def _work_shard(run_dir, shard, intra_threads):
+    """Procesar un fragmento en un proceso hijo con los hilos de TensorFlow repartidos entre trabajadores"""
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    return ShardedRun(run_dir).work(shard)
+
+
+class ShardedRun:
+    """
+    Directorio de una ejecución por fragmentos: plan.json, manifest.txt (una ruta
+    por línea), shard-XXXX-of-YYYY.csv por fragmento terminado (.partial.csv
+    mientras está en curso) y, tras el merge, results.csv, metrics.json y report.xlsx.
+    """
+
+    STATUS_DONE = 'completado'
+    STATUS_PARTIAL = 'parcial'
+    STATUS_PENDING = 'pendiente'
+
+    COLUMNS = ['Ruta', 'Nombre_Archivo', 'Prediccion', 'Confianza', 'Prob_Benign', 'Prob_Malignant', 'Prob_Normal', 'Error']
+
+    def __init__(self, run_dir):
+        self.config = Config()
+        self.run_dir = Path(run_dir)
+        self._plan = None
+
+    @staticmethod
+    def shard_of(path, shards):
+        """Fragmento de una ruta: estable entre procesos y nodos (no usa hash() de Python)"""
+        return int(hashlib.sha256(path.encode('utf-8')).hexdigest()[:16], 16) % shards
+
+    @classmethod
+    def create(cls, paths, shards=None, model_path=None, run_dir=None):
+        """Escribir el manifiesto y el plan de una ejecución nueva"""
+        config = Config()
+        shards = shards or config.SHARDED_RUN_COUNT
+        model_path = str(Path(model_path or config.DEFAULT_MODEL_PATH).resolve())
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Modelo no encontrado: {model_path}")
+        run_dir = Path(run_dir or config.SHARDED_RUNS_DIR / datetime.now().strftime('%Y%m%d-%H%M%S'))
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        paths = list(dict.fromkeys(str(Path(path).resolve()) for path in paths))
+        sizes = [0] * shards
+        with open(run_dir / 'manifest.txt', 'w', encoding='utf-8') as f:
+            for path in paths:
+                f.write(path + '\n')
+                sizes[cls.shard_of(path, shards)] += 1
+
+        plan = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'shards': shards,
+            'total': len(paths),
+            'shard_sizes': sizes,
+            'model_path': model_path,
+            'model_fingerprint': file_fingerprint(model_path)[:16]
+        }
+        with open(run_dir / 'plan.json', 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+        return cls(run_dir)
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            plan_path = self.run_dir / 'plan.json'
+            if not plan_path.exists():
+                raise FileNotFoundError(f"No hay plan.json en {self.run_dir}")
+            with open(plan_path, 'r', encoding='utf-8') as f:
+                self._plan = json.load(f)
+        return self._plan
+
+    def manifest(self):
+        with open(self.run_dir / 'manifest.txt', 'r', encoding='utf-8') as f:
+            return [line.rstrip('\n') for line in f if line.strip()]
+
+    def shard_paths(self, shard):
+        shards = self.plan['shards']
+        return [path for path in self.manifest() if self.shard_of(path, shards) == shard]
+
+    def shard_file(self, shard, partial=False):
+        suffix = '.partial.csv' if partial else '.csv'
+        return self.run_dir / f"shard-{shard:04d}-of-{self.plan['shards']:04d}{suffix}"
+
+    def status(self):
+        """Estado de cada fragmento: completado, parcial (con filas escritas) o pendiente"""
+        rows = []
+        for shard, size in enumerate(self.plan['shard_sizes']):
+            if self.shard_file(shard).exists():
+                status, done = self.STATUS_DONE, size
+            elif self.shard_file(shard, partial=True).exists():
+                status, done = self.STATUS_PARTIAL, len(self._read_partial(shard))
+            else:
+                status, done = self.STATUS_PENDING, 0
+            rows.append({'Fragmento': shard, 'Estado': status, 'Imagenes': size, 'Procesadas': done})
+        return rows
+
+    def pending_shards(self):
+        return [row['Fragmento'] for row in self.status() if row['Estado'] != self.STATUS_DONE]
+
+    def _read_partial(self, shard):
+        """Filas completas del CSV parcial (una por ruta); una última línea cortada por un fallo se descarta"""
+        path = self.shard_file(shard, partial=True)
+        if not path.exists():
+            return []
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            rows = {row[0]: row for row in reader if header and len(row) == len(header)}
+        return list(rows.values())
+
+    def work(self, shard, batch_size=None):
+        """Clasificar las imágenes pendientes de un fragmento; devuelve un resumen"""
+        import tensorflow as tf
+        from app.utils.autotune import InferenceAutotuner
+        from app.utils.image_processing import ImageProcessor, error_row
+        from app.utils.model_export import ModelExporter
+
+        plan = self.plan
+        if not 0 <= shard < plan['shards']:
+            raise ValueError(f"Fragmento {shard} fuera de rango (0-{plan['shards'] - 1})")
+        if self.shard_file(shard).exists():
+            return {'shard': shard, 'processed': 0, 'skipped': plan['shard_sizes'][shard], 'seconds': 0.0}
+        if file_fingerprint(plan['model_path'])[:16] != plan['model_fingerprint']:
+            raise RuntimeError(f"El modelo {plan['model_path']} cambió desde el plan; crear un plan nuevo")
+
+        start = time.perf_counter()
+        paths = self.shard_paths(shard)
+        # Reanudar: reescribir el parcial solo con filas completas y omitir sus rutas
+        done_rows = self._read_partial(shard)
+        done = {row[0] for row in done_rows}
+        partial_path = self.shard_file(shard, partial=True)
+        with open(partial_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.COLUMNS)
+            writer.writerows(done_rows)
+        pending = [path for path in paths if path not in done]
+
+        slim_path = ModelExporter().find_slim(plan['model_path'])
+        model_path = str(slim_path) if slim_path is not None else plan['model_path']
+        model = tf.keras.models.load_model(model_path, compile=False)
+        batch_size = batch_size or InferenceAutotuner().batch_size_for(model_path)
+        image_processor = ImageProcessor()
+
+        with open(partial_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.COLUMNS, extrasaction='ignore', restval='')
+            for offset in range(0, len(pending), batch_size):
+                batch = pending[offset:offset + batch_size]
+                rows, arrays = [], []
+                for path in batch:
+                    name = os.path.basename(path)
+                    try:
+                        image = image_processor.load_image(path)
+                        arrays.append((len(rows), image_processor.preprocess_image(image)[0]))
+                        rows.append({'Nombre_Archivo': name})
+                    except Exception as e:
+                        rows.append(error_row(name, e))
+                if arrays:
+                    try:
+                        probabilities = image_processor.predict_batch(
+                            np.stack([array for _, array in arrays]), model, batch_size
+                        )
+                    except Exception as e:
+                        for i, _ in arrays:
+                            rows[i] = error_row(rows[i]['Nombre_Archivo'], e)
+                    else:
+                        for (i, _), row_probabilities in zip(arrays, probabilities):
+                            rows[i].update(image_processor.format_prediction(row_probabilities))
+                writer.writerows({**row, 'Ruta': path} for path, row in zip(batch, rows))
+                # Cada lote llega a disco antes del siguiente: un reintento solo repite el lote en curso
+                f.flush()
+                os.fsync(f.fileno())
+
+        os.replace(partial_path, self.shard_file(shard))
+        return {'shard': shard, 'processed': len(pending), 'skipped': len(done),
+                'seconds': round(time.perf_counter() - start, 2)}
+
+    def work_local(self, shards=None, workers=1):
+        """
+        Procesar fragmentos en procesos hijos de este host (por defecto todos los
+        pendientes); un fragmento que falla no detiene a los demás.
+        """
+        shards = self.pending_shards() if shards is None else shards
+        intra_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        results, errors = [], {}
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(_work_shard, str(self.run_dir), shard, intra_threads): shard for shard in shards}
+            for future, shard in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors[shard] = str(e)
+        return results, errors
+
+    def merge(self):
+        """Combinar los fragmentos en el DataFrame final, las métricas y el reporte Excel"""
+        from app.utils.metrics_calculator import MetricsCalculator
+        from app.utils.report_generator import ReportGenerator
+
+        missing = self.pending_shards()
+        if missing:
+            raise RuntimeError(f"Fragmentos sin terminar: {', '.join(str(shard) for shard in missing)}")
+
+        frames = [pd.read_csv(self.shard_file(shard), dtype=str, keep_default_na=False)
+                  for shard in range(self.plan['shards'])]
+        combined = pd.concat(frames, ignore_index=True).drop_duplicates('Ruta')
+        # Orden del manifiesto, no el de llegada de los fragmentos
+        order = {path: position for position, path in enumerate(self.manifest())}
+        combined = combined.iloc[combined['Ruta'].map(order).argsort(kind='stable')]
+        rows = [{key: value for key, value in row.items() if value != '' or key != 'Error'}
+                for row in combined.to_dict('records')]
+
+        report_gen = ReportGenerator()
+        enhanced_results = report_gen.create_enhanced_results(rows)
+        df_results = report_gen.create_dataframe(enhanced_results)
+        df_results.insert(0, 'Ruta', combined['Ruta'].values)
+
+        successful = df_results[df_results['Prediccion'] != 'ERROR']
+        metrics = MetricsCalculator().calculate_real_time_metrics(successful) if not successful.empty else None
+
+        df_results.to_csv(self.run_dir / 'results.csv', index=False)
+        # Se serializa antes de abrir el archivo: un fallo no deja un metrics.json truncado
+        summary = json.dumps({
+            'total': len(df_results),
+            'errors': int((df_results['Prediccion'] == 'ERROR').sum()),
+            'predictions': df_results['Prediccion'].value_counts().to_dict(),
+            'metrics': metrics or {}
+        }, ensure_ascii=False, indent=2, default=_json_value)
+        with open(self.run_dir / 'metrics.json', 'w', encoding='utf-8') as f:
+            f.write(summary)
+        with open(self.run_dir / 'report.xlsx', 'wb') as f:
+            f.write(report_gen.create_excel_report(enhanced_results, metrics))
+        return df_results, metrics
+
+
+def manifest_from_directory(directory, recursive=False):
+    """Imágenes de una carpeta (formatos soportados, sin máscaras de segmentación)"""
+    pattern = '**/*' if recursive else '*'
+    return sorted(
+        str(path) for path in Path(directory).glob(pattern)
+        if path.is_file() and path.suffix.lower().lstrip('.') in Config.SUPPORTED_FORMATS and not is_mask_file(path)
+    )
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=['plan', 'work', 'status', 'merge'])
+    parser.add_argument("--run-dir", default=None, help="Directorio de la ejecución (plan lo crea si no se indica)")
+    parser.add_argument("--manifest", default=None, help="Archivo con una ruta de imagen por línea (plan)")
+    parser.add_argument("--dir", default=None, help="Carpeta de imágenes para construir el manifiesto (plan)")
+    parser.add_argument("--recursive", action='store_true')
+    parser.add_argument("--shards", type=int, default=None, help="Número de fragmentos (por defecto Config.SHARDED_RUN_COUNT)")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--shard", type=int, nargs='*', default=None, help="Fragmentos a procesar (work); por defecto los pendientes")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos locales en paralelo (work)")
+
+
+def run(args):
+    if args.action == 'plan':
+        if args.manifest:
+            with open(args.manifest, 'r', encoding='utf-8') as f:
+                paths = [line.strip() for line in f if line.strip()]
+        elif args.dir:
+            paths = manifest_from_directory(args.dir, args.recursive)
+        else:
+            sys.exit("plan necesita --manifest o --dir")
+        sharded = ShardedRun.create(paths, args.shards, args.model, args.run_dir)
+        plan = sharded.plan
+        print(f"{sharded.run_dir}: {plan['total']} imágenes en {plan['shards']} fragmentos "
+              f"({min(plan['shard_sizes'])}-{max(plan['shard_sizes'])} por fragmento)")
+        return
+
+    if not args.run_dir:
+        sys.exit("--run-dir es obligatorio")
+    sharded = ShardedRun(args.run_dir)
+
+    if args.action == 'status':
+        for row in sharded.status():
+            print(f"fragmento {row['Fragmento']:>4}: {row['Estado']:<11} {row['Procesadas']:>6}/{row['Imagenes']}")
+    elif args.action == 'work':
+        results, errors = sharded.work_local(args.shard, args.workers)
+        if not results and not errors:
+            print("sin fragmentos pendientes")
+        for result in sorted(results, key=lambda result: result['shard']):
+            print(f"fragmento {result['shard']:>4}: {result['processed']} procesadas, "
+                  f"{result['skipped']} ya hechas ({result['seconds']:.1f} s)")
+        for shard, error in sorted(errors.items()):
+            print(f"fragmento {shard:>4}: ERROR {error}")
+        if errors:
+            sys.exit(1)
+    else:
+        try:
+            df_results, metrics = sharded.merge()
+        except RuntimeError as e:
+            sys.exit(str(e))
+        print(f"{len(df_results)} resultados combinados en {sharded.run_dir / 'report.xlsx'}")
+        if metrics:
+            print(f"exactitud {metrics['accuracy']:.3f} | sensibilidad {metrics['sensitivity']:.3f} | "
+                  f"especificidad {metrics['specificity']:.3f}")
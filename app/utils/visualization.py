@@ -5,15 +5,20 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
-from sklearn.metrics import roc_curve, roc_auc_score
 from app.config import Config
+from app.utils.performance import PerformanceTracker
 
 class MetricsVisualizer:
-    def __init__(self):
+    def __init__(self, tracker=None):
         self.config = Config()
+        self.tracker = tracker or PerformanceTracker(enabled=False)
     
     def display_metrics_dashboard(self, metrics, results_df):
         """Mostrar dashboard completo de métricas"""
+        with self.tracker.span('visualization'):
+            self._display_metrics_dashboard(metrics, results_df)
+    
+    def _display_metrics_dashboard(self, metrics, results_df):
         st.subheader("📊 Dashboard de Métricas")
         
         # Tabla de totales
@@ -37,7 +42,7 @@ class MetricsVisualizer:
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            roc_chart = self._create_roc_curve_chart(results_df)
+            roc_chart = self._create_roc_curve_chart(metrics)
             if roc_chart:
                 st.plotly_chart(roc_chart, use_container_width=True)
             else:
@@ -149,39 +154,15 @@ class MetricsVisualizer:
         
         return fig
     
-    def _create_roc_curve_chart(self, results_df):
-        """Crear gráfica de curva ROC"""
-        successful_results = results_df[results_df['Resultado'].isin(['VP', 'VN', 'FP', 'FN'])]
-        
-        if len(successful_results) == 0:
+    def _create_roc_curve_chart(self, metrics):
+        """Crear gráfica de curva ROC con los puntos de la instantánea de métricas"""
+        roc = metrics.get('roc')
+        if not roc:
             return None
         
-        y_true_binary = []
-        y_scores = []
-        
-        for _, row in successful_results.iterrows():
-            if row['Diagnostico'] == 'Malignant':
-                y_true_binary.append(1)
-            else:
-                y_true_binary.append(0)
-            
-            try:
-                malignant_prob = float(row['Prob_Malignant'])
-                y_scores.append(malignant_prob)
-            except:
-                if row['Prediccion'] == 'Malignant':
-                    y_scores.append(0.8)
-                else:
-                    y_scores.append(0.2)
-        
-        if len(set(y_true_binary)) < 2:
-            return None
-        
-        try:
-            fpr, tpr, thresholds = roc_curve(y_true_binary, y_scores)
-            auc_score = roc_auc_score(y_true_binary, y_scores)
-        except:
-            return None
+        fpr = np.asarray(roc['fpr'])
+        tpr = np.asarray(roc['tpr'])
+        auc_score = metrics['auc']
         
         fig = go.Figure()
         
@@ -356,4 +337,22 @@ class MetricsVisualizer:
         with col3:
             st.metric("🟡 FP", metrics['FP'], help="Falsos Positivos")
         with col4:
-            st.metric("🔴 FN", metrics['FN'], help="Falsos Negativos")
\ No newline at end of file
+            st.metric("🔴 FN", metrics['FN'], help="Falsos Negativos")
+    
+    def create_history_trend_chart(self, trend, value_column, title, percent=False):
+        """Gráfico de líneas por periodo (una línea por modelo) para el historial"""
+        fig = px.line(
+            trend, x='period', y=value_column,
+            color='Modelo' if 'Modelo' in trend.columns else None,
+            markers=True
+        )
+        if percent:
+            fig.update_yaxes(tickformat='.0%')
+        fig.update_layout(
+            height=350,
+            xaxis_title="Periodo",
+            yaxis_title="",
+            margin=dict(t=50, b=30, l=10, r=10),
+            title=dict(text=f"<b>{title}</b>", x=0.5, font=dict(size=16))
+        )
+        return fig
@@ -0,0 +1,398 @@
+"""
+Clasificación continua de las imágenes que llegan a una o varias carpetas.
+
+Las estaciones de ecografía exportan PNG a una carpeta compartida; el demonio
+la vigila (watchdog/inotify si está instalado, sondeo periódico siempre), espera
+a que cada archivo deje de cambiar, lo clasifica por lotes y añade el resultado
+al RunStore, al historial y a un informe CSV/Excel diario. Un punto de control
+en SQLite evita volver a puntuar un archivo tras un reinicio.
+
+Uso:
+    python -m app.utils watch /mnt/ecografias --recursive
+    python -m app.utils watch entrada/ --once      # procesar lo que haya y salir
+"""
+
+import csv
+import io
+import os
+import signal
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+from app.utils.autotune import InferenceAutotuner
+from app.utils.fingerprint import bytes_sha256, file_fingerprint, file_sha256
+from app.utils.history_store import HistoryStore
+from app.utils.image_processing import ImageProcessor, error_row
+from app.utils.memory_governor import shared_governor
+from app.utils.model_preloader import ModelPreloader
+from app.utils.report_generator import ReportGenerator
+from app.utils.run_store import RunStore
+
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+
+class WatchCheckpoint:
+    """Archivos ya puntuados (ruta, tamaño, mtime y hash del contenido) en SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            scored_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path=None):
+        self.config = Config()
+        self.db_path = Path(db_path or self.config.WATCH_CHECKPOINT_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def signatures(self):
+        """{ruta: (tamaño, mtime_ns)} de todos los archivos puntuados"""
+        with closing(self._connect()) as connection:
+            return {path: (size, mtime_ns) for path, size, mtime_ns in connection.execute(
+                "SELECT path, size, mtime_ns FROM files"
+            )}
+
+    def content_hash(self, path):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT content_hash FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def mark(self, entries, run_id):
+        """Registrar [(ruta, tamaño, mtime_ns, hash)] como puntuados en una transacción"""
+        scored_at = datetime.now().isoformat(timespec='seconds')
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, run_id, scored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, size, mtime_ns, content_hash, run_id, scored_at) for path, size, mtime_ns, content_hash in entries]
+            )
+
+    def get(self, key):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        with closing(self._connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+class _WakeHandler:
+    """Manejador de eventos de watchdog: solo despierta el bucle, el sondeo decide qué procesar"""
+
+    def __init__(self, wake):
+        self.wake = wake
+
+    def dispatch(self, event):
+        self.wake.set()
+
+
+class FolderWatcher:
+    """
+    Vigila carpetas y clasifica por lotes los archivos nuevos o modificados una
+    vez que su tamaño y mtime no cambian durante settle_seconds. Cada lote se
+    decodifica completo en memoria, así que una ráfaga de cientos de archivos se
+    procesa con el tamaño de lote ajustado y el admitido por el gobernador de memoria.
+    """
+
+    REPORT_COLUMNS = ['Fecha_Procesamiento', 'Ruta', 'Nombre_Archivo', 'Prediccion', 'Diagnostico', 'Resultado',
+                      'Confianza', 'Prob_Benign', 'Prob_Malignant', 'Prob_Normal', 'Error']
+
+    def __init__(self, directories, model_path=None, recursive=False, poll_seconds=None, settle_seconds=None,
+                 batch_size=None, checkpoint=None, report_dir=None):
+        self.config = Config()
+        self.directories = [Path(directory).resolve() for directory in directories]
+        self.model_path = str(model_path or self.config.DEFAULT_MODEL_PATH)
+        self.recursive = recursive
+        self.poll_seconds = poll_seconds or self.config.WATCH_POLL_SECONDS
+        self.settle_seconds = self.config.WATCH_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint or WatchCheckpoint()
+        self.report_dir = Path(report_dir or self.config.WATCH_REPORT_DIR)
+        self.run_store = RunStore()
+        self.history_store = HistoryStore()
+        self.image_processor = ImageProcessor()
+        self.report_gen = ReportGenerator()
+        self.governor = shared_governor()
+        self.model = None
+        self.run_id = None
+        self.stats = {'clasificadas': 0, 'errores': 0, 'sin_cambios': 0, 'lotes': 0}
+        self._scored = {}
+        self._observed = {}
+        self._deferred = {}
+        self._position = 0
+        self._pending_excel = set()
+        self._last_excel = time.monotonic()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def stop(self):
+        """Terminar tras el lote en curso"""
+        self._stop.set()
+        self._wake.set()
+
+    def load_model(self):
+        preloader = ModelPreloader(self.model_path, readiness_file=self.config.WATCH_READINESS_FILE).start()
+        if not preloader.wait():
+            raise RuntimeError(f"No se pudo cargar el modelo: {preloader.state().get('error')}")
+        self.model = preloader.model
+        self.batch_size = self.batch_size or InferenceAutotuner().batch_size_for(preloader.state()['path'])
+        self.model_hash = file_fingerprint(self.model_path)[:16]
+
+    def _recover(self):
+        """
+        Un corte entre el RunStore y el punto de control deja el último lote
+        guardado pero sin marcar: se marca ahora si el archivo no ha cambiado.
+        """
+        previous = self.checkpoint.get('run_id')
+        self._scored = self.checkpoint.signatures()
+        if previous is None:
+            return 0
+        entries = []
+        for path, content_hash in self.run_store.scored_keys(previous):
+            if path in self._scored or not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            if file_sha256(path) == content_hash:
+                entries.append((path, stat.st_size, stat.st_mtime_ns, content_hash))
+        if entries:
+            self.checkpoint.mark(entries, previous)
+            self._scored.update({path: (size, mtime_ns) for path, size, mtime_ns, _ in entries})
+        return len(entries)
+
+    def _files(self, directory):
+        stack = [directory]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                stack.append(entry.path)
+                        elif not entry.name.startswith('.') and entry.name.lower().endswith(self.config.WATCH_EXTENSIONS):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            yield entry.path, stat.st_size, stat.st_mtime_ns
+            except OSError:
+                continue
+
+    def _ready(self):
+        """Archivos nuevos o modificados (más antiguos primero) cuyo tamaño y mtime no cambian desde settle_seconds"""
+        now = time.monotonic()
+        observed, ready = {}, []
+        for directory in self.directories:
+            for path, size, mtime_ns in self._files(directory):
+                signature = (size, mtime_ns)
+                if self._scored.get(path) == signature:
+                    continue
+                previous = self._observed.get(path)
+                since = previous[1] if previous and previous[0] == signature else now
+                observed[path] = (signature, since)
+                if size > 0 and now - since >= self.settle_seconds:
+                    ready.append((mtime_ns, path, size))
+        self._observed = observed
+        return [(path, size, mtime_ns) for mtime_ns, path, size in sorted(ready)]
+
+    def _process(self, files):
+        """Clasificar un lote y registrarlo: RunStore, historial, informe y, al final, punto de control"""
+        start = time.perf_counter()
+        entries, rows, pending, unchanged = [], [], [], []
+        for path, size, mtime_ns in files:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            content_hash = bytes_sha256(data)
+            if self.checkpoint.content_hash(path) == content_hash:
+                # Mismo contenido con otro mtime (copiado de nuevo o tocado): solo se actualiza la firma
+                unchanged.append((path, size, mtime_ns, content_hash))
+                continue
+
+            name = os.path.basename(path)
+            try:
+                image = self.image_processor.load_image(io.BytesIO(data))
+                array = self.image_processor.preprocess_image(image)[0]
+            except Exception as e:
+                # Primer fallo: puede ser un escritor que se detuvo más que settle_seconds; se reintenta una vez
+                if self._deferred.get(path) != (size, mtime_ns):
+                    self._deferred[path] = (size, mtime_ns)
+                    self._observed[path] = ((size, mtime_ns), time.monotonic())
+                    continue
+                rows.append(error_row(name, e))
+            else:
+                pending.append((len(rows), array))
+                rows.append({'Nombre_Archivo': name})
+            self._deferred.pop(path, None)
+            entries.append((path, size, mtime_ns, content_hash))
+            del data
+
+        if pending:
+            try:
+                probabilities = self.image_processor.predict_batch(
+                    np.stack([array for _, array in pending]), self.model, self.batch_size
+                )
+            except Exception as e:
+                for i, _ in pending:
+                    rows[i] = error_row(rows[i]['Nombre_Archivo'], e)
+            else:
+                for (i, _), row_probabilities in zip(pending, probabilities):
+                    rows[i].update(self.image_processor.format_prediction(row_probabilities))
+
+        if entries:
+            self.run_store.append(self.run_id, [
+                (self._position + i, path, content_hash, row)
+                for i, ((path, _, _, content_hash), row) in enumerate(zip(entries, rows))
+            ])
+            self._position += len(entries)
+            enhanced = self.report_gen.create_enhanced_results(rows)
+            self.history_store.record(self.run_id, self.model_hash, enhanced, model_path=self.model_path)
+            self._append_report(entries, enhanced)
+
+        self.checkpoint.mark(entries + unchanged, self.run_id)
+        for path, size, mtime_ns, _ in entries + unchanged:
+            self._scored[path] = (size, mtime_ns)
+            self._observed.pop(path, None)
+
+        errors = sum(1 for row in rows if row['Prediccion'] == 'ERROR')
+        self.stats['clasificadas'] += len(rows) - errors
+        self.stats['errores'] += errors
+        self.stats['sin_cambios'] += len(unchanged)
+        if entries:
+            self.stats['lotes'] += 1
+            print(f"{datetime.now():%H:%M:%S} lote de {len(entries)}: {len(rows) - errors} clasificadas, "
+                  f"{errors} con error ({time.perf_counter() - start:.1f} s)")
+
+    def _append_report(self, entries, rows):
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        path = self.report_dir / f"watch_{datetime.now():%Y%m%d}.csv"
+        processed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        write_header = not path.exists()
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.REPORT_COLUMNS, extrasaction='ignore', restval='')
+            if write_header:
+                writer.writeheader()
+            for (file_path, _, _, _), row in zip(entries, rows):
+                writer.writerow({**row, 'Fecha_Procesamiento': processed_at, 'Ruta': file_path})
+        self._pending_excel.add(path)
+
+    def export_excel(self, force=False):
+        """Regenerar el Excel de los CSV con filas nuevas (como mucho cada WATCH_EXCEL_INTERVAL_SECONDS)"""
+        if not self._pending_excel:
+            return []
+        if not force and time.monotonic() - self._last_excel < self.config.WATCH_EXCEL_INTERVAL_SECONDS:
+            return []
+        exported = []
+        for csv_path in sorted(self._pending_excel):
+            rows = pd.read_csv(csv_path, dtype=str, keep_default_na=False).to_dict('records')
+            excel_path = csv_path.with_suffix('.xlsx')
+            tmp_path = excel_path.with_name(excel_path.name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(self.report_gen.create_excel_report(rows))
+            os.replace(tmp_path, excel_path)
+            exported.append(excel_path)
+        self._pending_excel.clear()
+        self._last_excel = time.monotonic()
+        return exported
+
+    def _start_observer(self):
+        if Observer is None:
+            return None
+        observer = Observer()
+        handler = _WakeHandler(self._wake)
+        for directory in self.directories:
+            observer.schedule(handler, str(directory), recursive=self.recursive)
+        observer.start()
+        return observer
+
+    def run(self, once=False):
+        """Bucle principal; con once termina cuando no quedan archivos pendientes"""
+        for directory in self.directories:
+            if not directory.is_dir():
+                raise FileNotFoundError(f"Carpeta no encontrada: {directory}")
+        if self.model is None:
+            self.load_model()
+        recovered = self._recover()
+        if recovered:
+            print(f"{recovered} archivos del último lote interrumpido marcados como puntuados")
+        self.run_id = self.run_store.create_run(0, self.model_path, owner=f"watch-{os.getpid()}")
+        self.checkpoint.set('run_id', self.run_id)
+
+        observer = self._start_observer()
+        print(f"Vigilando {', '.join(str(d) for d in self.directories)} | ejecución {self.run_id} | "
+              f"lote {self.batch_size} | {'eventos + sondeo' if observer else 'sondeo'} cada {self.poll_seconds:g} s")
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                ready = self._ready()
+                index = 0
+                while index < len(ready) and not self._stop.is_set():
+                    size = self.governor.admit(self.batch_size, stage='carpeta vigilada')
+                    self._process(ready[index:index + size])
+                    index += size
+                if ready:
+                    continue
+                self.export_excel()
+                waiting = any(signature[0] > 0 for signature, _ in self._observed.values())
+                if once and not waiting:
+                    break
+                # La ejecución sigue viva aunque no lleguen archivos: ninguna sesión debe reanudarla
+                self.run_store.heartbeat(self.run_id)
+                self._wake.wait(self.settle_seconds if waiting else self.poll_seconds)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self.export_excel(force=True)
+            self.run_store.complete(self.run_id)
+        return self.stats
+
+
+def add_arguments(parser):
+    config = Config()
+    parser.add_argument("directories", nargs='+', help="Carpetas a vigilar")
+    parser.add_argument("--model", default=str(config.DEFAULT_MODEL_PATH))
+    parser.add_argument("--recursive", action='store_true', help="Incluir subcarpetas")
+    parser.add_argument("--poll", type=float, default=None, help="Segundos entre sondeos (por defecto Config.WATCH_POLL_SECONDS)")
+    parser.add_argument("--settle", type=float, default=None, help="Segundos sin cambios antes de procesar un archivo")
+    parser.add_argument("--batch-size", type=int, default=None, help="Por defecto el ajustado para este host y modelo")
+    parser.add_argument("--once", action='store_true', help="Procesar los archivos presentes y salir")
+
+
+def run(args):
+    watcher = FolderWatcher(args.directories, args.model, args.recursive, args.poll, args.settle, args.batch_size)
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    signal.signal(signal.SIGINT, lambda *_: watcher.stop())
+    stats = watcher.run(once=args.once)
+    print(f"Fin: {stats['clasificadas']} clasificadas, {stats['errores']} con error, "
+          f"{stats['sin_cambios']} sin cambios en {stats['lotes']} lotes")